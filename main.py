@@ -6,22 +6,54 @@ Video2Note - Быстрая и качественная транскрипция
 Оптимизирован для максимальной производительности и точности на macOS.
 """
 
+import json
 import logging
 import os
 import sys
+import time
+
+# Everything imported below counts towards the startup cost shown by --profile-startup
+_IMPORT_STARTED = time.perf_counter()
+
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import replace
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Iterable, List, Optional
 
 import click
 from rich.markup import escape
 from rich.panel import Panel
+from rich.table import Table
 
-from video2note.config import (ALL_SUPPORTED_FORMATS, TEMP_DIR_NAME,
-                               TRANSCRIPTS_DIR_NAME, TranscriptionConfig)
-from video2note.core import run_pipeline
+from video2note.audio_cache import (AUDIO_CACHE_DIR_NAME,
+                                    DEFAULT_AUDIO_CACHE_MB, AudioCache)
+from video2note.cache import TranscriptCache
+from video2note.config import (ALL_SUPPORTED_FORMATS, CACHE_DIR,
+                               DEFAULT_CACHE_SIZE_MB, DEFAULT_STALL_TIMEOUT,
+                               TEMP_DIR_NAME,
+                               TRANSCRIPTS_DIR_NAME, WATCH_QUEUE_DB,
+                               TranscriptionConfig, discovery_cache)
+from video2note.core import (BATCH_ORDERS, BatchJob, detect_batch_languages,
+                            plan_batch, run_batch, run_parallel_batch)
 from video2note.exceptions import Video2NoteError
-from video2note.ui import console, open_file_dialog, rich_handler
-from video2note.utils import get_safe_filename, is_nonempty_text_file
+from video2note.hardware import (available_cpus, cpu_quota, default_threads,
+                                 physical_cores)
+from video2note.manifest import LanguageManifest
+from video2note.metrics import MetricsStore
+from video2note.output import OUTPUT_FORMATS, parse_formats
+from video2note.supervisor import kill_on_interrupt
+from video2note.tracing import TRACE_FORMATS, TraceWriter
+from video2note.transcriber import AUTO_LANGUAGE
+from video2note.tuning import (DEFAULT_PRESET, DEFAULT_TUNE_SECONDS, PRESETS,
+                               choose_profiles, resolve_decoding, run_tuning)
+from video2note.ui import (console, open_file_dialog, rich_handler,
+                           shared_progress)
+from video2note.utils import format_eta, get_safe_filename
+from video2note.watch import (DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS,
+                              WatchQueue, watch_folder)
+
+IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
 # --- Logging Configuration ---
 # Set up a logger for the application.
@@ -47,26 +79,206 @@ def show_intro(files: list[Path], config: TranscriptionConfig):
     console.print(Panel(panel_content, title="💿 Конфигурация", border_style="green"))
 
 
-def show_summary(result):
+def show_summary(result, draft: bool = False, show_language: bool = False):
     """Displays a summary panel for a single transcription result."""
-    console.print(f"\n✅ [bold]Готово:[/bold] [link=file://{result.output_file.resolve()}]{result.output_file}[/link]")
-    preview = result.transcription[:300] + "..." if len(result.transcription) > 300 else result.transcription
+    if result.cached:
+        console.print("\n♻️  Транскрипция взята из кэша.")
+    title = "Черновик" if draft else "Готово"
+    console.print(f"\n✅ [bold]{title}:[/bold] [link=file://{result.output_file.resolve()}]{result.output_file}[/link]")
+    if show_language and result.language:
+        console.print(f"🌐 [bold]Язык:[/bold] {result.language}")
+    preview = result.preview()
     console.print("\n📝 [bold]Превью:[/bold]")
     console.print(f"[italic dim]{escape(preview)}[/italic dim]")
 
 
+def show_outcome(outcome, verbose: bool, show_language: bool = False):
+    """Reports one processed file: its summary, a skip or an error; ``show_language`` when languages vary per file."""
+    input_file = outcome.job.input_file
+    if outcome.skipped:
+        console.print(f"[yellow]Пропуск:[/yellow] уже есть транскрипция → {outcome.job.output_path.name}")
+    elif outcome.error is not None:
+        e = outcome.error
+        logger.error(f"Не удалось обработать файл {input_file.name}: {e}", exc_info=e if verbose else False)
+        console.print(f"❌ [bold red]Ошибка при обработке {input_file.name}:[/bold red] {escape(str(e))}")
+    else:
+        show_summary(outcome.result, outcome.job.draft, show_language=show_language)
+
+
+def show_startup_profile(command: Optional[str]):
+    """Reports the startup cost of this invocation and records it in the metrics database."""
+    console.print(
+        f"⏱️  [bold]Запуск:[/bold] импорт модулей {IMPORT_SECONDS * 1000:.0f} мс, "
+        f"поиск whisper.cpp и моделей {discovery_cache.seconds * 1000:.1f} мс "
+        f"[dim](из кэша: {discovery_cache.hits}, поиск: {discovery_cache.misses})[/dim]"
+    )
+    MetricsStore().record_startup(command, IMPORT_SECONDS, discovery_cache.seconds)
+
+
+def show_cache_stats(transcripts: TranscriptCache, audio: AudioCache):
+    """Displays the size of the transcript and audio caches against their budgets."""
+    table = Table(title="🗄️  Кэши", show_lines=False)
+    for column, justify in (("Кэш", "left"), ("Файлов", "right"), ("Размер, МБ", "right"), ("Лимит, МБ", "right"), ("Каталог", "left")):
+        table.add_column(column, justify=justify)
+    for name, cache in (("Транскрипции", transcripts), ("Аудио", audio)):
+        stats = cache.stats()
+        table.add_row(name, str(stats.files), f"{stats.bytes / 1024 / 1024:.1f}",
+                      f"{cache.max_bytes / 1024 / 1024:.0f}", escape(str(cache.cache_dir)))
+    console.print(table)
+
+
+def show_tuning_results(results, profiles):
+    """Displays the calibration runs of `tune` and the profile chosen for each preset."""
+    chosen = {}
+    for preset, profile in profiles.items():
+        chosen.setdefault((profile.threads, profile.beam_size, profile.best_of), []).append(preset)
+
+    table = Table(title="🎛️  Калибровка", show_lines=False)
+    for column in ("Потоки", "Beam", "Best of", "Время, с", "Совпадение", "Пресет"):
+        table.add_column(column, justify="right")
+    for r in results:
+        table.add_row(str(r.threads), str(r.beam_size), str(r.best_of), f"{r.seconds:.2f}", f"{r.agreement:.1%}",
+                      ", ".join(chosen.pop((r.threads, r.beam_size, r.best_of), [])))
+    console.print(table)
+    console.print("[dim]Совпадение — доля слов, совпавших с транскрипцией самого точного режима.[/dim]")
+
+
+def build_config(model: str, language: str, threads: Optional[int], preset: str, **kwargs) -> TranscriptionConfig:
+    """Builds the TranscriptionConfig of a transcribing command with its preset's (tuned) decoding settings."""
+    decoding = resolve_decoding(model, preset)
+    if decoding.profile is not None:
+        console.print(f"🎛️  [bold]Профиль {preset}:[/bold] {decoding.threads} потоков, beam {decoding.beam_size}, "
+                      f"best-of {decoding.best_of}" + (" [dim](потоки заданы --threads)[/dim]" if threads else ""))
+    return TranscriptionConfig(model_name=model, language=language, threads=threads or decoding.threads,
+                               beam_size=decoding.beam_size, best_of=decoding.best_of, **kwargs)
+
+
+def show_bench_results(report):
+    """Displays benchmark results as a table."""
+    def seconds(value):
+        return f"{value:.2f}" if value is not None else "—"
+
+    table = Table(title="⏱️  Бенчмарк конвейера", show_lines=False)
+    # Stage columns are in seconds; "Модель" is the model load, "Декод." the rest of the whisper time
+    for column in ("Аудио", "Потоки", "Пробинг", "ffmpeg", "Модель", "Декод.", "whisper", "Итого", "RTF", "RSS, МБ"):
+        table.add_column(column, justify="right")
+    for r in report.results:
+        table.add_row(
+            str(r.seconds), str(r.threads), seconds(r.probe_time), seconds(r.ffmpeg_time),
+            seconds(r.model_load_time), seconds(r.decode_time), seconds(r.whisper_time),
+            seconds(r.total_time), f"{r.realtime_factor:.3f}",
+            f"{r.peak_rss_mb:.0f}" if r.peak_rss_mb is not None else "—",
+        )
+    console.print(table)
+    console.print("[dim]Время в секундах; RTF — время обработки на секунду аудио; RSS — пиковая память ffmpeg/whisper.[/dim]")
+    env = report.environment
+    console.print(f"[dim]whisper: {env['whisper']}, модель: {env['model']}, ревизия: {env['revision'] or '—'}, "
+                  f"CPU: {env['cpu_count']}, {env['platform']}[/dim]")
+
+
 # --- Main CLI Interface ---
 
-@click.command(context_settings=dict(help_option_names=['-h', '--help']))
+class DefaultCommandGroup(click.Group):
+    """
+    A command group that runs its default command when the first argument
+    is not a subcommand name, so `./run file.mp4` keeps working.
+    """
+
+    def __init__(self, *args, default_command: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        # Leading group flags such as --profile-startup stay in front of the command name
+        flags = {opt for param in self.params if isinstance(param, click.Option) and param.is_flag for opt in param.opts}
+        start = 0
+        while start < len(args) and args[start] in flags:
+            start += 1
+        if start == len(args) or args[start] not in self.commands:
+            args = [*args[:start], self.default_command, *args[start:]]
+        return super().parse_args(ctx, args)
+
+
+def model_options(f):
+    """Options that build the TranscriptionConfig, shared by the transcribing commands."""
+    for option in reversed([
+        click.option('-m', '--model', default='large-v3', show_default=True, type=click.Choice(['tiny', 'base', 'small', 'medium', 'large-v2', 'large-v3']), help='Модель whisper.cpp.'),
+        click.option('-l', '--language', default='ru', show_default=True, help='Язык аудио (ru, en, etc.; auto — определить по первым 30 с каждого файла).'),
+        click.option('--threads', type=click.IntRange(min=1), help='Количество потоков CPU (по умолчанию — из профиля ./run tune или число физических ядер с учётом квоты CPU контейнера).'),
+        click.option('--preset', default=DEFAULT_PRESET, show_default=True, type=click.Choice(PRESETS), help='Скорость или точность декодирования: fast — жадный поиск, balanced — beam 3, accurate — beam 5. После ./run tune — лучшие для этой машины потоки и параметры.'),
+        click.option('--stall-timeout', default=DEFAULT_STALL_TIMEOUT, show_default=True, type=click.IntRange(min=10), help='Остановить ffmpeg/whisper, если они столько секунд не выводят прогресс (общего лимита времени нет).'),
+        click.option('--trim-silence', is_flag=True, help='Вырезать паузы встроенным VAD (без модели) перед whisper.cpp: декодирование ускоряется пропорционально убранной тишине.'),
+        click.option('--force-filters', is_flag=True, help='Всегда пропускать аудио через фильтры highpass/lowpass/volume, даже если файл уже в формате 16 kHz mono и перекодирование можно пропустить.'),
+    ]):
+        f = option(f)
+    return f
+
+
+def formats_option(f):
+    """The --formats option, shared by the transcribing commands."""
+    def parse(ctx, param, value: str) -> List[str]:
+        try:
+            return parse_formats(value)
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+
+    return click.option('-f', '--formats', default='txt', show_default=True, callback=parse, help=f"Форматы результата через запятую ({', '.join(OUTPUT_FORMATS)}); все получаются из одного прохода whisper, субтитры — рядом с .txt.")(f)
+
+
+def load_manifest(path: Optional[Path]) -> Optional[LanguageManifest]:
+    """Reads --language-manifest, turning parse errors into usage errors."""
+    if path is None:
+        return None
+    try:
+        return LanguageManifest.load(path)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--language-manifest")
+
+
+def cache_options(f):
+    """Transcript cache options, shared by the transcribing commands."""
+    for option in reversed([
+        click.option('--cache/--no-cache', 'use_cache', default=True, show_default=True, help='Брать готовые транскрипции из кэша по содержимому файла, модели и параметрам.'),
+        click.option('--cache-dir', default=CACHE_DIR, show_default=True, type=click.Path(file_okay=False, path_type=Path), help='Каталог кэша транскрипций.'),
+        click.option('--cache-size', default=DEFAULT_CACHE_SIZE_MB, show_default=True, type=click.IntRange(min=1), help='Максимальный размер кэша транскрипций, МБ (старые записи вытесняются).'),
+    ]):
+        f = option(f)
+    return f
+
+
+@click.group(cls=DefaultCommandGroup, default_command='transcribe',
+             context_settings=dict(help_option_names=['-h', '--help']))
+@click.option('--profile-startup', is_flag=True, help='Показать время запуска (импорт модулей, поиск whisper.cpp и моделей) и сохранить его в метрики.')
+@click.pass_context
+def cli(ctx: click.Context, profile_startup: bool):
+    """Быстрая и качественная транскрипция аудио/видео файлов через whisper.cpp."""
+    kill_on_interrupt()
+    if profile_startup:
+        ctx.call_on_close(lambda: show_startup_profile(ctx.invoked_subcommand))
+
+
+@cli.command('transcribe', epilog='Другие команды: watch — обработка новых файлов в папке; bench — замер скорости конвейера; tune — подбор потоков и параметров под эту машину; cache — размер и очистка кэшей (./run КОМАНДА --help).')
 @click.argument('input_files', type=click.Path(exists=True, path_type=Path), required=False, nargs=-1)
 @click.option('-o', '--output', type=click.Path(path_type=Path), help='Путь для сохранения результата (для одного файла).')
-@click.option('-m', '--model', default='large-v3', show_default=True, type=click.Choice(['tiny', 'base', 'small', 'medium', 'large-v2', 'large-v3']), help='Модель whisper.cpp.')
-@click.option('-l', '--language', default='ru', show_default=True, help='Язык аудио (ru, en, etc.).')
-@click.option('--threads', default=os.cpu_count() or 4, show_default=True, type=int, help='Количество потоков CPU.')
+@formats_option
+@model_options
 @click.option('--delete-temp/--keep-temp', 'delete_temp', default=True, show_default=True, help='Удалять или сохранять временный аудиофайл.')
+@click.option('--audio-cache-size', default=DEFAULT_AUDIO_CACHE_MB, show_default=True, type=click.IntRange(min=1), help='Максимальный размер сохранённого аудио в temp/audio, МБ (с --keep-temp; давно не использованные файлы вытесняются).')
 @click.option('--overwrite/--no-overwrite', 'overwrite', default=False, show_default=True, help='Перезаписывать существующие транскрипции.')
+@click.option('--prefetch', default=1, show_default=True, type=click.IntRange(min=0), help='Сколько следующих файлов конвертировать заранее, пока идёт транскрипция (0 — последовательно; только без потокового режима).')
+@click.option('--stream/--no-stream', 'stream', default=True, show_default=True, help='Передавать аудио из ffmpeg в whisper потоком, без временного FLAC (не действует с --keep-temp).')
+@click.option('--parallel-chunks', default=0, show_default=True, type=click.IntRange(min=0), help='На сколько параллельных процессов whisper делить длинный файл (0 — автоматически по длительности, 1 — не делить).')
+@click.option('--resume/--no-resume', 'resume', default=True, show_default=True, help='Сохранять готовые сегменты в temp/ и продолжать прерванную транскрипцию с места остановки.')
+@click.option('-j', '--jobs', 'job_count', default=1, show_default=True, type=click.IntRange(min=0), help='Сколько файлов транскрибировать одновременно, поровну деля --threads (0 — автоматически по длительности файлов и истории запусков; только с --backend cli).')
+@click.option('--order', default='longest-first', show_default=True, type=click.Choice(BATCH_ORDERS), help='Порядок обработки пакета: как указаны, сначала длинные (по прогнозу времени; с --jobs даёт минимальное общее время) или сначала короткие файлы.')
+@click.option('--backend', default='cli', show_default=True, type=click.Choice(['cli', 'server']), help='cli — запуск whisper-cli для каждого файла; server — один whisper-server с загруженной моделью на весь пакет.')
+@click.option('--language-manifest', 'manifest', type=click.Path(exists=True, dir_okay=False, path_type=Path), callback=lambda ctx, param, value: load_manifest(value), help='CSV («файл,язык») или JSON ({"файл": "язык"}) с языком отдельных файлов; остальные берут --language. Все файлы идут через одну загруженную модель.')
+@click.option('--draft-model', type=click.Choice(['tiny', 'base', 'small']), help='Сначала быстро записать черновики всех файлов этой моделью, затем заменить их результатом основной модели (--model).')
+@cache_options
+@click.option('--trace', 'trace_path', type=click.Path(dir_okay=False, path_type=Path), help='Записать время каждого этапа обработки (конвертация, пробинг, кэш, история, whisper) в файл.')
+@click.option('--trace-format', default='jsonl', show_default=True, type=click.Choice(TRACE_FORMATS), help='Формат трассировки: jsonl — по строке на этап; chrome — для chrome://tracing и Perfetto.')
 @click.option('-v', '--verbose', is_flag=True, help='Подробный вывод для отладки.')
-def main(input_files: Iterable[Path], output: Optional[Path], model: str, language: str, threads: int, delete_temp: bool, overwrite: bool, verbose: bool):
+def main(input_files: Iterable[Path], output: Optional[Path], formats: List[str], model: str, language: str, threads: Optional[int], preset: str, stall_timeout: int, trim_silence: bool, force_filters: bool, delete_temp: bool, audio_cache_size: int, overwrite: bool, prefetch: int, stream: bool, parallel_chunks: int, resume: bool, job_count: int, order: str, backend: str, manifest: Optional[LanguageManifest], draft_model: Optional[str], use_cache: bool, cache_dir: Path, cache_size: int, trace_path: Optional[Path], trace_format: str, verbose: bool):
     """Быстрая и качественная транскрипция аудио/видео файлов через whisper.cpp."""
     if verbose:
         # If verbose mode is on, show all logs from DEBUG level
@@ -74,6 +286,9 @@ def main(input_files: Iterable[Path], output: Optional[Path], model: str, langua
     
     console.rule("[bold green]🚀 Video2Note (whisper.cpp)[/bold green]")
 
+    # A temp FLAC is only worth writing when the user asked to keep it as a cache
+    stream = stream and delete_temp
+
     try:
         files_to_process = list(input_files)
         if not files_to_process:
@@ -91,8 +306,19 @@ def main(input_files: Iterable[Path], output: Optional[Path], model: str, langua
                 console.print(f"❌ [bold red]Неподдерживаемый формат:[/bold red] {file.name} - файл пропущен.")
                 continue
 
-        config = TranscriptionConfig(model_name=model, language=language, threads=threads)
+        config = build_config(model, language, threads, preset, stall_timeout=stall_timeout,
+                              trim_silence=trim_silence, force_filters=force_filters)
+        if draft_model == model:
+            draft_model = None
+        # Resolved up front, so a missing draft model fails before any work starts; drafts decode like the fast preset
+        draft_decoding = resolve_decoding(draft_model, 'fast') if draft_model else None
+        draft_config = replace(config, model_name=draft_model, beam_size=draft_decoding.beam_size,
+                               best_of=draft_decoding.best_of) if draft_decoding else None
         show_intro(files_to_process, config)
+        if manifest is not None:
+            console.print(f"🌐 [bold]Языки по файлам:[/bold] записей в списке — {len(manifest)}, для остальных — {language}")
+        if draft_config:
+            console.print(f"📝 [bold]Черновики:[/bold] [cyan]{draft_config.model_path.name}[/cyan], затем уточнение основной моделью")
 
         script_dir = Path(__file__).parent.resolve()
         temp_dir = script_dir / TEMP_DIR_NAME
@@ -100,25 +326,89 @@ def main(input_files: Iterable[Path], output: Optional[Path], model: str, langua
         temp_dir.mkdir(exist_ok=True)
         output_dir.mkdir(exist_ok=True)
         
-        for input_file in files_to_process:
-            console.rule(f"[bold blue]Обработка: {input_file.name}[/bold blue]")
-            output_path = output if output else output_dir / f"{get_safe_filename(input_file.stem)}.txt"
+        jobs = [
+            BatchJob(input_file, output if output else output_dir / f"{get_safe_filename(input_file.stem)}.txt", formats,
+                     language=manifest.lookup(input_file) if manifest else None)
+            for input_file in files_to_process
+        ]
 
-            # Skip if transcript exists and overwrite disabled
-            if not overwrite and is_nonempty_text_file(output_path):
-                console.print(f"[yellow]Пропуск:[/yellow] уже есть транскрипция → {output_path.name}")
-                continue
-            
-            try:
-                result = run_pipeline(input_file, config, temp_dir, output_path, delete_temp)
-                show_summary(result)
-            except Video2NoteError as e:
-                logger.error(f"Не удалось обработать файл {input_file.name}: {e}", exc_info=verbose)
-                console.print(f"❌ [bold red]Ошибка при обработке {input_file.name}:[/bold red] {escape(str(e))}")
+        if job_count > 1 and backend == 'server':
+            console.print("[yellow]--jobs не используется с --backend server: один сервер обрабатывает файлы по очереди.[/yellow]")
+        with console.status("🔎 Определяю длительность файлов..."):
+            plan = plan_batch(jobs, config, order=order, overwrite=overwrite, parallel_chunks=parallel_chunks,
+                              workers=1 if backend == 'server' else job_count)
+        jobs = plan.jobs
+        workers = plan.workers
+        cache = TranscriptCache(cache_dir, cache_size * 1024 * 1024) if use_cache else None
+        # Languages are worth showing when they differ from file to file
+        show_language = manifest is not None or language == AUTO_LANGUAGE
+        if any(job.configure(config).language == AUTO_LANGUAGE for job in jobs):
+            # One model load detects every file not in the cache; the draft model, if any, is quicker and good enough for that
+            jobs = detect_batch_languages(jobs, config, overwrite, cache, detect_config=draft_config)
+            languages = Counter(job.detected_language or job.configure(config).language for job in jobs)
+            console.print("🌐 [bold]Языки:[/bold] " + ", ".join(f"{name} — {count}" for name, count in languages.most_common()))
+        if workers > 1:
+            console.print(f"⚙️  [bold]Одновременно:[/bold] {workers} файла по {max(1, config.threads // workers)} потоков")
+        if len(jobs) > 1 and plan.eta:
+            note = f" [dim](без учёта файлов без истории: {plan.unknown})[/dim]" if plan.unknown else ""
+            console.print(f"⏱️  [bold]Ожидаемое время пакета:[/bold] {format_eta(plan.eta)}{note}")
+
+        def announce(job: BatchJob):
+            console.rule(f"[bold blue]Обработка: {job.input_file.name}[/bold blue]")
+
+        audio_cache = AudioCache(temp_dir / AUDIO_CACHE_DIR_NAME, audio_cache_size * 1024 * 1024)
+
+        def run_phase(phase_jobs, phase_config, transcription_backend=None):
+            if workers > 1:
+                return run_parallel_batch(
+                    phase_jobs, phase_config, temp_dir, delete_temp, workers,
+                    overwrite=overwrite,
+                    stream=stream,
+                    cache=cache,
+                    parallel_chunks=parallel_chunks,
+                    resume=resume,
+                    on_start=lambda job: console.print(f"▶️  Начинаю: {job.input_file.name}"),
+                    audio_cache=audio_cache,
+                )
+            return run_batch(
+                phase_jobs, phase_config, temp_dir, delete_temp,
+                overwrite=overwrite,
+                prefetch_depth=prefetch,
+                prefetch_workers=min(max(prefetch, 1), 2),
+                backend=transcription_backend,
+                stream=stream,
+                cache=cache,
+                parallel_chunks=parallel_chunks,
+                resume=resume,
+                on_start=announce,
+                audio_cache=audio_cache,
+            )
+
+        def report(outcomes, trace):
+            with (shared_progress() if workers > 1 else nullcontext()):
+                for outcome in outcomes:
+                    if trace:
+                        trace.write(outcome.spans)
+                    show_outcome(outcome, verbose, show_language)
+
+        if backend == 'server':
+            from video2note.server import ServerBackend
+
+        with (TraceWriter(trace_path, trace_format) if trace_path else nullcontext()) as trace:
+            if draft_config:
+                # Drafts of every file come first; the server (if any) is started
+                # only afterwards, so loading the main model does not delay them
+                console.rule(f"[bold cyan]📝 Черновики ({draft_model})[/bold cyan]")
+                report(run_phase([replace(job, draft=True) for job in jobs], draft_config), trace)
+                console.rule(f"[bold cyan]🎯 Уточнение ({model})[/bold cyan]")
+            with (ServerBackend(config) if backend == 'server' else nullcontext()) as transcription_backend:
+                report(run_phase(jobs, config, transcription_backend), trace)
 
         # --- Final Cleanup ---
         if delete_temp:
             try:
+                if audio_cache.cache_dir.is_dir() and not any(audio_cache.cache_dir.iterdir()):
+                    audio_cache.cache_dir.rmdir()
                 if temp_dir.is_dir() and not any(temp_dir.iterdir()):
                     logger.info(f"Удаляю пустую временную директорию: {temp_dir.name}")
                     temp_dir.rmdir()
@@ -138,5 +428,193 @@ def main(input_files: Iterable[Path], output: Optional[Path], model: str, langua
     console.rule("[bold green]✅ Все задачи выполнены[/bold green]")
 
 
+@cli.command()
+@click.argument('directory', type=click.Path(exists=True, file_okay=False, path_type=Path))
+@click.option('-o', '--output-dir', type=click.Path(file_okay=False, path_type=Path), help='Куда сохранять транскрипции (по умолчанию transcripts/).')
+@formats_option
+@model_options
+@click.option('--backend', default='server', show_default=True, type=click.Choice(['cli', 'server']), help='server — модель остаётся загруженной между файлами; cli — запуск whisper-cli для каждого файла.')
+@click.option('--stream/--no-stream', 'stream', default=True, show_default=True, help='Передавать аудио из ffmpeg в whisper потоком, без временного FLAC.')
+@click.option('--parallel-chunks', default=0, show_default=True, type=click.IntRange(min=0), help='На сколько параллельных процессов whisper делить длинный файл (0 — автоматически).')
+@cache_options
+@click.option('--recursive', is_flag=True, help='Следить и за вложенными папками.')
+@click.option('--poll-interval', default=DEFAULT_POLL_INTERVAL, show_default=True, type=click.FloatRange(min=0.5), help='Как часто проверять папку, с.')
+@click.option('--settle', default=DEFAULT_SETTLE_SECONDS, show_default=True, type=click.FloatRange(min=0), help='Сколько секунд файл должен не меняться, чтобы считаться скопированным.')
+@click.option('--queue', 'queue_path', default=WATCH_QUEUE_DB, show_default=True, type=click.Path(dir_okay=False, path_type=Path), help='Файл очереди; прерванные задачи продолжаются после перезапуска.')
+@click.option('--trace', 'trace_path', type=click.Path(dir_okay=False, path_type=Path), help='Записывать время этапов обработки в файл.')
+@click.option('--trace-format', default='jsonl', show_default=True, type=click.Choice(TRACE_FORMATS), help='Формат трассировки.')
+@click.option('-v', '--verbose', is_flag=True, help='Подробный вывод для отладки.')
+def watch(directory: Path, output_dir: Optional[Path], formats: List[str], model: str, language: str, threads: Optional[int], preset: str, stall_timeout: int, trim_silence: bool, force_filters: bool, backend: str, stream: bool, parallel_chunks: int, use_cache: bool, cache_dir: Path, cache_size: int, recursive: bool, poll_interval: float, settle: float, queue_path: Path, trace_path: Optional[Path], trace_format: str, verbose: bool):
+    """Следить за папкой и транскрибировать новые файлы, как только они докопированы."""
+    if verbose:
+        rich_handler.setLevel(logging.DEBUG)
+    console.rule(f"[bold green]👀 Video2Note watch: {escape(str(directory))}[/bold green]")
+
+    try:
+        config = build_config(model, language, threads, preset, stall_timeout=stall_timeout,
+                              trim_silence=trim_silence, force_filters=force_filters)
+        script_dir = Path(__file__).parent.resolve()
+        temp_dir = script_dir / TEMP_DIR_NAME
+        output_dir = output_dir or script_dir / TRANSCRIPTS_DIR_NAME
+        temp_dir.mkdir(exist_ok=True)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        cache = TranscriptCache(cache_dir, cache_size * 1024 * 1024) if use_cache else None
+
+        def announce(job: BatchJob):
+            console.rule(f"[bold blue]Обработка: {job.input_file.name}[/bold blue]")
+
+        if backend == 'server':
+            from video2note.server import ServerBackend
+
+        with (ServerBackend(config) if backend == 'server' else nullcontext()) as transcription_backend, \
+                (TraceWriter(trace_path, trace_format) if trace_path else nullcontext()) as trace, \
+                WatchQueue(queue_path) as queue:
+            def report(outcome):
+                if trace:
+                    trace.write(outcome.spans)
+                show_outcome(outcome, verbose, language == AUTO_LANGUAGE)
+                console.print("👀 Жду новые файлы... (Ctrl+C — остановить)")
+
+            console.print("👀 Жду новые файлы... (Ctrl+C — остановить)")
+            watch_folder(
+                directory.resolve(), config, temp_dir, output_dir, queue,
+                backend=transcription_backend,
+                cache=cache,
+                stream=stream,
+                parallel_chunks=parallel_chunks,
+                poll_interval=poll_interval,
+                settle=settle,
+                recursive=recursive,
+                formats=formats,
+                on_start=announce,
+                on_outcome=report,
+            )
+    except KeyboardInterrupt:
+        console.print("\n⏹️  Остановлено. Незавершённые файлы будут обработаны при следующем запуске.")
+    except Video2NoteError as e:
+        logger.critical(f"Критическая ошибка: {e}", exc_info=verbose)
+        console.print(f"❌ [bold red]Критическая ошибка:[/bold red] {escape(str(e))}")
+        sys.exit(1)
+
+
+@cli.command()
+@click.option('--lengths', default='30,300', show_default=True, help='Длительности синтетических записей в секундах, через запятую.')
+@click.option('--threads', 'thread_counts', multiple=True, type=click.IntRange(min=1), help='Количество потоков CPU; можно указать несколько раз для сравнения (по умолчанию — физические ядра с учётом квоты CPU).')
+@click.option('-m', '--model', default='base', show_default=True, type=click.Choice(['tiny', 'base', 'small', 'medium', 'large-v2', 'large-v3']), help='Модель whisper.cpp (для заглушки не нужна).')
+@click.option('-l', '--language', default='ru', show_default=True, help='Язык аудио.')
+@click.option('--stub/--real', 'stub', default=True, show_default=True, help='Заглушка whisper-cli, имитирующая загрузку модели и декодирование, или настоящий whisper-cli.')
+@click.option('--stub-load', default=1.0, show_default=True, type=click.FloatRange(min=0), help='Сколько секунд заглушка «загружает модель».')
+@click.option('--stub-rtf', default=0.1, show_default=True, type=click.FloatRange(min=0), help='CPU-секунд заглушки на секунду аудио (делится на число потоков).')
+@click.option('--repeat', default=1, show_default=True, type=click.IntRange(min=1), help='Сколько раз повторить каждый замер.')
+@click.option('--work-dir', type=click.Path(file_okay=False, path_type=Path), help='Где хранить сгенерированные записи между запусками (по умолчанию — временный каталог).')
+@click.option('--json', 'json_path', type=click.Path(dir_okay=False, allow_dash=True, path_type=Path), help='Сохранить результаты в JSON (- — вывести в stdout).')
+@click.option('-v', '--verbose', is_flag=True, help='Подробный вывод для отладки.')
+def bench(lengths: str, thread_counts: tuple[int, ...], model: str, language: str, stub: bool, stub_load: float, stub_rtf: float, repeat: int, work_dir: Optional[Path], json_path: Optional[Path], verbose: bool):
+    """Замер времени этапов конвейера на синтетическом аудио: пробинг, ffmpeg, загрузка модели, декодирование."""
+    from video2note.bench import run_benchmark
+
+    rich_handler.setLevel(logging.DEBUG if verbose else logging.WARNING)
+    try:
+        seconds = [int(v) for v in lengths.split(',') if v.strip()]
+    except ValueError:
+        raise click.BadParameter("ожидаются целые числа через запятую", param_hint="--lengths")
+    if not seconds or min(seconds) <= 0:
+        raise click.BadParameter("ожидаются положительные длительности", param_hint="--lengths")
+
+    console.rule("[bold green]⏱️  Video2Note bench[/bold green]")
+    try:
+        report = run_benchmark(
+            seconds, thread_counts or [default_threads()], model, language,
+            stub=stub, stub_load=stub_load, stub_rtf=stub_rtf, repeats=repeat, work_dir=work_dir,
+            on_result=lambda r: console.print(f"✔ {r.seconds} с аудио, {r.threads} потоков: {r.total_time:.2f} с"),
+        )
+    except Video2NoteError as e:
+        console.print(f"❌ [bold red]Ошибка бенчмарка:[/bold red] {escape(str(e))}")
+        sys.exit(1)
+
+    show_bench_results(report)
+    if json_path is not None:
+        payload = json.dumps(report.to_dict(), ensure_ascii=False, indent=2)
+        if str(json_path) == '-':
+            click.echo(payload)
+        else:
+            json_path.write_text(payload, encoding='utf-8')
+            console.print(f"💾 Результаты сохранены: {json_path}")
+
+
+@cli.command()
+@click.argument('sample', type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option('-m', '--model', default='large-v3', show_default=True, type=click.Choice(['tiny', 'base', 'small', 'medium', 'large-v2', 'large-v3']), help='Модель whisper.cpp, для которой подбирается профиль.')
+@click.option('-l', '--language', default='ru', show_default=True, help='Язык образца.')
+@click.option('--seconds', default=DEFAULT_TUNE_SECONDS, show_default=True, type=click.IntRange(min=10), help='Сколько секунд от начала образца декодировать в каждом замере.')
+@click.option('--threads', 'thread_counts', multiple=True, type=click.IntRange(min=1), help='Проверяемое число потоков; можно указать несколько раз (по умолчанию — от четверти физических ядер до всех доступных CPU).')
+@click.option('-v', '--verbose', is_flag=True, help='Подробный вывод для отладки.')
+def tune(sample: Path, model: str, language: str, seconds: int, thread_counts: tuple[int, ...], verbose: bool):
+    """Подобрать потоки и параметры декодирования для этой машины по записи с речью и сохранить профили fast/balanced/accurate."""
+    rich_handler.setLevel(logging.DEBUG if verbose else logging.WARNING)
+    console.rule("[bold green]🎛️  Video2Note tune[/bold green]")
+    quota = cpu_quota()
+    console.print(f"🖥️  [bold]CPU:[/bold] логических {os.cpu_count()}, доступно {available_cpus()}, физических ядер {physical_cores()}"
+                  + (f", квота контейнера {quota:g}" if quota is not None else ""))
+    try:
+        config = TranscriptionConfig(model_name=model, language=language, threads=default_threads())
+        results = run_tuning(
+            sample, config, seconds, thread_counts,
+            on_result=lambda r: console.print(f"✔ {r.threads} потоков, beam {r.beam_size}: {r.seconds:.2f} с, совпадение {r.agreement:.1%}"),
+        )
+    except Video2NoteError as e:
+        console.print(f"❌ [bold red]Ошибка калибровки:[/bold red] {escape(str(e))}")
+        sys.exit(1)
+
+    profiles = choose_profiles(results, model)
+    store = MetricsStore()
+    for profile in profiles.values():
+        store.save_profile(profile)
+    show_tuning_results(results, profiles)
+    console.print(f"💾 Профили для модели {model} сохранены; они применяются автоматически (--preset {'/'.join(PRESETS)}).")
+
+
+@cli.group('cache')
+def cache_group():
+    """Размер и очистка кэша транскрипций и сохранённого аудио (temp/audio)."""
+
+
+def cache_dir_options(f):
+    """Locations and budgets of the caches, for the cache subcommands."""
+    for option in reversed([
+        click.option('--cache-dir', default=CACHE_DIR, show_default=True, type=click.Path(file_okay=False, path_type=Path), help='Каталог кэша транскрипций.'),
+        click.option('--cache-size', default=DEFAULT_CACHE_SIZE_MB, show_default=True, type=click.IntRange(min=1), help='Лимит кэша транскрипций, МБ.'),
+        click.option('--audio-cache-size', default=DEFAULT_AUDIO_CACHE_MB, show_default=True, type=click.IntRange(min=1), help='Лимит сохранённого аудио, МБ.'),
+    ]):
+        f = option(f)
+    return f
+
+
+def open_caches(cache_dir: Path, cache_size: int, audio_cache_size: int) -> tuple[TranscriptCache, AudioCache]:
+    """The transcript and audio caches as the transcribe command sees them."""
+    temp_dir = Path(__file__).parent.resolve() / TEMP_DIR_NAME
+    return (TranscriptCache(cache_dir, cache_size * 1024 * 1024),
+            AudioCache(temp_dir / AUDIO_CACHE_DIR_NAME, audio_cache_size * 1024 * 1024))
+
+
+@cache_group.command('stats')
+@cache_dir_options
+def cache_stats(cache_dir: Path, cache_size: int, audio_cache_size: int):
+    """Показать, сколько места занимают кэши."""
+    show_cache_stats(*open_caches(cache_dir, cache_size, audio_cache_size))
+
+
+@cache_group.command('prune')
+@cache_dir_options
+@click.option('--all', 'prune_all', is_flag=True, help='Удалить все записи, а не только выходящие за лимит.')
+def cache_prune(cache_dir: Path, cache_size: int, audio_cache_size: int, prune_all: bool):
+    """Сократить кэши до их лимитов и удалить остатки прерванных конвертаций."""
+    transcripts, audio = open_caches(cache_dir, cache_size, audio_cache_size)
+    budget = 0 if prune_all else None
+    for name, removed in (("транскрипций", transcripts.evict(budget)), ("аудио", audio.prune(budget))):
+        console.print(f"🧹 Кэш {name}: удалено файлов {removed.files}, освобождено {removed.bytes / 1024 / 1024:.1f} МБ")
+    show_cache_stats(transcripts, audio)
+
+
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    cli()
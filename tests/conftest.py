@@ -0,0 +1,74 @@
+"""Shared fixtures: a TranscriptionConfig on a fake whisper.cpp tree, and state kept out of the checkout."""
+import os
+import stat
+import sys
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from video2note.bench import STUB_LOAD_ENV, STUB_RTF_ENV, write_stub_whisper
+from video2note.config import TranscriptionConfig, discovery_cache
+from video2note.metrics import MetricsStore
+
+
+@pytest.fixture(autouse=True)
+def isolated_state(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keeps the discovery state and the run-metrics database of a test in its temp directory."""
+    monkeypatch.setattr(discovery_cache, "path", tmp_path / "state.json")
+    monkeypatch.setattr(discovery_cache, "_entries", None)
+    monkeypatch.setattr(MetricsStore.__init__, "__defaults__", (tmp_path / "metrics.sqlite3",))
+
+
+@pytest.fixture
+def config(tmp_path: Path) -> TranscriptionConfig:
+    """A configuration whose model and whisper-cli are empty placeholder files."""
+    models_dir = tmp_path / "models"
+    models_dir.mkdir()
+    (models_dir / "ggml-base.bin").write_bytes(b"model")
+    whisper_bin = tmp_path / "whisper-cli"
+    whisper_bin.write_text("")
+    return TranscriptionConfig(model_name="base", language="ru", threads=4,
+                               whisper_bin=whisper_bin, models_dir=models_dir)
+
+
+FAKE_FFMPEG = '''\
+import os
+import sys
+
+SECONDS = int(os.environ.get("FAKE_FFMPEG_SECONDS", "20"))
+args = sys.argv[1:]
+if os.environ.get("FAKE_FFMPEG_FAIL"):
+    print("fake ffmpeg failed", file=sys.stderr)
+    sys.exit(1)
+out = args[-1]
+if out == "pipe:1":
+    # A streamed WAV: header, then 16 kHz mono s16le samples
+    sys.stdout.buffer.write(b"RIFF" + b"\\0" * 40 + b"\\0" * (32000 * SECONDS))
+elif out != "-":
+    # A FLAC whose STREAMINFO states SECONDS of 16 kHz audio, as the stub whisper-cli reads it
+    info = (16000 << 44) | (15 << 36) | (16000 * SECONDS)
+    with open(out, "wb") as f:
+        f.write(b"fLaC" + b"\\x80\\x00\\x00\\x22" + b"\\0" * 10 + info.to_bytes(8, "big") + b"\\0" * 100)
+print("progress=end", file=sys.stderr)
+'''
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Puts an ffmpeg on PATH that writes FAKE_FFMPEG_SECONDS of silent audio to its output."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = bin_dir / "ffmpeg"
+    script.write_text(f"#!{sys.executable}\n{FAKE_FFMPEG}", encoding="utf-8")
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    return script
+
+
+@pytest.fixture
+def stub_config(config: TranscriptionConfig, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> TranscriptionConfig:
+    """``config`` with the instant stub whisper-cli of `video2note bench`, which prints a segment per 5 s."""
+    monkeypatch.setenv(STUB_LOAD_ENV, "0")
+    monkeypatch.setenv(STUB_RTF_ENV, "0")
+    return replace(config, whisper_bin=write_stub_whisper(tmp_path))
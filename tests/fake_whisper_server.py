@@ -0,0 +1,77 @@
+"""
+A stand-in for whisper.cpp's whisper-server, for tests of the HTTP protocol.
+
+Answers /health, and /inference with a verbose_json transcript that echoes
+the requested language and the upload size. FAKE_SERVER_MODE changes how
+/inference behaves: ``error`` answers HTTP 500, ``die`` exits without an
+answer, and ``slow`` sleeps before answering.
+"""
+import argparse
+import json
+import os
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, data: dict) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok"})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def _read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            body = b""
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return body
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers["Content-Length"]))
+
+    def do_POST(self):
+        body = self._read_body()
+        mode = os.environ.get("FAKE_SERVER_MODE", "ok")
+        if mode == "die":
+            os._exit(1)
+        if mode == "slow":
+            time.sleep(30)
+        if mode == "error":
+            self._reply(500, {"error": "model failed"})
+            return
+        language = re.search(rb'name="language"\r\n\r\n(\w+)\r\n', body)
+        self._reply(200, {
+            "text": "hello",
+            "segments": [
+                {"start": 0.0, "end": 1.5, "text": f" language {language.group(1).decode() if language else 'default'}"},
+                {"start": 1.5, "end": 3.0, "text": f" bytes {len(body)}"},
+                {"start": 3.0, "end": 3.5, "text": "  "},
+            ],
+        })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    args, _ = parser.parse_known_args()
+    ThreadingHTTPServer((args.host, args.port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
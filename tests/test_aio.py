@@ -0,0 +1,120 @@
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from video2note import aio
+from video2note.aio import AsyncTranscriber
+from video2note.core import TranscriptionResult
+from video2note.exceptions import TranscriptionError
+from video2note.supervisor import ProcessSupervisor, start_process
+from video2note.ui import progress_task
+
+
+class FakePipeline:
+    """
+    Stands in for run_pipeline(): reports one progress step, then fails for
+    "fail.mp4", runs a supervised process until cancelled for "slow.mp4",
+    and succeeds for anything else after ``delay`` seconds.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.processes = []
+        self.started = threading.Event()
+        self.running = 0
+        self.peak = 0
+        # Whether the supervised processes were all gone when each later job started
+        self.killed_before = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, input_file, config, temp_dir, output_path, delete_temp, **kwargs):
+        self.killed_before[input_file.name] = all(proc.poll() is not None for proc in self.processes)
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            with progress_task("Распознавание", None) as report:
+                report(0.5)
+            if input_file.name == "fail.mp4":
+                raise TranscriptionError("Сбой распознавания.")
+            if input_file.name == "slow.mp4":
+                proc = start_process([sys.executable, "-c", "import time; time.sleep(30)"],
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                self.processes.append(proc)
+                self.started.set()
+                with ProcessSupervisor(stall_timeout=60) as supervisor:
+                    supervisor.watch(proc, "sleep", TranscriptionError)
+                    supervisor.wait()
+            time.sleep(self.delay)
+            return TranscriptionResult(input_file, output_path, 1.0, 1.0)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    fake = FakePipeline()
+    monkeypatch.setattr(aio, "run_pipeline", fake)
+    return fake
+
+
+async def collect(job):
+    return [event async for event in job.events()]
+
+
+def test_cancel_kills_the_processes_before_freeing_the_slot(config, tmp_path, pipeline):
+    async def main():
+        async with AsyncTranscriber(config, tmp_path, max_concurrency=1) as transcriber:
+            slow = transcriber.submit(tmp_path / "slow.mp4", tmp_path / "slow.txt")
+            waiting = transcriber.submit(tmp_path / "next.mp4", tmp_path / "next.txt")
+            await asyncio.get_running_loop().run_in_executor(None, pipeline.started.wait, 10)
+            slow.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await slow
+            assert (await waiting).source_file.name == "next.mp4"
+            return await collect(slow)
+
+    events = asyncio.run(main())
+    assert [event.fraction for event in events] == [None, 0.5]
+    assert pipeline.processes[0].poll() is not None
+    assert pipeline.killed_before["next.mp4"]
+
+
+@pytest.mark.parametrize("name, outcome", [("ok.mp4", None), ("fail.mp4", TranscriptionError)])
+def test_events_end_when_the_job_ends(config, tmp_path, pipeline, name, outcome):
+    async def main():
+        async with AsyncTranscriber(config, tmp_path) as transcriber:
+            seen = []
+            job = transcriber.submit(tmp_path / name, tmp_path / "out.txt", on_progress=seen.append)
+            events = asyncio.ensure_future(collect(job))
+            if outcome:
+                with pytest.raises(outcome):
+                    await job
+            else:
+                await job
+            return await asyncio.wait_for(events, 5), seen
+
+    events, seen = asyncio.run(main())
+    assert events == seen
+    assert [(event.input_file.name, event.step, event.fraction) for event in events] == [
+        (name, "Распознавание", None), (name, "Распознавание", 0.5)]
+
+
+def test_max_concurrency_is_enforced(config, tmp_path, monkeypatch):
+    pipeline = FakePipeline(delay=0.2)
+    monkeypatch.setattr(aio, "run_pipeline", pipeline)
+
+    async def main():
+        async with AsyncTranscriber(config, tmp_path, max_concurrency=2) as transcriber:
+            assert transcriber.config.threads == config.threads // 2
+            jobs = [transcriber.submit(tmp_path / f"{i}.mp4", tmp_path / f"{i}.txt") for i in range(5)]
+            return await asyncio.gather(*jobs)
+
+    results = asyncio.run(main())
+    assert len(results) == 5
+    assert pipeline.peak == 2
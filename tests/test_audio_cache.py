@@ -0,0 +1,81 @@
+import os
+import time
+
+import pytest
+
+from video2note.audio_cache import STALE_TMP_SECONDS, AudioCache
+from video2note.exceptions import FfmpegError
+from video2note.transcriber import prepare_audio_source
+
+
+def write(path, size, age=0.0):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * size)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.fixture
+def media(tmp_path):
+    return write(tmp_path / "talk.mp4", 10)
+
+
+def test_conversion_is_cached_and_reused(tmp_path, media, fake_ffmpeg, monkeypatch):
+    cache = AudioCache(tmp_path / "audio")
+    audio = prepare_audio_source(media, tmp_path, audio_cache=cache)
+    assert audio == cache.path_for(media, "audio", ".flac") and audio.exists()
+    # A second run must not start ffmpeg at all
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "1")
+    assert prepare_audio_source(media, tmp_path, audio_cache=cache) == audio
+    assert [p.name for p in cache.cache_dir.iterdir()] == [audio.name]
+
+
+def test_failed_conversion_leaves_no_file(tmp_path, media, fake_ffmpeg, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "1")
+    cache = AudioCache(tmp_path / "audio")
+    with pytest.raises(FfmpegError):
+        prepare_audio_source(media, tmp_path, audio_cache=cache)
+    assert list(cache.cache_dir.iterdir()) == []
+
+
+def test_failed_write_removes_its_partial_file(tmp_path):
+    cache = AudioCache(tmp_path / "audio")
+    target = cache.cache_dir / "talk.audio.flac"
+    with pytest.raises(RuntimeError):
+        with cache.writing(target) as tmp:
+            assert tmp.suffix == ".flac" and tmp.name.startswith(".")
+            tmp.write_bytes(b"half")
+            raise RuntimeError("killed")
+    assert list(cache.cache_dir.iterdir()) == []
+
+
+def test_eviction_removes_least_recently_used_but_never_keep(tmp_path):
+    cache = AudioCache(tmp_path / "audio", max_bytes=250)
+    oldest = write(cache.cache_dir / "oldest.flac", 100, age=300)
+    old = write(cache.cache_dir / "old.flac", 100, age=200)
+    recent = write(cache.cache_dir / "recent.flac", 100, age=100)
+    # A lookup makes the oldest file the most recently used
+    assert cache.lookup(oldest)
+    with cache.writing(cache.cache_dir / "new.flac") as tmp:
+        tmp.write_bytes(b"\0" * 100)
+    assert sorted(p.name for p in cache.cache_dir.iterdir()) == ["new.flac", "oldest.flac"]
+    assert not old.exists() and not recent.exists()
+
+    # Even an entry over the whole budget survives when it is the one just written
+    huge = cache.cache_dir / "huge.flac"
+    with cache.writing(huge) as tmp:
+        tmp.write_bytes(b"\0" * 1000)
+    assert [p.name for p in cache.cache_dir.iterdir()] == ["huge.flac"]
+
+
+def test_prune_removes_only_stale_leftovers(tmp_path):
+    cache = AudioCache(tmp_path / "audio")
+    stale = write(cache.cache_dir / ".talk.123.456.tmp.flac", 10, age=STALE_TMP_SECONDS + 60)
+    # Possibly still being written by another process
+    fresh = write(cache.cache_dir / ".talk.789.456.tmp.flac", 10, age=60)
+    old_entry = write(cache.cache_dir / "talk.audio.flac", 10, age=STALE_TMP_SECONDS * 10)
+    other_dotfile = write(cache.cache_dir / ".keep", 10, age=STALE_TMP_SECONDS + 60)
+    assert cache.prune().files == 1
+    assert not stale.exists()
+    assert fresh.exists() and old_entry.exists() and other_dotfile.exists()
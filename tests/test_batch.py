@@ -0,0 +1,18 @@
+from video2note import core
+from video2note.core import BatchJob, TranscriptionResult, run_parallel_batch
+
+
+def test_parallel_jobs_sharing_an_output_run_once(config, tmp_path, monkeypatch):
+    transcribed = []
+
+    def run_pipeline(input_file, job_config, temp_dir, output_path, delete_temp, **kwargs):
+        transcribed.append(input_file)
+        return TranscriptionResult(input_file, output_path, 1.0, 1.0)
+
+    monkeypatch.setattr(core, "run_pipeline", run_pipeline)
+    output = tmp_path / "transcripts" / "talk.txt"
+    jobs = [BatchJob(tmp_path / "a" / "talk.mp4", output), BatchJob(tmp_path / "b" / "talk.mp4", output),
+            BatchJob(tmp_path / "c" / "other.mp4", tmp_path / "transcripts" / "other.txt")]
+    outcomes = list(run_parallel_batch(jobs, config, tmp_path, True, workers=3, overwrite=True))
+    assert sorted(transcribed) == [jobs[0].input_file, jobs[2].input_file]
+    assert [outcome.job for outcome in outcomes if outcome.skipped] == [jobs[1]]
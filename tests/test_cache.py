@@ -0,0 +1,113 @@
+import os
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from video2note import core
+from video2note.cache import TranscriptCache
+from video2note.core import run_pipeline
+from video2note.segments import Segment
+
+
+@pytest.fixture
+def media(tmp_path: Path) -> Path:
+    path = tmp_path / "talk.mp4"
+    path.write_bytes(b"media" * 1000)
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path: Path) -> TranscriptCache:
+    return TranscriptCache(tmp_path / "cache", 1024 * 1024)
+
+
+def test_key_ignores_settings_that_only_affect_speed(cache, config, media):
+    key = cache.key(media, config)
+    assert key == cache.key(media, replace(config, threads=1))
+    assert key == cache.key(media, replace(config, threads=32, stall_timeout=5))
+
+
+@pytest.mark.parametrize("change", [
+    {"language": "en"},
+    {"language": "auto"},
+    {"beam_size": 1},
+    {"best_of": 1},
+    {"trim_silence": True},
+    {"force_filters": True},
+])
+def test_key_changes_with_settings_that_affect_the_transcript(cache, config, media, change):
+    assert cache.key(media, config) != cache.key(media, replace(config, **change))
+
+
+def test_key_follows_content_not_name(cache, config, media, tmp_path):
+    copy = tmp_path / "renamed.mkv"
+    copy.write_bytes(media.read_bytes())
+    assert cache.key(copy, config) == cache.key(media, config)
+    media.write_bytes(b"other")
+    assert cache.key(copy, config) != cache.key(media, config)
+
+
+def test_key_of_unreadable_file(cache, config, tmp_path):
+    assert cache.key(tmp_path / "missing.mp4", config) is None
+
+
+def test_roundtrip(cache, config, media):
+    key = cache.key(media, config)
+    segments = [Segment(0.0, 1.0, "один"), Segment(1.0, 2.5, "два")]
+    cache.put(key, "один\nдва", 2.5, media, segments, "ru")
+    entry = cache.get(key)
+    assert (entry.transcription, entry.duration, entry.segments, entry.language) == ("один\nдва", 2.5, segments, "ru")
+    assert cache.contains(media, replace(config, threads=1))
+
+
+def test_corrupt_entry_is_dropped(cache, config, media):
+    key = cache.key(media, config)
+    cache.put(key, "text", 1.0, media)
+    path = cache._entry_path(key)
+    path.write_text("{not json")
+    assert cache.get(key) is None
+    assert not path.exists()
+
+
+def test_evicts_least_recently_used(cache, config, media):
+    keys = [f"{i:02d}" + "0" * 62 for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, "x" * 100, 1.0, media)
+        os.utime(cache._entry_path(key), (i, i))
+    cache.get(keys[0])
+    removed = cache.evict(max_bytes=2 * cache._entry_path(keys[0]).stat().st_size)
+    assert removed.files == 1
+    assert [cache.get(key) is not None for key in keys] == [True, False, True]
+
+
+def test_auto_language_hit_skips_detection(cache, config, media, tmp_path, monkeypatch):
+    auto = replace(config, language="auto")
+    cache.put(cache.key(media, auto), "привет", 3.0, media, [Segment(0.0, 3.0, "привет")], "ru")
+
+    def detect(*args, **kwargs):
+        raise AssertionError("language detection must not run on a cache hit")
+
+    monkeypatch.setattr(core, "detect_languages", detect)
+    result = run_pipeline(media, replace(auto, threads=1), tmp_path, tmp_path / "talk.txt", delete_temp=True,
+                          cache=cache, record_metrics=False)
+    assert result.cached and result.language == "ru"
+    assert (tmp_path / "talk.txt").read_text(encoding="utf-8").strip() == "привет"
+
+
+def test_batch_detection_skips_cached_files(cache, config, media, tmp_path, monkeypatch):
+    auto = replace(config, language="auto")
+    other = tmp_path / "other.mp4"
+    other.write_bytes(b"other")
+    cache.put(cache.key(media, auto), "привет", 3.0, media, language="ru")
+    detected = []
+
+    def detect(files, detect_config):
+        detected.extend(files)
+        return {other: "en"}
+
+    monkeypatch.setattr(core, "detect_languages", detect)
+    jobs = [core.BatchJob(media, tmp_path / "a.txt"), core.BatchJob(other, tmp_path / "b.txt")]
+    jobs = core.detect_batch_languages(jobs, auto, cache=cache)
+    assert detected == [other]
+    assert [(job.language, job.detected_language) for job in jobs] == [(None, None), (None, "en")]
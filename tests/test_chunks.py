@@ -0,0 +1,61 @@
+import pytest
+
+from video2note.segments import Segment
+from video2note.transcriber import (_strip_repeated_prefix,
+                                    auto_parallel_chunks, plan_chunks,
+                                    stitch_chunks)
+
+
+@pytest.mark.parametrize("previous, text, expected", [
+    # A phrase both processes heard is cut, whatever its case and punctuation
+    ("и тогда мы решили пойти домой", "Пойти домой, а потом спать.", "а потом спать."),
+    ("one two three four", "three four five", "five"),
+    # One matching word is not enough to call it a repeat
+    ("это было хорошо", "Хорошо, продолжим", "Хорошо, продолжим"),
+    ("we agreed", "agreed with everyone", "agreed with everyone"),
+    ("nothing in common", "completely different", "completely different"),
+    ("", "text", "text"),
+])
+def test_strip_repeated_prefix(previous, text, expected):
+    assert _strip_repeated_prefix(previous, text) == expected
+
+
+def test_strip_repeated_prefix_can_remove_everything():
+    assert _strip_repeated_prefix("see you next week", "next week") == ""
+
+
+def test_stitch_drops_overlap_and_repeats():
+    first = [Segment(0.0, 4.0, "hello there"), Segment(4.0, 9.8, "we will talk about chunks")]
+    second = [
+        # Starts before its chunk: belongs to the previous one
+        Segment(8.0, 9.0, "early"),
+        Segment(9.9, 12.0, "about chunks and stitching"),
+        Segment(12.0, 15.0, "done"),
+        # Past the end of its chunk
+        Segment(20.0, 21.0, "late"),
+    ]
+    merged = stitch_chunks([((0.0, 10.0), first), ((10.0, 20.0), second)])
+    assert [s.text for s in merged] == ["hello there", "we will talk about chunks", "and stitching", "done"]
+    assert merged[2].start == 9.9
+
+
+def test_stitch_keeps_segment_order():
+    merged = stitch_chunks([((0.0, 10.0), [Segment(5.0, 6.0, "b"), Segment(1.0, 2.0, "a")])])
+    assert [s.text for s in merged] == ["a", "b"]
+
+
+def test_plan_chunks_cuts_at_nearby_silences():
+    chunks = plan_chunks(100.0, [(20.0, 22.0), (48.0, 50.0), (90.0, 91.0)], 2)
+    assert chunks == [(0.0, 49.0), (49.0, 100.0)]
+
+
+def test_plan_chunks_falls_back_to_even_cuts():
+    assert plan_chunks(90.0, [(5.0, 6.0)], 3) == [(0.0, 30.0), (30.0, 60.0), (60.0, 90.0)]
+    assert plan_chunks(90.0, [], 1) == [(0.0, 90.0)]
+
+
+def test_auto_parallel_chunks():
+    assert auto_parallel_chunks(10 * 60, 16) == 1
+    assert auto_parallel_chunks(60 * 60, 16) == 4
+    assert auto_parallel_chunks(60 * 60, 8) == 2
+    assert auto_parallel_chunks(3 * 60 * 60, 4) == 1
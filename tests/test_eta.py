@@ -0,0 +1,72 @@
+import math
+
+import numpy as np
+import pytest
+
+from video2note.metrics import MetricsStore, RunMetrics
+from video2note.utils import RuntimeModel, calculate_eta
+
+
+def seconds(duration: float, threads: int) -> float:
+    # 5 s of model loading, then 0.5 s per second of audio, less with more threads
+    return 5.0 + duration * (0.5 - 0.1 * math.log(threads))
+
+
+def test_recovers_an_exact_model_across_thread_counts():
+    durations = np.array([60, 120, 300, 60, 240, 600], dtype=float)
+    threads = np.array([2, 2, 4, 8, 8, 4], dtype=float)
+    model = RuntimeModel.fit(durations, threads, [seconds(d, t) for d, t in zip(durations, threads)])
+    assert model.columns.tolist() == [True, True, True]
+    estimate = model.predict(1800, 6)
+    assert estimate.seconds == pytest.approx(seconds(1800, 6))
+    assert estimate.high - estimate.low == pytest.approx(0.0, abs=1e-6)
+
+
+def test_one_thread_count_scales_inversely_with_threads():
+    durations = np.array([60, 120, 300], dtype=float)
+    model = RuntimeModel.fit(durations, [4, 4, 4], 2.0 + 0.2 * durations)
+    assert model.reference_threads == 4.0
+    assert model.predict(600, 8).seconds == pytest.approx(2.0 + 0.2 * 600 * 4 / 8)
+
+
+def test_one_duration_leaves_out_the_intercept_and_the_interval():
+    model = RuntimeModel.fit([120.0], [4], [30.0])
+    assert model.columns.tolist() == [False, True, False]
+    estimate = model.predict(240, 4)
+    assert estimate.seconds == pytest.approx(60.0)
+    assert estimate.low is None and estimate.high is None
+
+
+def test_noisy_samples_give_an_interval_around_the_estimate():
+    rng = np.random.default_rng(0)
+    durations = rng.uniform(60, 1200, 40)
+    threads = rng.choice([2, 4, 8], 40)
+    times = np.array([seconds(d, t) for d, t in zip(durations, threads)]) * rng.normal(1.0, 0.05, 40)
+    estimate = RuntimeModel.fit(durations, threads, times).predict(900, 4)
+    assert estimate.low < estimate.seconds < estimate.high
+    assert estimate.low < seconds(900, 4) < estimate.high
+
+
+@pytest.mark.parametrize("durations", [[], [0.0, 0.0]])
+def test_no_usable_samples(durations):
+    assert RuntimeModel.fit(durations, [4] * len(durations), [1.0] * len(durations)) is None
+
+
+def test_calculate_eta_uses_the_recorded_history(config):
+    assert calculate_eta(config, 600) is None
+    store = MetricsStore()
+    for duration in (60.0, 120.0, 300.0):
+        store.record(RunMetrics(signature="base|cpu|4", model="base", threads=4, vad=False, duration=duration,
+                                elapsed=duration, whisper_time=2.0 + 0.2 * duration, beam_size=config.beam_size))
+    assert calculate_eta(config, 600, vad=False).seconds == pytest.approx(2.0 + 0.2 * 600)
+    # Other chunk counts have their own history
+    assert calculate_eta(config, 600, chunks=2) is None
+
+
+def test_two_samples_do_not_fit_more_terms_than_they_can_identify():
+    model = RuntimeModel.fit([60.0, 600.0], [8, 4], [10.0, 80.0])
+    assert model.columns.tolist() == [False, True, False]
+    at_8, at_16 = model.predict(600, 8), model.predict(600, 16)
+    # More threads are never predicted slower, and the single spare sample gives an interval
+    assert at_16.seconds < at_8.seconds
+    assert at_8.low < at_8.seconds < at_8.high
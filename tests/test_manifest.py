@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+from video2note.manifest import LanguageManifest, normalize_language
+
+
+def write(tmp_path, name: str, text: str):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+def test_csv_with_header_comments_and_semicolons(tmp_path):
+    manifest = LanguageManifest.load(write(tmp_path, "langs.csv", (
+        "файл;язык\n"
+        "# интервью\n"
+        "talks/intro.mp4; EN\n"
+        "\n"
+        "meeting.m4a;auto\n"
+    )))
+    assert len(manifest) == 2
+    assert manifest.lookup(tmp_path / "talks" / "intro.mp4") == "en"
+    assert manifest.lookup(tmp_path / "other" / "intro.mp4") is None
+    # A bare file name matches in any folder
+    assert manifest.lookup(tmp_path / "archive" / "meeting.m4a") == "auto"
+
+    # A header after leading comments is still a header
+    manifest = LanguageManifest.load(write(tmp_path, "archive.csv", "# archive\n\nfile,language\na.mp4,en\n"))
+    assert len(manifest) == 1 and manifest.lookup(tmp_path / "a.mp4") == "en"
+
+
+def test_csv_without_header_and_a_bom(tmp_path):
+    path = tmp_path / "langs.csv"
+    path.write_text("a.mp4,ru\nb.mp4,de\n", encoding="utf-8-sig")
+    manifest = LanguageManifest.load(path)
+    assert (manifest.lookup(tmp_path / "a.mp4"), manifest.lookup(tmp_path / "b.mp4")) == ("ru", "de")
+
+
+@pytest.mark.parametrize("data", [
+    {"sub/a.mp4": "ru", "b.mp4": "en"},
+    [{"file": "sub/a.mp4", "language": "ru"}, {"file": "b.mp4", "language": "en"}],
+])
+def test_json_object_or_list(tmp_path, data):
+    manifest = LanguageManifest.load(write(tmp_path, "langs.json", json.dumps(data)))
+    assert manifest.lookup(tmp_path / "sub" / "a.mp4") == "ru"
+    assert manifest.lookup(tmp_path / "x" / "b.mp4") == "en"
+
+
+def test_full_paths_win_over_names(tmp_path):
+    manifest = LanguageManifest.load(write(tmp_path, "langs.csv", "a.mp4,ru\nsub/a.mp4,en\n"))
+    assert manifest.lookup(tmp_path / "sub" / "a.mp4") == "en"
+    assert manifest.lookup(tmp_path / "a.mp4") == "ru"
+
+
+@pytest.mark.parametrize("name, text", [
+    ("langs.csv", "a.mp4\n"),
+    ("langs.csv", "a.mp4,russian\n"),
+    ("langs.json", "{not json"),
+    ("langs.json", "[1, 2]"),
+    ("langs.json", '"ru"'),
+    ("langs.json", '{"a.mp4": 1}'),
+])
+def test_invalid_manifests(tmp_path, name, text):
+    with pytest.raises(ValueError):
+        LanguageManifest.load(write(tmp_path, name, text))
+
+
+def test_missing_manifest(tmp_path):
+    with pytest.raises(ValueError):
+        LanguageManifest.load(tmp_path / "missing.csv")
+
+
+@pytest.mark.parametrize("value, expected", [(" RU ", "ru"), ("Auto", "auto"), ("yue", "yue")])
+def test_normalize_language(value, expected):
+    assert normalize_language(value) == expected
@@ -0,0 +1,42 @@
+import json
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from video2note.metrics import MetricsStore
+
+
+@pytest.fixture
+def history_file(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    path = tmp_path / "hist.json"
+    monkeypatch.setattr(MetricsStore._migrate_json, "__defaults__", (path,))
+    return path
+
+
+def migrated(store: MetricsStore) -> bool:
+    with closing(store._connect()) as conn:
+        return conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone() is not None
+
+
+def test_malformed_samples_are_skipped_one_by_one(history_file, tmp_path):
+    history_file.write_text(json.dumps({
+        "base|cpu|4|x1": [[60, 6], ["bad"], [120, 12]],
+        "base|cpu|many|x1": [[60, 6]],
+    }))
+    store = MetricsStore(tmp_path / "runs.sqlite3")
+    assert store.history("base") == [(60.0, 4, 6.0), (120.0, 4, 12.0)]
+    assert migrated(store)
+
+
+def test_unreadable_history_is_retried_not_dropped(history_file, tmp_path):
+    history_file.write_text(json.dumps({"base|cpu|4|x1": [["bad"]]}))
+    store = MetricsStore(tmp_path / "runs.sqlite3")
+    assert store.history("base") == []
+    assert not migrated(store)
+
+    history_file.write_text(json.dumps({"base|cpu|4|x1": [[60, 6]]}))
+    with closing(store._connect()) as conn:
+        store._migrate_json(conn)
+    assert store.history("base") == [(60.0, 4, 6.0)]
+    assert migrated(store)
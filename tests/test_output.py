@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from video2note.output import (draft_marker, output_paths, parse_formats,
+                               partial_path, render_json, render_srt,
+                               render_txt, render_vtt, write_outputs)
+from video2note.segments import Segment, parse_srt
+
+SEGMENTS = [
+    Segment(0.0, 2.5, "Привет."),
+    Segment(2.5, 2.5, ""),
+    Segment(3661.4004, 3662.25, "Час спустя."),
+]
+
+
+def test_txt_has_one_line_per_segment():
+    assert render_txt(SEGMENTS) == "Привет.\nЧас спустя."
+
+
+def test_srt_numbers_non_empty_segments_and_parses_back():
+    srt = render_srt(SEGMENTS)
+    assert srt == ("1\n00:00:00,000 --> 00:00:02,500\nПривет.\n\n"
+                   "2\n01:01:01,400 --> 01:01:02,250\nЧас спустя.\n")
+    assert [s.text for s in parse_srt(srt)] == ["Привет.", "Час спустя."]
+
+
+def test_vtt_uses_dots_and_a_header():
+    assert render_vtt(SEGMENTS) == ("WEBVTT\n\n00:00:00.000 --> 00:00:02.500\nПривет.\n\n"
+                                    "01:01:01.400 --> 01:01:02.250\nЧас спустя.\n")
+
+
+def test_json_keeps_text_and_rounded_times():
+    data = json.loads(render_json(SEGMENTS))
+    assert data == {
+        "text": "Привет.\nЧас спустя.",
+        "segments": [{"start": 0.0, "end": 2.5, "text": "Привет."},
+                     {"start": 3661.4, "end": 3662.25, "text": "Час спустя."}],
+    }
+
+
+def test_empty_transcripts():
+    assert (render_txt([]), render_srt([]), render_vtt([])) == ("", "", "WEBVTT\n\n")
+    assert json.loads(render_json([])) == {"text": "", "segments": []}
+
+
+def test_parse_formats():
+    assert parse_formats(" SRT, txt,srt ") == ["srt", "txt"]
+    with pytest.raises(ValueError):
+        parse_formats("docx")
+    with pytest.raises(ValueError):
+        parse_formats(" , ")
+
+
+def test_write_outputs_replaces_the_partial_and_the_draft_mark(tmp_path):
+    output = tmp_path / "talk.txt"
+    partial_path(output).write_text("Привет.\n")
+    assert write_outputs(output, SEGMENTS, ["txt", "vtt"], draft=True) == [output, tmp_path / "talk.vtt"]
+    assert draft_marker(output).exists() and not partial_path(output).exists()
+    write_outputs(output, SEGMENTS, ["txt", "vtt"])
+    assert not draft_marker(output).exists()
+    assert output_paths(output, ["txt", "json"]) == {"txt": output, "json": tmp_path / "talk.json"}
+    assert output.read_text(encoding="utf-8") == render_txt(SEGMENTS)
@@ -0,0 +1,66 @@
+import math
+from pathlib import Path
+
+import pytest
+
+from video2note import core
+from video2note.core import BatchJob, plan_batch
+from video2note.probe import MediaInfo
+from video2note.utils import EtaEstimate
+
+# Probed durations by file name; "unknown.mp4" has no prediction
+DURATIONS = {"a.mp4": 100.0, "b.mp4": 400.0, "c.mp4": 300.0, "d.mp4": 200.0, "unknown.mp4": 50.0}
+
+
+@pytest.fixture(autouse=True)
+def predictions(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(core, "probe_many", lambda files: [MediaInfo(DURATIONS[f.name], True) for f in files])
+    monkeypatch.setattr(core, "find_vad_model", lambda models_dir: None)
+
+    def calculate_eta(config, duration, chunks=1, vad=None):
+        if duration == DURATIONS["unknown.mp4"]:
+            return None
+        return EtaEstimate(duration / 10, duration / 10 - 1, duration / 10 + 1)
+
+    monkeypatch.setattr(core, "calculate_eta", calculate_eta)
+
+
+def jobs(tmp_path: Path, *names: str):
+    return [BatchJob(tmp_path / name, tmp_path / f"{Path(name).stem}.txt") for name in names]
+
+
+def names(plan):
+    return [job.input_file.name for job in plan.jobs]
+
+
+def test_longest_first_and_the_makespan_of_two_workers(config, tmp_path):
+    plan = plan_batch(jobs(tmp_path, "a.mp4", "b.mp4", "c.mp4", "d.mp4"), config, workers=2)
+    assert names(plan) == ["b.mp4", "c.mp4", "d.mp4", "a.mp4"]
+    assert plan.durations == [400.0, 300.0, 200.0, 100.0]
+    # 40 + 10 on one worker, 30 + 20 on the other; intervals add in quadrature
+    assert plan.eta.seconds == pytest.approx(50.0)
+    assert plan.eta.low == pytest.approx(50.0 - math.sqrt(2))
+    assert (plan.workers, plan.unknown) == (2, 0)
+
+
+@pytest.mark.parametrize("order, expected", [
+    ("input", ["a.mp4", "b.mp4", "c.mp4"]),
+    ("shortest-first", ["a.mp4", "c.mp4", "b.mp4"]),
+])
+def test_other_orders(config, tmp_path, order, expected):
+    assert names(plan_batch(jobs(tmp_path, "a.mp4", "b.mp4", "c.mp4"), config, order)) == expected
+
+
+def test_done_and_unpredicted_jobs(config, tmp_path):
+    (tmp_path / "b.txt").write_text("готово")
+    plan = plan_batch(jobs(tmp_path, "a.mp4", "b.mp4", "unknown.mp4"), config)
+    # Jobs without an estimate, skipped ones included, are scaled by the known
+    # jobs' estimate/duration ratio: b 40 s, a 10 s, unknown 5 s
+    assert names(plan) == ["b.mp4", "a.mp4", "unknown.mp4"]
+    assert plan.eta.seconds == pytest.approx(10.0)
+    assert plan.unknown == 1
+
+
+def test_unknown_order(config, tmp_path):
+    with pytest.raises(ValueError):
+        plan_batch(jobs(tmp_path, "a.mp4"), config, order="random")
@@ -0,0 +1,136 @@
+import stat
+import sys
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import pytest
+
+from video2note import core, server
+from video2note.checkpoint import SegmentCheckpoint
+from video2note.core import run_pipeline
+from video2note.exceptions import TranscriptionCancelled, WhisperServerError
+from video2note.probe import MediaInfo
+from video2note.segments import Segment
+from video2note.server import ServerBackend, WhisperServer
+from video2note.supervisor import cancellation
+
+FAKE_SERVER = Path(__file__).with_name("fake_whisper_server.py")
+
+
+@pytest.fixture
+def server_bin(tmp_path: Path) -> Path:
+    script = tmp_path / "whisper-server"
+    script.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{FAKE_SERVER}" "$@"\n')
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return script
+
+
+@pytest.fixture
+def audio(tmp_path: Path) -> Path:
+    path = tmp_path / "audio.wav"
+    path.write_bytes(b"\0" * 5000)
+    return path
+
+
+def start(server_bin: Path, config, monkeypatch: pytest.MonkeyPatch, mode: str = "ok") -> WhisperServer:
+    monkeypatch.setenv("FAKE_SERVER_MODE", mode)
+    whisper_server = WhisperServer(server_bin, config)
+    whisper_server.start(timeout=20)
+    return whisper_server
+
+
+def test_transcribe_sends_language_and_parses_segments(server_bin, config, audio, monkeypatch):
+    whisper_server = start(server_bin, config, monkeypatch)
+    try:
+        segments = whisper_server.transcribe(audio, "de")
+    finally:
+        whisper_server.stop()
+    assert segments[0] == Segment(0.0, 1.5, "language de")
+    # The multipart body carries the whole file; the blank segment is dropped
+    assert len(segments) == 2 and int(segments[1].text.split()[1]) > audio.stat().st_size
+
+
+def test_chunked_upload(server_bin, config, monkeypatch):
+    whisper_server = start(server_bin, config, monkeypatch)
+    try:
+        segments = whisper_server._post_inference("a.wav", iter([b"x" * 100, b"y" * 100]), None)
+    finally:
+        whisper_server.stop()
+    assert int(segments[1].text.split()[1]) > 200
+
+
+def test_server_exit_during_request_is_an_error(server_bin, config, audio, monkeypatch):
+    whisper_server = start(server_bin, config, monkeypatch, mode="die")
+    try:
+        with pytest.raises(WhisperServerError):
+            whisper_server.transcribe(audio)
+    finally:
+        whisper_server.stop()
+
+
+def test_cancellation_ends_a_long_request(server_bin, config, audio, monkeypatch):
+    whisper_server = start(server_bin, config, monkeypatch, mode="slow")
+    event = threading.Event()
+    threading.Timer(0.5, event.set).start()
+    started = time.monotonic()
+    try:
+        with cancellation(event), pytest.raises(TranscriptionCancelled):
+            whisper_server.transcribe(audio)
+    finally:
+        whisper_server.stop()
+    assert time.monotonic() - started < 10
+
+
+def test_backend_falls_back_to_whisper_cli(server_bin, config, audio, monkeypatch):
+    monkeypatch.setenv("FAKE_SERVER_MODE", "error")
+    calls = []
+
+    def fake_cli(audio_path, cli_config, eta, checkpoint=None, on_segment=None):
+        calls.append(audio_path)
+        return [Segment(0.0, 1.0, "from cli")], 1.0
+
+    monkeypatch.setattr(server, "run_whisper_transcription", fake_cli)
+    with ServerBackend(config, server_bin) as backend:
+        assert backend._server is not None
+        segments, _ = backend.transcribe(audio, config, None)
+        # A failed server is stopped and not used again
+        assert backend._server is None
+        backend.transcribe(audio, config, None)
+    assert segments == [Segment(0.0, 1.0, "from cli")]
+    assert calls == [audio, audio]
+
+
+def test_backend_serves_other_languages_but_not_other_models(server_bin, config, audio, monkeypatch, caplog):
+    monkeypatch.setenv("FAKE_SERVER_MODE", "ok")
+    monkeypatch.setattr(server, "run_whisper_transcription",
+                        lambda *args, **kwargs: ([Segment(0.0, 1.0, "from cli")], 1.0))
+    received = []
+    with ServerBackend(config, server_bin) as backend:
+        segments, _ = backend.transcribe(audio, replace(config, language="en"), None, on_segment=received.append)
+        assert segments[0].text == "language en" and received == segments
+        other, _ = backend.transcribe(audio, replace(config, beam_size=1), None)
+        assert other[0].text == "from cli"
+        # Only whisper-cli can continue after the segments an interrupted run saved
+        checkpoint = SegmentCheckpoint.for_input(audio, config, audio.parent)
+        fresh, _ = backend.transcribe(audio, config, None, checkpoint)
+        assert fresh[0].text == "language ru"
+        checkpoint.add(Segment(0.0, 1.0, "saved"))
+        checkpoint.close()
+        resumed, _ = backend.transcribe(audio, config, None, SegmentCheckpoint.for_input(audio, config, audio.parent))
+        assert resumed[0].text == "from cli"
+    assert "контрольной точки" in caplog.text
+
+
+def test_warm_server_gets_long_files_whole(server_bin, config, fake_ffmpeg, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SERVER_MODE", "ok")
+    monkeypatch.setattr(core, "probe_media", lambda path: MediaInfo(600.0, True))
+    monkeypatch.setattr(server, "run_whisper_transcription", lambda *args, **kwargs: pytest.fail("whisper-cli used"))
+    media = tmp_path / "meeting.mp4"
+    media.write_bytes(b"media")
+    with ServerBackend(config, server_bin) as backend:
+        result = run_pipeline(media, config, tmp_path, tmp_path / "meeting.txt", delete_temp=True, backend=backend,
+                              stream=False, resume=True, record_metrics=False)
+    assert result.segments[0].text == "language ru"
+    assert not list(tmp_path.glob("*.segments.jsonl"))
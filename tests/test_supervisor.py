@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from video2note.exceptions import TranscriptionCancelled, WhisperCppError
+from video2note.supervisor import (FfmpegProgressParser, ProcessSupervisor,
+                                   WhisperProgressParser, cancellation,
+                                   current_cancellation, kill_all_processes,
+                                   start_process)
+
+posix_only = pytest.mark.skipif(os.name == "nt", reason="process groups are POSIX")
+
+
+def python(code: str) -> list:
+    return [sys.executable, "-c", code]
+
+
+def is_running(pid: int) -> bool:
+    try:
+        state = Path(f"/proc/{pid}/stat").read_text().split(")")[-1].split()[0]
+    except OSError:
+        return False
+    return state != "Z"
+
+
+@posix_only
+@pytest.mark.skipif(not Path("/proc").is_dir(), reason="needs /proc")
+def test_kill_all_takes_down_grandchildren():
+    pids = []
+    with ProcessSupervisor(60) as supervisor:
+        proc = start_process(["sh", "-c", "sleep 30 & echo $!; wait"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        supervisor.watch(proc, "sh", WhisperCppError, on_line=lambda line: pids.append(int(line)))
+        deadline = time.monotonic() + 5
+        while not pids and time.monotonic() < deadline:
+            time.sleep(0.05)
+    assert pids
+    deadline = time.monotonic() + 5
+    while is_running(pids[0]) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not is_running(pids[0])
+
+
+def test_progress_and_output():
+    fractions = []
+    with ProcessSupervisor(60, fractions.append) as supervisor:
+        proc = start_process(python("import sys\nfor p in (10, 50, 100): print(f'progress = {p}%', file=sys.stderr)"),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        supervisor.watch(proc, "whisper", WhisperCppError, WhisperProgressParser())
+        supervisor.wait()
+    assert fractions == [0.1, 0.5, 1.0]
+    assert supervisor.output(proc).splitlines()[-1] == "progress = 100%"
+
+
+def test_on_exit_reports_each_process_while_others_run():
+    events = []
+    with ProcessSupervisor(60) as supervisor:
+        slow = start_process(python("import time; time.sleep(1)"), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        fast = start_process(python("print('done'); raise SystemExit(3)"), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        supervisor.watch(slow, "slow", WhisperCppError, on_exit=lambda code: events.append(("slow", code)))
+        # The output is read by the time on_exit runs
+        supervisor.watch(fast, "fast", WhisperCppError,
+                         on_exit=lambda code: events.append(("fast", code, slow.poll(), supervisor.output(fast))))
+        supervisor.wait()
+    assert events == [("fast", 3, None, "done"), ("slow", 0)]
+
+
+def test_a_silent_process_is_killed():
+    with ProcessSupervisor(0.5) as supervisor:
+        proc = start_process(python("import time; time.sleep(30)"), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        supervisor.watch(proc, "whisper", WhisperCppError)
+        with pytest.raises(WhisperCppError, match="не подаёт признаков жизни"):
+            supervisor.wait()
+    assert proc.poll() is not None
+
+
+def test_a_process_that_keeps_talking_may_run_past_the_stall_window():
+    with ProcessSupervisor(0.5) as supervisor:
+        proc = start_process(python("import time\nfor _ in range(8):\n    print('.', flush=True)\n    time.sleep(0.2)"),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        supervisor.watch(proc, "whisper", WhisperCppError)
+        supervisor.wait()
+    assert proc.returncode == 0
+
+
+def test_cancellation_kills_and_raises():
+    event = threading.Event()
+    with cancellation(event), ProcessSupervisor(60) as supervisor:
+        proc = start_process(python("import time; time.sleep(30)"), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        supervisor.watch(proc, "whisper", WhisperCppError)
+        threading.Timer(0.3, event.set).start()
+        with pytest.raises(TranscriptionCancelled):
+            supervisor.wait()
+    assert proc.poll() is not None
+
+
+def test_nested_cancellation_restores_the_outer_event():
+    outer, inner = threading.Event(), threading.Event()
+    with cancellation(outer):
+        with cancellation(inner):
+            assert current_cancellation() is inner
+        assert current_cancellation() is outer
+    assert current_cancellation() is None
+
+
+def test_kill_all_processes_reaches_other_threads():
+    errors = []
+    started = threading.Event()
+
+    def work():
+        with ProcessSupervisor(60) as supervisor:
+            proc = start_process(python("import time; time.sleep(30)"), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            supervisor.watch(proc, "whisper", WhisperCppError)
+            started.set()
+            supervisor.wait()
+            errors.append(proc.returncode)
+
+    worker = threading.Thread(target=work)
+    worker.start()
+    started.wait(5)
+    kill_all_processes()
+    worker.join(5)
+    assert not worker.is_alive() and errors and errors[0] != 0
+
+
+def test_ffmpeg_progress_parser():
+    parser = FfmpegProgressParser()
+    assert parser("  Duration: 00:01:40.00, start: 0.000000, bitrate: 128 kb/s") is None
+    assert parser("out_time_us=25000000") == 0.25
+    assert parser("progress=end") == 1.0
+
+
+def test_whisper_progress_parser_for_a_window():
+    parser = WhisperProgressParser(start=60.0, length=30.0)
+    assert parser("[00:01:15.000 --> 00:01:15.000]  text") == 0.5
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+from video2note.checkpoint import SegmentCheckpoint
+from video2note.exceptions import FfmpegError
+from video2note.transcriber import (convert_to_standard_audio,
+                                    detect_silences, run_chunked_transcription,
+                                    run_whisper_stream,
+                                    run_whisper_transcription)
+
+
+@pytest.fixture
+def flac(tmp_path: Path, fake_ffmpeg) -> Path:
+    path = tmp_path / "audio.flac"
+    convert_to_standard_audio(tmp_path / "input.mp4", path)
+    return path
+
+
+def test_file_and_stream_give_the_same_segments(stub_config, flac, tmp_path):
+    received = []
+    from_file, _ = run_whisper_transcription(flac, stub_config, None, on_segment=received.append)
+    from_stream, _ = run_whisper_stream(tmp_path / "input.mp4", stub_config, None)
+    assert [s.end for s in from_file] == [5.0, 10.0, 15.0, 20.0]
+    assert from_stream == from_file
+    assert received == from_file
+
+
+def test_stream_reports_a_failed_decoder(stub_config, fake_ffmpeg, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "1")
+    with pytest.raises(FfmpegError, match="fake ffmpeg failed"):
+        run_whisper_stream(tmp_path / "input.mp4", stub_config, None)
+
+
+def test_resumes_after_the_checkpoint(stub_config, flac, tmp_path):
+    checkpoint = SegmentCheckpoint.for_input(flac, stub_config, tmp_path)
+    first, _ = run_whisper_transcription(flac, stub_config, None, checkpoint)
+    # Pretend the run died after two segments
+    checkpoint.path.write_text("\n".join(checkpoint.path.read_text().splitlines()[:3]) + "\n")
+    received = []
+    resumed, _ = run_whisper_transcription(flac, stub_config, None, SegmentCheckpoint.for_input(flac, stub_config, tmp_path),
+                                           on_segment=received.append)
+    assert [s.start for s in resumed] == [s.start for s in first]
+    assert received == resumed
+
+
+def test_chunks_resume_from_their_own_checkpoints(stub_config, flac, tmp_path):
+    def checkpoint_for(window):
+        return SegmentCheckpoint.for_input(flac, stub_config, tmp_path, window)
+
+    first, _ = run_chunked_transcription(flac, stub_config, None, 20.0, 2, checkpoint_for=checkpoint_for)
+    first_chunk, second_chunk = sorted(tmp_path.glob("*.chunk*.segments.jsonl"))
+    assert all(path.read_text().splitlines()[-1] == '{"finished": true}' for path in (first_chunk, second_chunk))
+
+    # The first chunk is done and must not be decoded again; the second died after one segment
+    first_chunk.write_text(first_chunk.read_text().replace("Синтетический", "Сохранённый"))
+    second_chunk.write_text("\n".join(second_chunk.read_text().splitlines()[:2]) + "\n")
+    resumed, _ = run_chunked_transcription(flac, stub_config, None, 20.0, 2, checkpoint_for=checkpoint_for)
+    assert [s.start for s in resumed] == [s.start for s in first]
+    assert resumed[0].text.startswith("Сохранённый") and resumed[-1].text.startswith("Синтетический")
+
+    SegmentCheckpoint.clear(flac, tmp_path)
+    assert not list(tmp_path.glob("*.segments.jsonl"))
+
+
+def test_failed_ffmpeg_runs_raise_with_their_output(fake_ffmpeg, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_FFMPEG_FAIL", "1")
+    with pytest.raises(FfmpegError, match="конвертации(.|\n)*fake ffmpeg failed"):
+        convert_to_standard_audio(tmp_path / "input.mp4", tmp_path / "audio.flac")
+    # Chunking can do without the silences and cuts by time instead
+    assert detect_silences(tmp_path / "audio.flac") == []
+
+
+def test_chunk_segments_are_delivered_as_they_are_stitched(stub_config, flac):
+    received = []
+    segments, _ = run_chunked_transcription(flac, stub_config, None, 20.0, 2, received.append)
+    assert received == segments and [s.end for s in segments] == [5.0, 10.0, 15.0, 20.0]
@@ -0,0 +1,71 @@
+import shutil
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from video2note import vad
+from video2note.core import run_pipeline
+from video2note.segments import Segment
+from video2note.vad import SAMPLE_RATE, SpeechMap, detect_speech
+
+
+@pytest.fixture
+def speech_map() -> SpeechMap:
+    # Speech at 2–5 s and 10–12 s of a 20 s recording
+    return SpeechMap([(2.0, 5.0), (10.0, 12.0)], 20.0)
+
+
+def test_speech_duration(speech_map):
+    assert speech_map.speech_duration == 5.0
+
+
+@pytest.mark.parametrize("t, end, expected", [
+    (0.0, False, 2.0),
+    (1.5, False, 3.5),
+    # The joint starts the second stretch, or ends the first one
+    (3.0, False, 10.0),
+    (3.0, True, 5.0),
+    (4.0, False, 11.0),
+    # Past the speech audio: clamped to the end of the last stretch
+    (9.0, False, 12.0),
+])
+def test_to_source(speech_map, t, end, expected):
+    assert speech_map.to_source(t, end=end) == pytest.approx(expected)
+
+
+def test_map_segments(speech_map):
+    assert speech_map.map_segments([Segment(0.5, 3.0, "раз"), Segment(3.0, 4.5, "два")]) == [
+        Segment(2.5, 5.0, "раз"), Segment(10.0, 11.5, "два")]
+
+
+def test_empty_map_keeps_times():
+    assert SpeechMap([], 10.0).to_source(4.0) == 4.0
+
+
+def test_detect_speech_finds_a_tone_between_silences():
+    t = np.arange(2 * SAMPLE_RATE) / SAMPLE_RATE
+    tone = (0.3 * 32767 * np.sin(2 * np.pi * 440 * t)).astype('<i2')
+    silence = np.zeros(2 * SAMPLE_RATE, dtype='<i2')
+    (start, end), = detect_speech(np.concatenate([silence, tone, silence]))
+    assert start == pytest.approx(2.0 - vad.SPEECH_PAD, abs=0.05)
+    assert end == pytest.approx(4.0 + vad.SPEECH_PAD, abs=0.05)
+
+
+def test_speech_audio_is_removed_even_with_keep_temp(stub_config, fake_ffmpeg, tmp_path, monkeypatch):
+    written = []
+
+    def remove_silence(audio_path, output_path, stall_timeout):
+        shutil.copyfile(audio_path, output_path)
+        written.append(output_path)
+        return SpeechMap([(0.0, 20.0)], 20.0)
+
+    monkeypatch.setattr(vad, "remove_silence", remove_silence)
+    media = tmp_path / "talk.mp4"
+    media.write_bytes(b"media")
+    config = replace(stub_config, trim_silence=True)
+    run_pipeline(media, config, tmp_path, tmp_path / "talk.txt", delete_temp=False, stream=False,
+                 record_metrics=False)
+    assert written and not written[0].exists()
+    # The converted audio is what --keep-temp keeps
+    assert list((tmp_path / "audio").iterdir())
@@ -0,0 +1,38 @@
+import threading
+
+from video2note.cache import TranscriptCache
+from video2note.segments import Segment
+from video2note.watch import WatchQueue, output_path_for, watch_folder
+
+
+def test_output_path_mirrors_subdirectories(tmp_path):
+    watched, out = tmp_path / "in", tmp_path / "out"
+    assert output_path_for(watched / "a" / "talk.mp4", watched, out) == out / "a" / "talk.txt"
+    assert output_path_for(watched / "talk.mp4", watched, out) == out / "talk.txt"
+    assert output_path_for(tmp_path / "elsewhere" / "talk.mp4", watched, out) == out / "talk.txt"
+
+
+def test_same_names_in_subdirectories_get_separate_transcripts(config, tmp_path):
+    watched, out = tmp_path / "in", tmp_path / "out"
+    cache = TranscriptCache(tmp_path / "cache", 1024 * 1024)
+    for folder in ("a", "b"):
+        media = watched / folder / "talk.mp4"
+        media.parent.mkdir(parents=True)
+        media.write_bytes(folder.encode() * 1000)
+        # Served from the cache, so neither ffmpeg nor whisper.cpp is needed
+        cache.put(cache.key(media, config), f"запись {folder}", 1.0, media, [Segment(0.0, 1.0, f"запись {folder}")])
+
+    outcomes = []
+    stop = threading.Event()
+
+    def on_outcome(outcome):
+        outcomes.append(outcome)
+        if len(outcomes) == 2:
+            stop.set()
+
+    with WatchQueue(tmp_path / "queue.sqlite3") as queue:
+        watch_folder(watched, config, tmp_path / "temp", out, queue, cache=cache, poll_interval=0.05, settle=0,
+                     recursive=True, stop=stop, on_outcome=on_outcome)
+    assert not any(outcome.skipped or outcome.error for outcome in outcomes)
+    for folder in ("a", "b"):
+        assert (out / folder / "talk.txt").read_text(encoding="utf-8").strip() == f"запись {folder}"
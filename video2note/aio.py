@@ -0,0 +1,184 @@
+"""
+Asyncio API for Video2Note, for embedding the pipeline in a service.
+
+Each file goes through run_pipeline() on a worker thread, and at most
+``max_concurrency`` files run at once; files waiting for their turn hold no
+thread, and the event loop is never blocked. Progress is delivered on the
+event loop, to a callback or an async iterator, instead of a Rich display.
+Cancelling a job kills its ffmpeg and whisper.cpp processes.
+"""
+import asyncio
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional, Sequence
+
+from .cache import TranscriptCache
+from .config import TranscriptionConfig
+from .core import TranscriptionResult, run_pipeline
+from .output import DEFAULT_FORMATS
+from .supervisor import cancellation
+from .transcriber import TranscriptionBackend
+from .ui import progress_callback
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """Progress of one step of a job; ``fraction`` is None until the step reports one."""
+    input_file: Path
+    step: str
+    fraction: Optional[float] = None
+
+
+class TranscriptionJob:
+    """
+    A transcription started with AsyncTranscriber.submit().
+
+    Await it for the TranscriptionResult, iterate events() for its
+    progress, or cancel() it.
+    """
+
+    def __init__(self, input_file: Path):
+        self.input_file = input_file
+        # None marks the end of the job
+        self._events: "asyncio.Queue[Optional[ProgressEvent]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    def __await__(self):
+        return self._task.__await__()
+
+    def done(self) -> bool:
+        """True once the job has finished, failed or been cancelled."""
+        return self._task.done()
+
+    def cancel(self) -> None:
+        """Kills the job's processes; awaiting it then raises asyncio.CancelledError."""
+        self._task.cancel()
+
+    async def events(self) -> AsyncIterator[ProgressEvent]:
+        """Yields the job's progress events until it ends; meant for a single consumer."""
+        while True:
+            event = await self._events.get()
+            if event is None:
+                return
+            yield event
+
+
+class AsyncTranscriber:
+    """
+    Transcribes files from asyncio code, at most ``max_concurrency`` at once.
+
+    Like run_parallel_batch(), every running file gets an equal share of
+    config.threads. Arguments are as for run_pipeline(). A shared backend
+    (e.g. a started ServerBackend) serves one request at a time, so it is
+    best used with ``max_concurrency=1``; its HTTP request is not
+    interrupted by cancellation.
+
+    Use as an async context manager, or call aclose() when done.
+    """
+
+    def __init__(
+        self,
+        config: TranscriptionConfig,
+        temp_dir: Path,
+        max_concurrency: int = 1,
+        backend: Optional[TranscriptionBackend] = None,
+        cache: Optional[TranscriptCache] = None,
+        stream: bool = True,
+        parallel_chunks: int = 0,
+        resume: bool = True,
+        delete_temp: bool = True,
+    ):
+        max_concurrency = max(1, max_concurrency)
+        self.config = replace(config, threads=max(1, config.threads // max_concurrency))
+        self.temp_dir = temp_dir
+        self.backend = backend
+        self.cache = cache
+        self.stream = stream
+        self.parallel_chunks = parallel_chunks
+        self.resume = resume
+        self.delete_temp = delete_temp
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="video2note-async")
+
+    async def __aenter__(self) -> "AsyncTranscriber":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Waits for running jobs to finish and releases the worker threads."""
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+    def submit(
+        self,
+        input_file: Path,
+        output_path: Path,
+        formats: Sequence[str] = DEFAULT_FORMATS,
+        draft: bool = False,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        language: Optional[str] = None,
+    ) -> TranscriptionJob:
+        """
+        Starts transcribing a file and returns at once.
+
+        ``on_progress`` is called on the event loop with every ProgressEvent.
+        ``language`` overrides config.language for this file (``auto``
+        detects it).
+        """
+        job = TranscriptionJob(input_file)
+        config = replace(self.config, language=language) if language else self.config
+        job._task = asyncio.get_running_loop().create_task(
+            self._run(job, config, output_path, formats, draft, on_progress))
+        return job
+
+    async def transcribe(
+        self,
+        input_file: Path,
+        output_path: Path,
+        formats: Sequence[str] = DEFAULT_FORMATS,
+        draft: bool = False,
+        on_progress: Optional[Callable[[ProgressEvent], None]] = None,
+        language: Optional[str] = None,
+    ) -> TranscriptionResult:
+        """Transcribes a file; see submit()."""
+        return await self.submit(input_file, output_path, formats, draft, on_progress, language)
+
+    async def _run(self, job: TranscriptionJob, config: TranscriptionConfig, output_path: Path,
+                   formats: Sequence[str], draft: bool,
+                   on_progress: Optional[Callable[[ProgressEvent], None]]) -> TranscriptionResult:
+        loop = asyncio.get_running_loop()
+        cancel = threading.Event()
+
+        def emit(event: ProgressEvent) -> None:
+            job._events.put_nowait(event)
+            if on_progress:
+                on_progress(event)
+
+        def report(step: str, fraction: Optional[float]) -> None:
+            loop.call_soon_threadsafe(emit, ProgressEvent(job.input_file, step, fraction))
+
+        def work() -> TranscriptionResult:
+            with cancellation(cancel), progress_callback(report):
+                return run_pipeline(job.input_file, config, self.temp_dir, output_path, self.delete_temp,
+                                    backend=self.backend, stream=self.stream, cache=self.cache,
+                                    parallel_chunks=self.parallel_chunks, resume=self.resume,
+                                    formats=formats, draft=draft)
+
+        try:
+            async with self._limit:
+                future = loop.run_in_executor(self._executor, work)
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    cancel.set()
+                    # The slot is released only after the worker has killed its processes and cleaned up
+                    with contextlib.suppress(Exception):
+                        await future
+                    raise
+        finally:
+            # Progress reported by the worker was scheduled before its result, so this comes last
+            job._events.put_nowait(None)
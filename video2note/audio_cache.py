@@ -0,0 +1,153 @@
+"""
+Managed cache of converted audio for Video2Note.
+
+Converted FLACs (and audio streams copied out of their containers) are kept
+in the temp directory between runs with --keep-temp. Each file is named
+after its source's stem plus a hash of the source's resolved path, size and
+mtime, so same-named recordings from different folders never collide and an
+edited source gets a new file. Files are written under a temporary name and
+renamed once ffmpeg has succeeded, and the least recently used ones are
+removed once the cache exceeds its byte budget.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .utils import get_safe_filename
+
+logger = logging.getLogger(__name__)
+
+AUDIO_CACHE_DIR_NAME = "audio"
+DEFAULT_AUDIO_CACHE_MB = 4096
+# Temporary files older than this are left over from killed conversions
+STALE_TMP_SECONDS = 24 * 3600
+
+
+def source_tag(input_file: Path) -> str:
+    """
+    A file-name-safe tag that identifies one version of a source file:
+    its stem plus a hash of its resolved path, size and mtime.
+    """
+    source = input_file.resolve()
+    try:
+        st = source.stat()
+        version = f"{source}|{st.st_size}|{st.st_mtime_ns}"
+    except OSError:
+        version = str(source)
+    digest = hashlib.sha1(version.encode('utf-8')).hexdigest()[:12]
+    return f"{get_safe_filename(input_file.stem)[:60] or 'audio'}-{digest}"
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """Number of entries and their total size."""
+    files: int
+    bytes: int
+
+
+class AudioCache:
+    """
+    Converted audio files in one directory, with a byte budget and LRU eviction.
+
+    Looking a file up refreshes its mtime; after every write the least
+    recently used files are removed until the cache fits ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_AUDIO_CACHE_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def path_for(self, input_file: Path, kind: str, suffix: str) -> Path:
+        """Where the ``kind`` (e.g. ``audio``) version of a source is cached."""
+        return self.cache_dir / f"{source_tag(input_file)}.{kind}{suffix}"
+
+    def lookup(self, path: Path) -> bool:
+        """True if a cached file exists; marks it as recently used."""
+        try:
+            os.utime(path)
+        except OSError:
+            return False
+        return True
+
+    @contextmanager
+    def writing(self, path: Path) -> Iterator[Path]:
+        """
+        Yields a temporary path with the same extension to write ``path``
+        through; it is renamed into place only if the block succeeds.
+        """
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.stem}.{os.getpid()}.{threading.get_ident()}.tmp{path.suffix}")
+        try:
+            yield tmp_path
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        self.evict(keep=path)
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        try:
+            paths = list(self.cache_dir.iterdir())
+        except OSError:
+            return []
+        for p in paths:
+            if p.name.startswith('.'):
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def stats(self) -> CacheStats:
+        """Number and total size of the cached files."""
+        entries = self._entries()
+        return CacheStats(len(entries), sum(size for _, size, _ in entries))
+
+    def evict(self, max_bytes: Optional[int] = None, keep: Optional[Path] = None) -> CacheStats:
+        """
+        Removes least recently used files until the cache fits ``max_bytes``
+        (its budget by default), never ``keep``; returns what was removed.
+        """
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed, freed = 0, 0
+        for _, size, p in sorted(entries):
+            if total <= budget:
+                break
+            if p == keep:
+                continue
+            logger.debug(f"Кэш аудио переполнен, удаляю {p.name}")
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+            freed += size
+        return CacheStats(removed, freed)
+
+    def prune(self, max_bytes: Optional[int] = None) -> CacheStats:
+        """Like evict(), and also removes temporary files left by killed conversions."""
+        removed = self.evict(max_bytes)
+        files, freed = removed.files, removed.bytes
+        cutoff = time.time() - STALE_TMP_SECONDS
+        try:
+            leftovers = list(self.cache_dir.glob(".*.tmp.*"))
+        except OSError:
+            leftovers = []
+        for p in leftovers:
+            try:
+                st = p.stat()
+                if st.st_mtime < cutoff:
+                    p.unlink()
+                    files += 1
+                    freed += st.st_size
+            except OSError:
+                continue
+        return CacheStats(files, freed)
@@ -0,0 +1,292 @@
+"""
+End-to-end benchmark for Video2Note.
+
+Generates synthetic recordings with ffmpeg and runs them through
+run_pipeline() against the real whisper-cli or a stub that imitates its
+output and timing without a model, so the pipeline's own overhead can be
+measured on any CPU-only machine. Every case runs in a fresh process, which
+keeps peak RSS figures separate.
+"""
+import logging
+import os
+import platform
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .config import TranscriptionConfig
+from .core import run_pipeline
+from .exceptions import FfmpegError
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# The calibration clip is short enough that its run time is mostly model load
+CALIBRATION_SECONDS = 1
+STUB_LOAD_ENV = "VIDEO2NOTE_STUB_LOAD"
+STUB_RTF_ENV = "VIDEO2NOTE_STUB_RTF"
+
+_STUB_SOURCE = '''\
+"""Stand-in for whisper-cli written by `video2note bench`: prints and sleeps like whisper.cpp, without a model."""
+import os
+import sys
+import time
+
+args = sys.argv[1:]
+
+
+def opt(name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+
+def stamp(seconds, sep):
+    ms = int(round(seconds * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{sep}{ms % 1000:03d}"
+
+
+load = float(os.environ.get("VIDEO2NOTE_STUB_LOAD", "1.0"))
+cpu_rtf = float(os.environ.get("VIDEO2NOTE_STUB_RTF", "0.1"))
+threads = max(1, int(opt("--threads", "1")))
+source = opt("--file")
+if source == "-":
+    # Streamed 16 kHz mono s16le WAV
+    seconds = max(0, len(sys.stdin.buffer.read()) - 44) / 32000
+else:
+    with open(source, "rb") as f:
+        head = f.read(26)
+    # FLAC STREAMINFO: 20-bit sample rate, 3+5 bits of format, 36-bit sample count
+    info = int.from_bytes(head[18:26], "big")
+    rate, total = info >> 44, info & ((1 << 36) - 1)
+    seconds = total / rate if rate else 0.0
+
+start = int(opt("--offset-t", "0")) / 1000
+end = seconds if opt("--duration") is None else min(seconds, start + int(opt("--duration")) / 1000)
+print(f"whisper_init_from_file_with_params_no_state: loading model from '{opt('--model')}'", file=sys.stderr, flush=True)
+time.sleep(load)
+print(f"main: processing '{source}' ({int(seconds * 16000)} samples, {seconds:.1f} sec), {threads} threads", file=sys.stderr, flush=True)
+
+segments = []
+t = start
+while t < end:
+    seg_end = min(end, t + 5.0)
+    time.sleep((seg_end - t) * cpu_rtf / threads)
+    segments.append((t, seg_end, f"Синтетический сегмент {len(segments) + 1}."))
+    print(f"[{stamp(t, '.')} --> {stamp(seg_end, '.')}]   {segments[-1][2]}", flush=True)
+    done = int(100 * (seg_end - start) / max(end - start, 1e-9))
+    print(f"whisper_print_progress_callback: progress = {done}%", file=sys.stderr, flush=True)
+    t = seg_end
+
+prefix = opt("--output-file")
+if "--output-txt" in args:
+    with open(prefix + ".txt", "w", encoding="utf-8") as f:
+        f.write("".join(f"{text}\\n" for _, _, text in segments))
+if "--output-srt" in args:
+    with open(prefix + ".srt", "w", encoding="utf-8") as f:
+        for i, (a, b, text) in enumerate(segments, 1):
+            f.write(f"{i}\\n{stamp(a, ',')} --> {stamp(b, ',')}\\n{text}\\n\\n")
+print(f"whisper_print_timings:     load time = {load * 1000:8.2f} ms", file=sys.stderr, flush=True)
+'''
+
+
+@dataclass
+class BenchCase:
+    """One benchmark run: a synthetic recording of some length at a thread count."""
+    seconds: int
+    threads: int
+    repeat: int = 1
+
+
+@dataclass
+class BenchResult:
+    """Stage timings of one case, in seconds, plus resource use."""
+    seconds: int
+    threads: int
+    repeat: int
+    audio_duration: float
+    probe_time: float
+    ffmpeg_time: float
+    whisper_time: float
+    model_load_time: Optional[float]
+    decode_time: Optional[float]
+    total_time: float
+    realtime_factor: float
+    peak_rss_mb: Optional[float]
+    python_rss_mb: Optional[float]
+
+
+@dataclass
+class BenchReport:
+    """All results of a benchmark together with what they were measured on."""
+    results: List[BenchResult]
+    environment: Dict[str, object] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {"environment": self.environment, "results": [asdict(r) for r in self.results]}
+
+
+def write_stub_whisper(directory: Path) -> Path:
+    """Writes the stub whisper-cli script into a directory and makes it executable."""
+    stub = directory / "whisper-cli-stub"
+    stub.write_text(f"#!{sys.executable}\n{_STUB_SOURCE}", encoding="utf-8")
+    stub.chmod(stub.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    return stub
+
+
+def generate_audio(path: Path, seconds: int) -> Path:
+    """Renders a tone over pink noise as a stereo 44.1 kHz AAC file, so conversion has real work to do."""
+    if path.exists():
+        return path
+    cmd = [
+        'ffmpeg', '-nostdin', '-v', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=44100:duration={seconds}',
+        '-f', 'lavfi', '-i', f'anoisesrc=color=pink:amplitude=0.05:sample_rate=44100:duration={seconds}',
+        '-filter_complex', 'amix=inputs=2,aformat=channel_layouts=stereo',
+        '-c:a', 'aac', '-b:a', '96k', '-y', str(path),
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except FileNotFoundError as e:
+        raise FfmpegError(f"Не удалось запустить ffmpeg: {e}") from e
+    except subprocess.CalledProcessError as e:
+        raise FfmpegError(f"Не удалось создать тестовое аудио:\n{e.stderr.decode('utf-8', errors='ignore')}") from e
+    return path
+
+
+def _peak_rss_mb(who: int) -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def _run_case(case: BenchCase, config: TranscriptionConfig, media: Path, work_dir: Path,
+              model_load_time: Optional[float], stub_env: Dict[str, str]) -> BenchResult:
+    """Runs one case; called in a fresh process so peak RSS covers this case only."""
+    os.environ.update(stub_env)
+    temp_dir = work_dir / f"case-{case.seconds}-{case.threads}-{case.repeat}"
+    temp_dir.mkdir(parents=True, exist_ok=True)
+
+    start = time.perf_counter()
+    result = run_pipeline(media, config, temp_dir, temp_dir / "transcript.txt", delete_temp=True,
+                          record_metrics=False)
+    total_time = time.perf_counter() - start
+    stages = {span.name: span.duration for span in result.spans}
+
+    decode_time = max(0.0, result.elapsed_time - model_load_time) if model_load_time is not None else None
+    return BenchResult(
+        seconds=case.seconds,
+        threads=case.threads,
+        repeat=case.repeat,
+        audio_duration=result.duration,
+        probe_time=stages.get("probe", 0.0),
+        ffmpeg_time=stages.get("ffmpeg.convert", 0.0),
+        whisper_time=result.elapsed_time,
+        model_load_time=model_load_time,
+        decode_time=decode_time,
+        total_time=total_time,
+        realtime_factor=total_time / result.duration if result.duration else 0.0,
+        peak_rss_mb=_peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        python_rss_mb=_peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+    )
+
+
+def _in_fresh_process(fn: Callable[..., BenchResult], *args) -> BenchResult:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(fn, *args).result()
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    lengths: Sequence[int],
+    thread_counts: Sequence[int],
+    model_name: str,
+    language: str,
+    stub: bool = True,
+    stub_load: float = 1.0,
+    stub_rtf: float = 0.1,
+    repeats: int = 1,
+    work_dir: Optional[Path] = None,
+    on_result: Optional[Callable[[BenchResult], None]] = None,
+) -> BenchReport:
+    """
+    Benchmarks the file pipeline (probe, ffmpeg conversion, whisper.cpp).
+
+    Args:
+        lengths: Lengths of the synthetic recordings, in seconds.
+        thread_counts: Values of --threads to compare.
+        model_name: Model to load; the stub only needs a placeholder file.
+        language: Language passed to whisper.cpp.
+        stub: Use the stub whisper-cli instead of the real one.
+        stub_load: Seconds the stub spends "loading the model".
+        stub_rtf: CPU-seconds the stub spends per second of audio; the
+            wall time is divided by the thread count.
+        repeats: How many times to run every case.
+        work_dir: Where to keep the generated recordings (a temporary
+            directory if omitted).
+        on_result: Called with each result as soon as it is measured.
+
+    Model load time is estimated from a run on a short calibration clip
+    at each thread count; decode time is the rest of the whisper.cpp time.
+    Runs are not added to the metrics used for ETAs.
+    """
+    with tempfile.TemporaryDirectory(prefix="video2note-bench-") as tmp:
+        tmp_dir = Path(tmp)
+        media_dir = work_dir or tmp_dir
+        media_dir.mkdir(parents=True, exist_ok=True)
+
+        overrides = {}
+        if stub:
+            models_dir = tmp_dir / "models"
+            models_dir.mkdir()
+            (models_dir / f"ggml-{model_name}.bin").write_bytes(b"stub")
+            overrides = {"whisper_bin": write_stub_whisper(tmp_dir), "models_dir": models_dir}
+        stub_env = {STUB_LOAD_ENV: str(stub_load), STUB_RTF_ENV: str(stub_rtf)}
+
+        calibration = generate_audio(media_dir / f"bench-{CALIBRATION_SECONDS}s.m4a", CALIBRATION_SECONDS)
+        results: List[BenchResult] = []
+        for threads in thread_counts:
+            config = TranscriptionConfig(model_name=model_name, language=language, threads=threads, **overrides)
+            logger.info(f"Калибровка загрузки модели ({threads} потоков)...")
+            load = _in_fresh_process(_run_case, BenchCase(CALIBRATION_SECONDS, threads), config,
+                                     calibration, tmp_dir, None, stub_env).whisper_time
+            for seconds in lengths:
+                media = generate_audio(media_dir / f"bench-{seconds}s.m4a", seconds)
+                for repeat in range(1, repeats + 1):
+                    result = _in_fresh_process(_run_case, BenchCase(seconds, threads, repeat), config,
+                                               media, tmp_dir, load, stub_env)
+                    results.append(result)
+                    if on_result:
+                        on_result(result)
+
+    environment = {
+        "revision": _git_revision(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "cpu_count": os.cpu_count(),
+        "model": model_name,
+        "whisper": "stub" if stub else "whisper-cli",
+        "stub_load": stub_load if stub else None,
+        "stub_rtf": stub_rtf if stub else None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    return BenchReport(results=results, environment=environment)
@@ -0,0 +1,185 @@
+"""
+Content-addressed transcript cache for Video2Note.
+
+Transcripts are stored under a key derived from a hash of the source media
+and everything that influences the transcript (model file, requested
+language and the whisper.cpp decoding options), so renamed or duplicated
+recordings are served instantly while a change of model or language is
+never mistaken for a hit. Settings that only affect speed, such as the
+thread count, are left out of the key.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .audio_cache import CacheStats
+from .config import TranscriptionConfig
+from .segments import Segment
+from .transcriber import decoding_options
+
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    """Returns the SHA-256 of a file, read in chunks to keep memory flat."""
+    digest = hashlib.sha256()
+    with path.open('rb') as f:
+        while chunk := f.read(_HASH_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class CachedTranscript:
+    """A transcript served from the cache; entries written before timestamps were kept have no segments."""
+    transcription: str
+    duration: float
+    segments: List[Segment] = field(default_factory=list)
+    # The language it was transcribed in, e.g. the one detected for ``auto``
+    language: Optional[str] = None
+
+
+class TranscriptCache:
+    """
+    On-disk transcript store with a byte budget and LRU eviction.
+
+    Entries are small JSON files named by key; reading one refreshes its
+    mtime, and the least recently used entries are dropped once the total
+    size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Media hashes memoized by (path, size, mtime) to avoid re-reading big files
+        self._hashes: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    def _media_hash(self, input_file: Path) -> str:
+        st = input_file.stat()
+        memo_key = (str(input_file.resolve()), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._hashes.get(memo_key)
+        if cached is None:
+            cached = hash_file(input_file)
+            with self._lock:
+                self._hashes[memo_key] = cached
+        return cached
+
+    def key(self, input_file: Path, config: TranscriptionConfig) -> Optional[str]:
+        """
+        Derives the cache key for a file and configuration, or None if the
+        file is unreadable. config.language is the requested one: an ``auto``
+        transcript is found again without detecting the language first.
+        """
+        try:
+            model_stat = config.model_path.stat()
+            material = {
+                "media": self._media_hash(input_file),
+                "model": [config.model_path.name, model_stat.st_size, model_stat.st_mtime_ns],
+                "language": config.language,
+                "args": decoding_options(config),
+            }
+            if config.force_filters:
+                # Inputs that normally skip re-encoding are filtered then, which changes their audio
+                material["filters"] = True
+            if config.trim_silence:
+                material["trim_silence"] = True
+        except OSError as e:
+            logger.warning(f"Кэш транскрипций недоступен для {input_file.name}: {e}")
+            return None
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[CachedTranscript]:
+        """Returns the cached transcript for a key and marks it as recently used."""
+        path = self._entry_path(key)
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+            entry = CachedTranscript(
+                transcription=data["transcription"],
+                duration=float(data.get("duration", 0.0)),
+                segments=[Segment(float(start), float(end), str(text)) for start, end, text in data.get("segments", [])],
+                language=data.get("language"),
+            )
+            os.utime(path)
+            return entry
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Повреждённая запись кэша {path.name} будет удалена: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def contains(self, input_file: Path, config: TranscriptionConfig) -> bool:
+        """True if a transcript for this file and configuration is cached."""
+        key = self.key(input_file, config)
+        return key is not None and self._entry_path(key).exists()
+
+    def put(self, key: str, transcription: str, duration: float, source_file: Path,
+            segments: Optional[List[Segment]] = None, language: Optional[str] = None) -> None:
+        """Stores a transcript atomically, then enforces the size budget."""
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(json.dumps({
+                "transcription": transcription,
+                "duration": duration,
+                "source": source_file.name,
+                "segments": [[seg.start, seg.end, seg.text] for seg in segments or []],
+                "language": language,
+            }, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить транскрипцию в кэш: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        try:
+            paths = list(self.cache_dir.glob("*/*.json"))
+        except OSError:
+            return []
+        for p in paths:
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        return entries
+
+    def stats(self) -> CacheStats:
+        """Number and total size of the cached transcripts."""
+        entries = self._entries()
+        return CacheStats(len(entries), sum(size for _, size, _ in entries))
+
+    def evict(self, max_bytes: Optional[int] = None) -> CacheStats:
+        """
+        Removes least recently used entries until the cache fits ``max_bytes``
+        (its budget by default); returns what was removed.
+        """
+        budget = self.max_bytes if max_bytes is None else max_bytes
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed, freed = 0, 0
+        for _, size, p in sorted(entries):
+            if total <= budget:
+                break
+            logger.debug(f"Кэш переполнен, удаляю {p.name}")
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+            freed += size
+        return CacheStats(removed, freed)
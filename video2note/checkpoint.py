@@ -0,0 +1,195 @@
+"""
+Per-segment checkpoints for resumable transcription.
+
+While whisper-cli decodes, every finished segment it prints is appended to
+a JSON-lines sidecar in the temp directory. If the run dies, the next run
+of the same input resumes with --offset-t after the last saved segment and
+merges both parts. A long file decoded in parallel chunks gets one sidecar
+per chunk, keyed by the chunk's time window.
+"""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import IO, List, Optional, Tuple
+
+from .config import DEFAULT_BEAM_SIZE, DEFAULT_BEST_OF, TranscriptionConfig
+from .segments import Segment, parse_segment_line
+from .utils import get_safe_filename
+
+logger = logging.getLogger(__name__)
+
+# Audio shorter than this (seconds) is cheaper to redo than to checkpoint
+# segment by segment, and may go to whisper-server, which cannot checkpoint
+MIN_RESUME_DURATION = 5 * 60
+
+
+class SegmentCheckpoint:
+    """
+    A sidecar file recording the segments already transcribed for one input.
+
+    The first line identifies the source file and model; a checkpoint whose
+    identity no longer matches (file changed, other model or language) is
+    discarded instead of resumed.
+    """
+
+    def __init__(self, path: Path, identity: dict):
+        self.path = path
+        self.identity = identity
+        self._segments: List[Segment] = []
+        self._file: Optional[IO[str]] = None
+        # Set by load() when the run that wrote the sidecar got to finish()
+        self.finished = False
+
+    @classmethod
+    def for_input(cls, input_file: Path, config: TranscriptionConfig, temp_dir: Path,
+                  window: Optional[Tuple[float, float]] = None) -> "SegmentCheckpoint":
+        """
+        Returns the checkpoint location and identity for an input file, or
+        for the chunk of it between ``window`` (start, end) seconds.
+        """
+        source = input_file.resolve()
+        st = source.stat()
+        name = _prefix(input_file)
+        if window is not None:
+            name += f".chunk{int(window[0] * 1000)}-{int(window[1] * 1000)}"
+        path = temp_dir / f"{name}.segments.jsonl"
+        identity = {
+            "source": str(source),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "model": config.model_path.name,
+            "language": config.language,
+        }
+        if config.trim_silence:
+            # Segment times then refer to the speech-only audio
+            identity["trim_silence"] = True
+        if (config.beam_size, config.best_of) != (DEFAULT_BEAM_SIZE, DEFAULT_BEST_OF):
+            identity["decoding"] = [config.beam_size, config.best_of]
+        if window is not None:
+            identity["window"] = [window[0], window[1]]
+        return cls(path, identity)
+
+    @staticmethod
+    def clear(input_file: Path, temp_dir: Path) -> None:
+        """Removes every checkpoint of an input file: the whole-file one and those of its chunks."""
+        prefix = _prefix(input_file)
+        for pattern in (f"{prefix}.segments.jsonl", f"{prefix}.chunk*.segments.jsonl"):
+            for path in temp_dir.glob(pattern):
+                path.unlink(missing_ok=True)
+
+    def load(self) -> List[Segment]:
+        """Reads the segments saved by an earlier, interrupted run."""
+        self._segments = []
+        self.finished = False
+        try:
+            lines = self.path.read_text(encoding='utf-8').splitlines()
+        except FileNotFoundError:
+            return []
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать контрольную точку {self.path.name}: {e}")
+            return []
+
+        try:
+            if not lines or json.loads(lines[0]) != self.identity:
+                logger.info(f"Контрольная точка {self.path.name} устарела — начинаю заново.")
+                self.discard()
+                return []
+            for line in lines[1:]:
+                data = json.loads(line)
+                if data.get("finished"):
+                    self.finished = True
+                    continue
+                self._segments.append(Segment(float(data["start"]), float(data["end"]), str(data["text"])))
+        except (ValueError, KeyError, TypeError):
+            # A line torn by a crash mid-write: keep what was read before it
+            pass
+        return list(self._segments)
+
+    @property
+    def resume_offset(self) -> float:
+        """End of the last saved segment, in seconds."""
+        return self._segments[-1].end if self._segments else 0.0
+
+    @property
+    def segments(self) -> List[Segment]:
+        """Segments loaded from disk plus those recorded during this run."""
+        return list(self._segments)
+
+    def record(self, line: str) -> None:
+        """Saves a segment if the whisper-cli output line is one; other lines are ignored."""
+        segment = parse_segment_line(line)
+        if segment is not None and segment.text:
+            self.add(segment)
+
+    def add(self, segment: Segment) -> None:
+        """Saves a finished segment."""
+        if self._append({"start": segment.start, "end": segment.end, "text": segment.text}):
+            self._segments.append(segment)
+
+    def finish(self) -> None:
+        """
+        Records that whisper.cpp got to the end of the audio, for a chunk
+        whose sidecar must outlive its own run until every chunk is done.
+        """
+        if self._append({"finished": True}):
+            self.finished = True
+
+    def _append(self, data: dict) -> bool:
+        try:
+            if self._file is None:
+                self._rewrite()
+                self._file = self.path.open('a', encoding='utf-8')
+            self._file.write(json.dumps(data, ensure_ascii=False) + "\n")
+            self._file.flush()
+            # Survive a reboot, not just a crash of this process
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.warning(f"Не удалось записать контрольную точку: {e}")
+            return False
+        return True
+
+    def _rewrite(self) -> None:
+        """
+        Atomically writes the header and the loaded segments, so a line torn
+        by an earlier crash does not stay in the middle of the file.
+        """
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open('w', encoding='utf-8') as f:
+            f.write(json.dumps(self.identity, ensure_ascii=False) + "\n")
+            for saved in self._segments:
+                self._write(f, saved)
+            if self.finished:
+                f.write(json.dumps({"finished": True}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _write(f: IO[str], segment: Segment) -> None:
+        f.write(json.dumps({"start": segment.start, "end": segment.end, "text": segment.text}, ensure_ascii=False) + "\n")
+
+    def close(self) -> None:
+        """Closes the sidecar; it stays on disk until complete() or discard()."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        """Removes the sidecar, e.g. once the transcript has been saved."""
+        self.close()
+        self._segments = []
+        self.finished = False
+        self.path.unlink(missing_ok=True)
+
+    def complete(self) -> None:
+        """Marks the transcription as finished; the sidecar is no longer needed."""
+        self.discard()
+
+
+def _prefix(input_file: Path) -> str:
+    """The sidecar name shared by all checkpoints of one input file."""
+    source = input_file.resolve()
+    digest = hashlib.sha1(str(source).encode('utf-8')).hexdigest()[:8]
+    return f"{get_safe_filename(input_file.stem)}-{digest}"
@@ -2,11 +2,19 @@
 Configuration for Video2Note.
 """
 from dataclasses import dataclass, field
+import json
+import logging
+import os
 import platform
+import threading
+import time
 from pathlib import Path
+from typing import Callable, Dict, Optional
 
 import click
 
+logger = logging.getLogger(__name__)
+
 # --- Constants ---
 SUPPORTED_AUDIO_FORMATS = {'.mp3', '.wav', '.flac', '.m4a', '.aac', '.ogg', '.wma'}
 SUPPORTED_VIDEO_FORMATS = {'.mp4', '.mkv', '.avi', '.mov', '.wmv', '.flv', '.webm', '.m4v'}
@@ -15,26 +23,131 @@ ALL_SUPPORTED_FORMATS = SUPPORTED_AUDIO_FORMATS | SUPPORTED_VIDEO_FORMATS
 TEMP_DIR_NAME = "temp"
 TRANSCRIPTS_DIR_NAME = "transcripts"
 WHISPER_CPP_PATH = "whisper.cpp"
+# Legacy JSON history, imported once into the metrics database
 HISTORY_FILE = Path(__file__).parent.parent / ".video2note_hist.json"
+METRICS_DB = Path(__file__).parent.parent / ".video2note_metrics.sqlite3"
+CACHE_DIR = Path(__file__).parent.parent / ".video2note_cache"
+WATCH_QUEUE_DB = Path(__file__).parent.parent / ".video2note_watch.sqlite3"
+# Where discovered whisper.cpp binaries and models are remembered between runs
+DISCOVERY_STATE = Path(__file__).parent.parent / ".video2note_state.json"
+DEFAULT_CACHE_SIZE_MB = 256
+# Seconds without any output after which ffmpeg/whisper.cpp is considered hung
+DEFAULT_STALL_TIMEOUT = 600
+# whisper.cpp beam search width and sampled candidates unless a preset or tuned profile says otherwise
+DEFAULT_BEAM_SIZE = 5
+DEFAULT_BEST_OF = 5
+
+
+# --- Discovery Cache ---
+
+class DiscoveryCache:
+    """
+    Paths found by the discovery helpers below, remembered in a small JSON
+    state file so that a new invocation does not probe the filesystem again.
+
+    An entry is trusted while its witness, the found file itself or a given
+    directory, still has the recorded mtime; otherwise the lookup is redone.
+    A lookup that found nothing is remembered only against a directory
+    witness, since a missing file has no mtime to check.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: Optional[Dict[str, dict]] = None
+        self._lock = threading.Lock()
+        # Time spent in lookups and how they were answered, for --profile-startup
+        self.seconds = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> Dict[str, dict]:
+        if self._entries is None:
+            try:
+                data = json.loads(self.path.read_text(encoding='utf-8'))
+                self._entries = data if isinstance(data, dict) else {}
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def _save(self) -> None:
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_text(json.dumps(self._entries, indent=1), encoding='utf-8')
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.debug(f"Не удалось сохранить {self.path.name}: {e}")
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    @staticmethod
+    def _mtime(path: Path) -> Optional[int]:
+        try:
+            return path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def lookup(self, key: str, discover: Callable[[], Optional[Path]],
+               witness: Optional[Path] = None) -> Optional[Path]:
+        """Returns the remembered result of ``discover`` for ``key``, running it if stale or unknown."""
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                entry = self._load().get(key)
+                if isinstance(entry, dict):
+                    found = Path(entry['path']) if entry.get('path') else None
+                    check = witness or found
+                    mtime_ns = self._mtime(check) if check is not None else None
+                    if mtime_ns is not None and entry.get('mtime_ns') == mtime_ns and (found is None or found.exists()):
+                        self.hits += 1
+                        return found
+
+            found = discover()
+            self.misses += 1
+            check = witness or found
+            mtime_ns = self._mtime(check) if check is not None else None
+            with self._lock:
+                entries = self._load()
+                if mtime_ns is None:
+                    if entries.pop(key, None) is None:
+                        return found
+                else:
+                    entries[key] = {'path': str(found) if found else None, 'mtime_ns': mtime_ns}
+                self._save()
+            return found
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+discovery_cache = DiscoveryCache(DISCOVERY_STATE)
 
 
 # --- Helper Functions for Config ---
 
-def check_whisper_cpp() -> tuple[Path, Path]:
-    """Checks for whisper.cpp binary and models directory."""
-    script_dir = Path(__file__).parent.parent.resolve()
-    whisper_dir = script_dir / WHISPER_CPP_PATH
-    
-    # Try to find the binary in a few common build paths (handles Windows .exe)
+def _whisper_dir() -> Path:
+    """Returns the path of the bundled whisper.cpp checkout."""
+    return Path(__file__).parent.parent.resolve() / WHISPER_CPP_PATH
+
+
+def _binary_candidates(whisper_dir: Path, name: str) -> list[Path]:
+    """Lists the common build paths of a whisper.cpp binary (handles Windows .exe)."""
     exe_suffix = ".exe" if platform.system() == "Windows" else ""
-    binary_name = f"whisper-cli{exe_suffix}"
-    possible_paths = [
+    binary_name = f"{name}{exe_suffix}"
+    return [
         whisper_dir / "build" / "bin" / binary_name,
         whisper_dir / "build" / "Release" / binary_name,
         whisper_dir / binary_name,
     ]
+
+
+def check_whisper_cpp() -> tuple[Path, Path]:
+    """Checks for whisper.cpp binary and models directory."""
+    whisper_dir = _whisper_dir()
+    
+    # Try to find the binary in a few common build paths
+    possible_paths = _binary_candidates(whisper_dir, "whisper-cli")
     
-    whisper_bin = next((p for p in possible_paths if p.exists()), None)
+    whisper_bin = discovery_cache.lookup(f"whisper-cli:{whisper_dir}",
+                                         lambda: next((p for p in possible_paths if p.exists()), None))
     
     models_dir = whisper_dir / "models"
 
@@ -53,18 +166,27 @@ def check_whisper_cpp() -> tuple[Path, Path]:
 
     return whisper_bin, models_dir
 
+
+def find_whisper_server() -> Optional[Path]:
+    """Looks for the whisper.cpp server binary; it is optional, so None if not built."""
+    whisper_dir = _whisper_dir()
+    possible_paths = _binary_candidates(whisper_dir, "whisper-server")
+    return discovery_cache.lookup(f"whisper-server:{whisper_dir}",
+                                  lambda: next((p for p in possible_paths if p.exists()), None))
+
+
 def check_model(models_dir: Path, model_name: str) -> Path:
     """Checks if a model file exists and returns its path."""
     model_path = models_dir / f"ggml-{model_name}.bin"
-    if not model_path.exists():
-        en_model_path = models_dir / f"ggml-{model_name}.en.bin"
-        if en_model_path.exists():
-            return en_model_path
+    en_model_path = models_dir / f"ggml-{model_name}.en.bin"
+    found = discovery_cache.lookup(f"model:{models_dir}:{model_name}",
+                                   lambda: next((p for p in (model_path, en_model_path) if p.exists()), None))
+    if found is None:
         raise click.ClickException(
             f"Model not found: {model_path}\n"
             f"Please download it: cd {models_dir.parent} && ./models/download-ggml-model.sh {model_name}"
         )
-    return model_path
+    return found
 
 
 # --- Main Configuration Class ---
@@ -75,12 +197,24 @@ class TranscriptionConfig:
     model_name: str
     language: str
     threads: int
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT
+    # Run the EQ filter chain even on inputs that could skip re-encoding
+    force_filters: bool = False
+    # Cut silence out with the built-in VAD (video2note.vad) before whisper.cpp
+    trim_silence: bool = False
+    # Decoding effort (see video2note.tuning for the presets); 1 and 1 decode greedily
+    beam_size: int = DEFAULT_BEAM_SIZE
+    best_of: int = DEFAULT_BEST_OF
+    # Found in the bundled whisper.cpp checkout unless given (e.g. a stub binary for benchmarks)
+    whisper_bin: Optional[Path] = None
+    models_dir: Optional[Path] = None
 
-    whisper_bin: Path = field(init=False)
-    models_dir: Path = field(init=False)
     model_path: Path = field(init=False)
 
     def __post_init__(self):
         """Checks paths and model after initialization."""
-        self.whisper_bin, self.models_dir = check_whisper_cpp()
+        if self.whisper_bin is None or self.models_dir is None:
+            whisper_bin, models_dir = check_whisper_cpp()
+            self.whisper_bin = self.whisper_bin or whisper_bin
+            self.models_dir = self.models_dir or models_dir
         self.model_path = check_model(self.models_dir, self.model_name) 
\ No newline at end of file
@@ -4,26 +4,288 @@ Core application logic for Video2Note.
 This module is UI-agnostic and can be used as a library.
 """
 import logging
-from dataclasses import dataclass
+import math
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Optional
+from typing import (TYPE_CHECKING, Callable, Deque, Dict, Iterable, Iterator,
+                    List, Optional, Sequence, Tuple)
 
+from .audio_cache import AudioCache, source_tag
+from .cache import TranscriptCache
+from .checkpoint import MIN_RESUME_DURATION, SegmentCheckpoint
 from .config import TranscriptionConfig
-from .transcriber import prepare_audio_source, run_whisper_transcription
-from .utils import (calculate_eta, get_media_duration, get_run_signature,
-                    load_hist, save_hist)
+from .exceptions import NoAudioStreamError, Video2NoteError
+from .metrics import MetricsStore, RunMetrics
+from .output import (DEFAULT_FORMATS, PartialTranscript, draft_marker,
+                     needs_timing, output_paths, render_txt, write_outputs)
+from .probe import probe_many, probe_media
+from .segments import Segment
+from .supervisor import cancellation
+from .tracing import Span, Tracer
+from .transcriber import (AUTO_LANGUAGE, LONG_FILE_SECONDS,
+                          MIN_THREADS_PER_CHUNK, CliBackend, SegmentCallback,
+                          TranscriptionBackend, audio_fast_path,
+                          auto_parallel_chunks, detect_languages,
+                          find_vad_model, prepare_audio_source,
+                          run_chunked_transcription)
+from .ui import progress_label
+from .utils import (EtaEstimate, RuntimeModel, calculate_eta,
+                    fit_history_model, get_media_duration, get_run_signature,
+                    is_nonempty_text_file)
+
+if TYPE_CHECKING:
+    # Pulls in numpy; imported only when --trim-silence is used
+    from .vad import SpeechMap
 
 logger = logging.getLogger(__name__)
 
+# Every concurrent job loads its own copy of the model
+MAX_PARALLEL_JOBS = 4
+
 
 @dataclass
 class TranscriptionResult:
     """Dataclass to hold the results of a transcription."""
-    transcription: str
     source_file: Path
     output_file: Path
     duration: float
     elapsed_time: float
+    cached: bool = False
+    spans: List[Span] = field(default_factory=list)
+    # Timestamped segments on the source timeline (untimed for old cache entries)
+    segments: List[Segment] = field(default_factory=list)
+    # Set when silence was trimmed: maps whisper.cpp timestamps back to the source
+    speech_map: Optional["SpeechMap"] = None
+    # The language transcribed in, as detected for ``auto``; None if detection failed
+    language: Optional[str] = None
+
+    @property
+    def transcription(self) -> str:
+        """The plain-text transcript, rendered from the segments like the .txt output."""
+        return render_txt(self.segments)
+
+    def preview(self, limit: int = 300) -> str:
+        """The beginning of the transcript, built from the first segments only."""
+        lines: List[str] = []
+        length = 0
+        for segment in self.segments:
+            if length > limit:
+                break
+            if segment.text:
+                lines.append(segment.text)
+                length += len(segment.text) + 1
+        text = "\n".join(lines)
+        return text[:limit] + "..." if len(text) > limit else text
+
+
+@dataclass
+class BatchJob:
+    """A single file scheduled for batch processing."""
+    input_file: Path
+    output_path: Path
+    # Output formats; see output.output_paths() for where each one goes
+    formats: Sequence[str] = DEFAULT_FORMATS
+    # A quick draft with a small model, to be replaced by the final transcript later
+    draft: bool = False
+    # Language of this file (from a manifest), overriding config.language
+    language: Optional[str] = None
+    # Language detected for an ``auto`` job by detect_batch_languages(); the cache stays keyed on ``auto``
+    detected_language: Optional[str] = None
+
+    def configure(self, config: TranscriptionConfig) -> TranscriptionConfig:
+        """``config`` with this job's language, if it has its own."""
+        if self.language is None or self.language == config.language:
+            return config
+        return replace(config, language=self.language)
+
+    def is_done(self) -> bool:
+        """
+        True if every output of this job already exists and is not empty.
+        A draft job is also done when a final transcript exists, while a
+        final job is not done while its outputs are still a draft.
+        """
+        if not all(is_nonempty_text_file(path) for path in output_paths(self.output_path, self.formats).values()):
+            return False
+        return self.draft or not draft_marker(self.output_path).exists()
+
+
+@dataclass
+class BatchOutcome:
+    """The outcome of one batch job: a result, an error, or a skip."""
+    job: BatchJob
+    result: Optional[TranscriptionResult] = None
+    error: Optional[Video2NoteError] = None
+    skipped: bool = False
+    spans: List[Span] = field(default_factory=list)
+
+
+BATCH_ORDERS = ('input', 'longest-first', 'shortest-first')
+
+
+@dataclass
+class BatchPlan:
+    """Jobs in processing order, the number of concurrent jobs and the predicted wall time of the batch."""
+    jobs: List[BatchJob]
+    workers: int = 1
+    eta: Optional[EtaEstimate] = None
+    unknown: int = 0
+    # Probed media durations in seconds, aligned with ``jobs`` (0 if unknown)
+    durations: List[float] = field(default_factory=list)
+
+
+def _sum_estimates(estimates: List[EtaEstimate]) -> Optional[EtaEstimate]:
+    """Adds up per-file estimates; interval half-widths combine in quadrature."""
+    if not estimates:
+        return None
+    seconds = sum(e.seconds for e in estimates)
+    if any(e.low is None or e.high is None for e in estimates):
+        return EtaEstimate(seconds)
+    below = math.sqrt(sum((e.seconds - e.low) ** 2 for e in estimates))
+    above = math.sqrt(sum((e.high - e.seconds) ** 2 for e in estimates))
+    return EtaEstimate(seconds, max(0.0, seconds - below), seconds + above)
+
+
+def _predict_makespan(estimates: List[EtaEstimate], workers: int) -> Optional[EtaEstimate]:
+    """
+    Simulates list scheduling: each job, in order, starts on the worker that
+    frees up first. Returns the estimate of the busiest worker.
+    """
+    queues: List[List[EtaEstimate]] = [[] for _ in range(max(1, workers))]
+    loads = [0.0] * len(queues)
+    for estimate in estimates:
+        i = loads.index(min(loads))
+        queues[i].append(estimate)
+        loads[i] += estimate.seconds
+    return _sum_estimates(queues[loads.index(max(loads))])
+
+
+def plan_batch(
+    jobs: Iterable[BatchJob],
+    config: TranscriptionConfig,
+    order: str = 'longest-first',
+    overwrite: bool = False,
+    parallel_chunks: int = 1,
+    workers: int = 1,
+) -> BatchPlan:
+    """
+    Probes all inputs, orders the batch and predicts its makespan.
+
+    With ``longest-first``, jobs are sorted by predicted processing time
+    (media duration when there is no history), so list scheduling across
+    workers is longest-processing-time-first, which keeps one long file
+    from being left for the end.
+
+    Args:
+        jobs: Files to process, in input order.
+        config: The transcription configuration.
+        order: One of BATCH_ORDERS.
+        overwrite: Whether existing transcripts will be redone; jobs that
+            will be skipped do not count towards the prediction.
+        parallel_chunks: Per-file process count, as passed to run_pipeline().
+        workers: Number of concurrent jobs (0 picks one with auto_job_count()).
+
+    Returns:
+        A BatchPlan; ``unknown`` counts files without a prediction.
+    """
+    if order not in BATCH_ORDERS:
+        raise ValueError(f"Unknown batch order: {order}")
+    jobs = list(jobs)
+    probed = probe_many([job.input_file for job in jobs])
+    durations = {id(job): info.duration if info else 0.0 for job, info in zip(jobs, probed)}
+    runnable = [job for job in jobs if not _should_skip(job, overwrite)]
+    if not workers:
+        workers = auto_job_count([durations[id(job)] for job in runnable], config)
+
+    worker_config = replace(config, threads=max(1, config.threads // workers)) if workers > 1 else config
+    vad = find_vad_model(config.models_dir) is not None
+    estimates: Dict[int, EtaEstimate] = {}
+    for job in runnable:
+        duration = durations[id(job)]
+        chunk_count = (parallel_chunks or auto_parallel_chunks(duration, worker_config.threads)) if duration > 0 else 1
+        estimate = calculate_eta(worker_config, duration, chunk_count, vad)
+        if estimate is not None:
+            estimates[id(job)] = estimate
+
+    # Jobs without an estimate are put on the same scale as the rest: their
+    # media duration times the typical compute/media ratio of the known jobs
+    ratios = sorted(estimates[id(job)].seconds / durations[id(job)]
+                    for job in runnable if id(job) in estimates and durations[id(job)] > 0)
+    ratio = ratios[len(ratios) // 2] if ratios else 1.0
+
+    def processing_time(job: BatchJob) -> float:
+        estimate = estimates.get(id(job))
+        return estimate.seconds if estimate else durations[id(job)] * ratio
+
+    if order != 'input':
+        jobs.sort(key=processing_time, reverse=order == 'longest-first')
+    scheduled = [estimates[id(job)] for job in jobs if id(job) in estimates]
+    return BatchPlan(
+        jobs=jobs,
+        workers=workers,
+        eta=_predict_makespan(scheduled, workers),
+        unknown=len(runnable) - len(scheduled),
+        durations=[durations[id(job)] for job in jobs],
+    )
+
+
+def detect_batch_languages(jobs: Iterable[BatchJob], config: TranscriptionConfig,
+                           overwrite: bool = False, cache: Optional[TranscriptCache] = None,
+                           detect_config: Optional[TranscriptionConfig] = None) -> List[BatchJob]:
+    """
+    Resolves the ``auto`` language of every job in one detection pass (see
+    detect_languages()), so the model is loaded once for all of them and
+    each file is then transcribed in its own language, e.g. by one warm
+    whisper-server. The result goes to BatchJob.detected_language.
+
+    Jobs that will be skipped or whose transcript is in ``cache`` are not
+    detected, nor are files whose language could not be detected.
+    ``detect_config`` runs the detection with another (e.g. smaller) model.
+    """
+    jobs = list(jobs)
+    pending = [job for job in jobs
+               if job.configure(config).language == AUTO_LANGUAGE and not _should_skip(job, overwrite)
+               and not (cache and cache.contains(job.input_file, job.configure(config)))]
+    if not pending:
+        return jobs
+    detected = detect_languages([job.input_file for job in pending], detect_config or config)
+    return [replace(job, detected_language=detected[job.input_file]) if job.input_file in detected else job
+            for job in jobs]
+
+
+def _makespan(durations: List[float], model: RuntimeModel, threads: int, workers: int) -> float:
+    """Predicted wall time of running files on ``workers`` workers, longest first."""
+    loads = [0.0] * workers
+    for duration in sorted(durations, reverse=True):
+        estimate = model.predict(duration, threads)
+        loads[loads.index(min(loads))] += estimate.seconds if estimate else 0.0
+    return max(loads)
+
+
+def auto_job_count(durations: List[float], config: TranscriptionConfig) -> int:
+    """
+    Picks how many files to transcribe at once, splitting config.threads
+    between them.
+
+    Uses the run-metrics history to compare the predicted makespan of each
+    job count; without history, short files (where model load dominates)
+    run in parallel and long ones one at a time. Each job keeps at least
+    MIN_THREADS_PER_CHUNK threads.
+    """
+    known = [d for d in durations if d > 0]
+    candidates = [n for n in range(1, MAX_PARALLEL_JOBS + 1)
+                  if n <= max(len(durations), 1) and config.threads // n >= MIN_THREADS_PER_CHUNK] or [1]
+    if not known:
+        return 1
+    model = fit_history_model(config.model_name, 1, find_vad_model(config.models_dir) is not None, config.beam_size)
+    if model is None:
+        return candidates[-1] if sorted(known)[len(known) // 2] < LONG_FILE_SECONDS else 1
+    # Ties go to fewer jobs (less memory)
+    return min(candidates, key=lambda n: _makespan(known, model, config.threads // n, n))
 
 
 def run_pipeline(
@@ -32,6 +294,19 @@ def run_pipeline(
     temp_dir: Path,
     output_path: Path,
     delete_temp: bool,
+    audio_source: Optional[Path] = None,
+    backend: Optional[TranscriptionBackend] = None,
+    stream: bool = False,
+    cache: Optional[TranscriptCache] = None,
+    parallel_chunks: int = 1,
+    resume: bool = False,
+    record_metrics: bool = True,
+    audio_cache: Optional[AudioCache] = None,
+    tracer: Optional[Tracer] = None,
+    formats: Sequence[str] = DEFAULT_FORMATS,
+    draft: bool = False,
+    on_segment: Optional[SegmentCallback] = None,
+    detected_language: Optional[str] = None,
 ) -> TranscriptionResult:
     """
     Processes a single media file through the full transcription pipeline.
@@ -42,40 +317,488 @@ def run_pipeline(
         temp_dir: Directory for temporary files.
         output_path: The file path to save the transcription to.
         delete_temp: Whether to delete the temporary audio file.
+        audio_source: An already prepared audio file (e.g. prefetched by
+            run_batch); skips the ffmpeg conversion when given.
+        backend: Transcription backend to use (e.g. a warm whisper-server);
+            whisper-cli is spawned for this file when omitted.
+        stream: Pipe decoded PCM from ffmpeg straight into the backend
+            instead of converting to a temporary FLAC file first.
+        cache: Transcript cache; a hit is returned without running
+            ffmpeg or whisper.cpp, and new transcripts are stored in it.
+        parallel_chunks: Number of whisper.cpp processes to split the file
+            across (0 picks a number from the file duration, or 1 when a
+            warm ``backend`` serves the file). Chunking needs a converted
+            audio file, so it overrides ``stream``.
+        resume: Checkpoint finished segments in ``temp_dir`` and continue
+            an interrupted transcription of the same file from there;
+            chunked files are checkpointed chunk by chunk. Files shorter
+            than MIN_RESUME_DURATION, and files a warm ``backend`` serves,
+            are simply redone.
+        record_metrics: Whether to add this run to the metrics used for
+            ETAs (benchmarks against a stub binary must not).
+        audio_cache: Where converted audio is kept and reused between runs
+            (a default-sized cache in ``temp_dir`` when omitted).
+        tracer: Receives a span per pipeline stage; spans recorded into it
+            beforehand (e.g. a prefetched conversion) count as part of
+            this file. A new one is used when omitted.
+        formats: Output formats to write (see video2note.output); all are
+            rendered from one whisper.cpp pass. ``txt`` goes to
+            ``output_path``, the others next to it.
+        draft: Mark the outputs as a draft, to be replaced by a later run
+            without it (see BatchJob.draft).
+        on_segment: Called with each segment, on the source timeline, as
+            soon as whisper.cpp has decoded it (from a pipeline thread);
+            a cached transcript is delivered at once. Meanwhile the text
+            is appended to ``<output_path>.partial``.
+        detected_language: The language already detected for an ``auto``
+            config (see detect_batch_languages()); without it, it is
+            detected here unless the transcript is cached.
 
     Returns:
-        A TranscriptionResult object containing the outcome.
+        A TranscriptionResult object containing the outcome, with the
+        recorded spans in ``spans``.
     """
     logger.info(f"Начало обработки: {input_file.name}")
+    tracer = tracer or Tracer(file=input_file.name)
+    with tracer.span("pipeline") as pipeline_attrs:
+        result = _run_stages(input_file, config, temp_dir, output_path, delete_temp, audio_source, backend,
+                             stream, cache, parallel_chunks, resume, record_metrics, tracer, formats, draft,
+                             on_segment, audio_cache, detected_language)
+        pipeline_attrs["cached"] = result.cached
+    result.spans = tracer.spans
+    return result
+
+
+def _run_stages(input_file: Path, config: TranscriptionConfig, temp_dir: Path, output_path: Path,
+                delete_temp: bool, audio_source: Optional[Path], backend: Optional[TranscriptionBackend],
+                stream: bool, cache: Optional[TranscriptCache], parallel_chunks: int, resume: bool,
+                record_metrics: bool, tracer: Tracer, formats: Sequence[str], draft: bool,
+                on_segment: Optional[SegmentCallback], audio_cache: Optional[AudioCache],
+                detected_language: Optional[str]) -> TranscriptionResult:
+    """The stages of run_pipeline(), each recorded as a span."""
+    pipeline_start = time.perf_counter()
+
+    # Keyed on the requested language, so an ``auto`` hit needs no detection
+    with tracer.span("cache.lookup", enabled=cache is not None) as attrs:
+        cache_key = cache.key(input_file, config) if cache else None
+        cached = cache.get(cache_key) if cache and cache_key else None
+        attrs["hit"] = cached is not None
+    if cached is not None and not cached.segments and needs_timing(formats):
+        logger.info("В кэше нет меток времени для субтитров — транскрибирую заново.")
+        cached = None
+    if cached is not None:
+        # Entries from before timestamps were kept: one untimed segment per line is enough for txt
+        segments = cached.segments or [Segment(0.0, 0.0, line) for line in cached.transcription.splitlines()]
+        if on_segment:
+            for segment in segments:
+                on_segment(segment)
+        if audio_source is not None and audio_source != input_file and delete_temp:
+            audio_source.unlink(missing_ok=True)
+        with tracer.span("output.write", formats=list(formats), draft=draft):
+            write_outputs(output_path, segments, formats, draft)
+        logger.info(f"Транскрипция взята из кэша: {output_path}")
+        return TranscriptionResult(
+            source_file=input_file,
+            output_file=output_path,
+            duration=cached.duration,
+            elapsed_time=0.0,
+            cached=True,
+            segments=segments,
+            language=cached.language or (None if config.language == AUTO_LANGUAGE else config.language),
+        )
+
+    # Batches detect all their languages up front (detect_batch_languages()); a lone file does it here
+    if config.language == AUTO_LANGUAGE:
+        detected = detected_language
+        if detected is None:
+            with tracer.span("language.detect") as attrs:
+                detected = detect_languages([input_file], config).get(input_file)
+                attrs["language"] = detected
+        if detected:
+            config = replace(config, language=detected)
+    language = None if config.language == AUTO_LANGUAGE else config.language
+
+    # Usually answered from the probe of the whole batch in plan_batch()
+    with tracer.span("probe") as attrs:
+        info = probe_media(input_file)
+        if info is not None:
+            attrs.update(duration=info.duration, has_audio=info.has_audio, codec=info.codec,
+                         sample_rate=info.sample_rate, channels=info.channels)
+    if info is not None and not info.has_audio:
+        if audio_source is not None and audio_source != input_file and delete_temp:
+            audio_source.unlink(missing_ok=True)
+        raise NoAudioStreamError(f"В файле нет аудиодорожки: {input_file.name}")
+
+    fast_path = None if config.force_filters else audio_fast_path(info)
+
+    def convert() -> Path:
+        with tracer.span("ffmpeg.convert", fast_path=fast_path):
+            return prepare_audio_source(input_file, temp_dir, config.stall_timeout, info, config.force_filters,
+                                        audio_cache)
+
+    backend = backend or CliBackend()
+    # A file whisper.cpp can read as is beats decoding it through a pipe; silence trimming needs a file too
+    if audio_source is None and (not stream or fast_path == 'direct' or config.trim_silence):
+        audio_source = convert()
+    speech_audio: Optional[Path] = None
+    speech_map: Optional["SpeechMap"] = None
+    partial = PartialTranscript(output_path)
+
+    def emit(segment: Segment) -> None:
+        if speech_map is not None:
+            segment = speech_map.map_segments([segment])[0]
+        partial.add(segment)
+        if on_segment:
+            on_segment(segment)
 
-    audio_source = prepare_audio_source(input_file, temp_dir)
     try:
-        audio_duration = get_media_duration(audio_source)
-        eta = calculate_eta(config, audio_duration)
+        audio_duration = info.duration if info is not None else 0.0
+        if audio_duration <= 0 and audio_source is not None:
+            # The container does not state a duration; the converted FLAC always does
+            with tracer.span("probe", converted=True) as attrs:
+                audio_duration = get_media_duration(audio_source)
+                attrs["duration"] = audio_duration
+
+        # Everything from here on runs on the speech-only audio when silence is trimmed
+        whisper_duration = audio_duration
+        if config.trim_silence:
+            speech_audio = temp_dir / f"{source_tag(input_file)}.speech.wav"
+            with tracer.span("vad") as attrs:
+                from .vad import remove_silence
+                speech_map = remove_silence(audio_source, speech_audio, config.stall_timeout)
+                attrs["speech"] = speech_map.speech_duration if speech_map else None
+            if speech_map is not None:
+                whisper_duration = speech_map.speech_duration
+            else:
+                speech_audio = None
 
-        transcription, elapsed = run_whisper_transcription(audio_source, config, eta)
+        # A warm server takes the whole file in one request, without the reload that chunks would save
+        warm = backend.warm(config)
+        chunk_count = parallel_chunks or (1 if warm else auto_parallel_chunks(whisper_duration, config.threads))
+        if whisper_duration <= 0:
+            chunk_count = 1
+        if chunk_count > 1 and audio_source is None:
+            audio_source = convert()
+        whisper_source = speech_audio or audio_source
+        vad = find_vad_model(config.models_dir) is not None
+        with tracer.span("history.read") as attrs:
+            eta = calculate_eta(config, whisper_duration, chunk_count, vad)
+            attrs["eta"] = eta.seconds if eta else None
+        checkpoint = chunk_checkpoint = None
+        if resume and not 0 < whisper_duration < MIN_RESUME_DURATION:
+            if chunk_count > 1:
+                chunk_checkpoint = lambda window: SegmentCheckpoint.for_input(input_file, config, temp_dir, window)
+            else:
+                checkpoint = SegmentCheckpoint.for_input(input_file, config, temp_dir)
+                if warm and not checkpoint.path.exists():
+                    # The server cannot save segments as it goes; only an interrupted whisper-cli run is resumed
+                    checkpoint = None
+
+        mode = "chunked" if chunk_count > 1 else "stream" if whisper_source is None else "file"
+        with tracer.span("whisper", mode=mode, backend=type(backend).__name__, model=config.model_name,
+                         language=config.language, threads=config.threads, beam=config.beam_size, chunks=chunk_count,
+                         vad=vad):
+            if chunk_count > 1:
+                segments, elapsed = run_chunked_transcription(whisper_source, config, eta, whisper_duration,
+                                                              chunk_count, emit, chunk_checkpoint)
+            elif whisper_source is None:
+                segments, elapsed = backend.transcribe_stream(input_file, config, eta, checkpoint, emit)
+            else:
+                segments, elapsed = backend.transcribe(whisper_source, config, eta, checkpoint, emit)
+        partial.close()
+        if speech_map is not None:
+            segments = speech_map.map_segments(segments)
+        transcription = render_txt(segments)
 
         # Update history
-        if audio_duration > 0:
-            hist = load_hist()
-            sig = get_run_signature(config)
-            hist[sig].append([audio_duration, elapsed])
-            hist[sig] = hist[sig][-30:]  # Keep last 30 entries
-            save_hist(hist)
+        if record_metrics and whisper_duration > 0:
+            with tracer.span("history.write"):
+                MetricsStore().record(RunMetrics(
+                    signature=get_run_signature(config, chunk_count),
+                    model=config.model_name,
+                    threads=config.threads,
+                    vad=vad,
+                    duration=whisper_duration,
+                    elapsed=time.perf_counter() - pipeline_start,
+                    whisper_time=elapsed,
+                    # Conversions done ahead of time (prefetch) are recorded in the same tracer
+                    ffmpeg_time=tracer.total("ffmpeg.convert"),
+                    chunks=chunk_count,
+                    language=language,
+                    beam_size=config.beam_size,
+                ))
+
+        if cache and cache_key and transcription:
+            with tracer.span("cache.write"):
+                cache.put(cache_key, transcription, audio_duration, input_file, segments, language)
 
         # Save result
-        output_path.write_text(transcription, encoding='utf-8')
+        with tracer.span("output.write", formats=list(formats), draft=draft):
+            write_outputs(output_path, segments, formats, draft)
         logger.info(f"Результат сохранён: {output_path}")
+        if checkpoint or chunk_checkpoint:
+            SegmentCheckpoint.clear(input_file, temp_dir)
 
         return TranscriptionResult(
-            transcription=transcription,
             source_file=input_file,
             output_file=output_path,
             duration=audio_duration,
             elapsed_time=elapsed,
+            segments=segments,
+            speech_map=speech_map,
+            language=language,
         )
     finally:
+        partial.close()
         # Cleanup
-        if audio_source != input_file and delete_temp:
+        if audio_source is not None and audio_source != input_file and delete_temp:
             logger.debug(f"Удаляю временный файл: {audio_source.name}")
-            audio_source.unlink(missing_ok=True) 
\ No newline at end of file
+            audio_source.unlink(missing_ok=True)
+        # Cheap to redo from the cached audio, and outside the audio cache's budget, so never kept
+        if speech_audio is not None:
+            logger.debug(f"Удаляю временный файл: {speech_audio.name}")
+            speech_audio.unlink(missing_ok=True)
+
+
+def iter_segments(
+    input_file: Path,
+    config: TranscriptionConfig,
+    temp_dir: Path,
+    output_path: Path,
+    delete_temp: bool = True,
+    **kwargs,
+) -> Iterator[Segment]:
+    """
+    Transcribes a file like run_pipeline() and yields each segment as soon
+    as whisper.cpp has decoded it; other arguments are as for run_pipeline().
+
+    The pipeline runs on a background thread. Its errors are raised from the
+    generator, and closing the generator early cancels the transcription and
+    kills its processes.
+    """
+    segments: "queue.Queue[object]" = queue.Queue()
+    cancel = threading.Event()
+    finished = object()
+
+    def work() -> None:
+        try:
+            with cancellation(cancel):
+                run_pipeline(input_file, config, temp_dir, output_path, delete_temp,
+                             on_segment=segments.put, **kwargs)
+        except BaseException as e:
+            segments.put(e)
+        else:
+            segments.put(finished)
+
+    worker = threading.Thread(target=work, name="video2note-segments", daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = segments.get()
+            if item is finished:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancel.set()
+        worker.join()
+
+
+def run_parallel_batch(
+    jobs: Iterable[BatchJob],
+    config: TranscriptionConfig,
+    temp_dir: Path,
+    delete_temp: bool,
+    workers: int,
+    overwrite: bool = False,
+    stream: bool = False,
+    cache: Optional[TranscriptCache] = None,
+    parallel_chunks: int = 1,
+    resume: bool = False,
+    on_start: Optional[Callable[[BatchJob], None]] = None,
+    audio_cache: Optional[AudioCache] = None,
+) -> Iterator[BatchOutcome]:
+    """
+    Transcribes several files at once with whisper-cli, giving each of the
+    ``workers`` jobs an equal share of config.threads.
+
+    Arguments are as for run_batch(); ``on_start`` is called from the
+    worker thread. Wrap the iteration in ui.shared_progress() to show all
+    running jobs in one view.
+
+    Jobs writing to the same output path as an earlier job (e.g. a/talk.mp4
+    and b/talk.mp4 into one folder) would run at the same time and
+    overwrite each other's files; like the later one in run_batch(), they
+    are skipped.
+
+    Yields:
+        A BatchOutcome per job, in completion order.
+    """
+    workers = max(1, workers)
+    worker_config = replace(config, threads=max(1, config.threads // workers))
+    unique: List[BatchJob] = []
+    claimed = set()
+    for job in jobs:
+        output = job.output_path.resolve()
+        if output in claimed:
+            logger.warning(f"{job.input_file}: в {job.output_path.name} уже пишет другой файл пакета — пропускаю.")
+            yield BatchOutcome(job, skipped=True)
+            continue
+        claimed.add(output)
+        unique.append(job)
+
+    def process(job: BatchJob) -> BatchOutcome:
+        if _should_skip(job, overwrite):
+            return BatchOutcome(job, skipped=True)
+        if on_start:
+            on_start(job)
+        tracer = Tracer(file=job.input_file.name)
+        try:
+            with progress_label(job.input_file.name):
+                result = run_pipeline(job.input_file, job.configure(worker_config), temp_dir, job.output_path, delete_temp,
+                                      stream=stream, cache=cache, parallel_chunks=parallel_chunks,
+                                      resume=resume, tracer=tracer, formats=job.formats, draft=job.draft,
+                                      audio_cache=audio_cache, detected_language=job.detected_language)
+        except Video2NoteError as e:
+            return BatchOutcome(job, error=e, spans=tracer.spans)
+        return BatchOutcome(job, result=result, spans=result.spans)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="video2note-job") as pool:
+        futures = [pool.submit(process, job) for job in unique]
+        try:
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _should_skip(job: BatchJob, overwrite: bool) -> bool:
+    """Returns True if the job already has all its outputs and must not be redone."""
+    return not overwrite and job.is_done()
+
+
+def _discard_prefetched(future: Future, job: BatchJob, delete_temp: bool) -> None:
+    """Cancels a prefetch or removes the audio it has already produced."""
+    if future.cancel() or not delete_temp:
+        return
+    try:
+        prepared = future.result()
+    except Exception:
+        return
+    if prepared is not None and prepared != job.input_file:
+        prepared.unlink(missing_ok=True)
+
+
+def _prefetch_audio(job: BatchJob, config: TranscriptionConfig, temp_dir: Path,
+                    cache: Optional[TranscriptCache], audio_cache: Optional[AudioCache],
+                    tracer: Tracer) -> Optional[Path]:
+    """Converts a job's audio in advance, unless its transcript is already cached."""
+    with tracer.span("cache.check"):
+        if cache and cache.contains(job.input_file, config):
+            return None
+    info = probe_media(job.input_file)
+    if info is not None and not info.has_audio:
+        # run_pipeline() reports it
+        return None
+    fast_path = None if config.force_filters else audio_fast_path(info)
+    with tracer.span("ffmpeg.convert", prefetch=True, fast_path=fast_path):
+        return prepare_audio_source(job.input_file, temp_dir, config.stall_timeout, info, config.force_filters,
+                                    audio_cache)
+
+
+def run_batch(
+    jobs: Iterable[BatchJob],
+    config: TranscriptionConfig,
+    temp_dir: Path,
+    delete_temp: bool,
+    overwrite: bool = False,
+    prefetch_depth: int = 1,
+    prefetch_workers: int = 1,
+    backend: Optional[TranscriptionBackend] = None,
+    stream: bool = False,
+    cache: Optional[TranscriptCache] = None,
+    parallel_chunks: int = 1,
+    resume: bool = False,
+    on_start: Optional[Callable[[BatchJob], None]] = None,
+    audio_cache: Optional[AudioCache] = None,
+) -> Iterator[BatchOutcome]:
+    """
+    Processes many files, overlapping ffmpeg conversion of upcoming files
+    with whisper.cpp transcription of the current one.
+
+    At most ``prefetch_depth`` files are converted ahead of the one being
+    transcribed, so the temp directory holds a bounded number of files.
+    A depth of 0 processes files strictly one after another.
+
+    Args:
+        jobs: Files to process, in order.
+        config: The transcription configuration.
+        temp_dir: Directory for temporary files.
+        delete_temp: Whether to delete the temporary audio files.
+        overwrite: Whether to redo files that already have a transcript.
+        prefetch_depth: How many upcoming files to convert in advance.
+        prefetch_workers: Size of the ffmpeg worker pool.
+        backend: Transcription backend shared by all jobs.
+        stream: Pipe audio from ffmpeg into the backend; nothing is
+            prefetched then, since decoding already overlaps transcription.
+        cache: Transcript cache shared by all jobs.
+        parallel_chunks: Per-file process count for long recordings (0 = auto).
+        resume: Checkpoint segments and resume interrupted files.
+        on_start: Called with each job right before it is processed.
+        audio_cache: Converted audio kept between runs (see run_pipeline()).
+
+    Yields:
+        A BatchOutcome per job, in input order, with the spans recorded
+        for it (including its prefetched conversion).
+    """
+    remaining = iter(jobs)
+    pending: Deque[Tuple[BatchJob, Tracer, Optional[Future]]] = deque()
+    depth = max(0, prefetch_depth)
+
+    with ThreadPoolExecutor(max_workers=max(1, prefetch_workers), thread_name_prefix="video2note-ffmpeg") as pool:
+        def enqueue() -> bool:
+            job = next(remaining, None)
+            if job is None:
+                return False
+            tracer = Tracer(file=job.input_file.name)
+            # Jobs that will be skipped anyway are not worth converting
+            future = None if stream or _should_skip(job, overwrite) else pool.submit(_prefetch_audio, job, job.configure(config),
+                                                                                    temp_dir, cache, audio_cache, tracer)
+            pending.append((job, tracer, future))
+            return True
+
+        try:
+            while pending or enqueue():
+                job, tracer, future = pending.popleft()
+                while len(pending) < depth and enqueue():
+                    pass
+
+                if on_start:
+                    on_start(job)
+
+                # Re-check: an earlier job in this batch may have produced the same output
+                if _should_skip(job, overwrite):
+                    if future is not None:
+                        _discard_prefetched(future, job, delete_temp)
+                    yield BatchOutcome(job, skipped=True, spans=tracer.spans)
+                    continue
+
+                try:
+                    with tracer.span("prefetch.wait"):
+                        audio_source = future.result() if future is not None else None
+                    result = run_pipeline(job.input_file, job.configure(config), temp_dir, job.output_path, delete_temp,
+                                          audio_source=audio_source, backend=backend, stream=stream, cache=cache,
+                                          parallel_chunks=parallel_chunks, resume=resume, tracer=tracer,
+                                          formats=job.formats, draft=job.draft, audio_cache=audio_cache,
+                                          detected_language=job.detected_language)
+                except Video2NoteError as e:
+                    yield BatchOutcome(job, error=e, spans=tracer.spans)
+                else:
+                    yield BatchOutcome(job, result=result, spans=result.spans)
+        finally:
+            for queued_job, _, future in pending:
+                if future is not None:
+                    _discard_prefetched(future, queued_job, delete_temp)
+            pending.clear()
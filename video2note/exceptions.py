@@ -16,6 +16,20 @@ class FfmpegError(TranscriptionError):
     pass
 
 
+class NoAudioStreamError(TranscriptionError):
+    """Exception raised for media files that contain no audio stream."""
+    pass
+
+
+class TranscriptionCancelled(TranscriptionError):
+    """Exception raised in a job whose processes were killed because it was cancelled."""
+    pass
+
+
 class WhisperCppError(TranscriptionError):
     """Exception raised for errors related to whisper.cpp."""
-    pass 
\ No newline at end of file
+    pass 
+
+class WhisperServerError(WhisperCppError):
+    """Exception raised when the whisper.cpp server cannot be used."""
+    pass
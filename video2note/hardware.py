@@ -0,0 +1,110 @@
+"""
+CPU resources available to Video2Note.
+
+os.cpu_count() counts SMT siblings and every CPU of the host, while
+whisper.cpp scales with physical cores and a container may only be allowed
+a fraction of the host through its CPU affinity or cgroup quota. These
+helpers work out what the process can really use.
+"""
+import logging
+import math
+import os
+import platform
+import subprocess
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Set
+
+logger = logging.getLogger(__name__)
+
+_CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+def _allowed_cpus() -> Optional[Set[int]]:
+    """CPUs this process may run on, where the OS tells (Linux)."""
+    try:
+        return set(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return None
+
+
+def _cgroup_v2_limit() -> Optional[float]:
+    try:
+        groups = Path("/proc/self/cgroup").read_text().splitlines()
+    except OSError:
+        groups = []
+    # The process's own cgroup first, then the root one a container usually sees
+    paths = [_CGROUP_ROOT / line.split("::", 1)[1].lstrip("/") for line in groups if line.startswith("0::")]
+    for path in paths + [_CGROUP_ROOT]:
+        try:
+            quota, period = (path / "cpu.max").read_text().split()[:2]
+        except (OSError, ValueError):
+            continue
+        return None if quota == "max" else int(quota) / int(period)
+    return None
+
+
+def _cgroup_v1_limit() -> Optional[float]:
+    cpu_dir = _CGROUP_ROOT / "cpu"
+    try:
+        quota = int((cpu_dir / "cpu.cfs_quota_us").read_text())
+        period = int((cpu_dir / "cpu.cfs_period_us").read_text())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+@lru_cache(maxsize=None)
+def cpu_quota() -> Optional[float]:
+    """The cgroup CPU quota in CPUs (e.g. 2.5), or None without a limit."""
+    if platform.system() != "Linux":
+        return None
+    return _cgroup_v2_limit() or _cgroup_v1_limit()
+
+
+@lru_cache(maxsize=None)
+def available_cpus() -> int:
+    """Logical CPUs the process can keep busy: its affinity, capped by the cgroup quota."""
+    allowed = _allowed_cpus()
+    count = len(allowed) if allowed else os.cpu_count() or 1
+    quota = cpu_quota()
+    if quota is not None:
+        count = min(count, max(1, math.ceil(quota)))
+    return count
+
+
+@lru_cache(maxsize=None)
+def physical_cores() -> int:
+    """Physical cores the process may run on, with SMT siblings counted once."""
+    system = platform.system()
+    if system == "Linux":
+        allowed = _allowed_cpus()
+        cores = set()
+        for cpu_dir in Path("/sys/devices/system/cpu").glob("cpu[0-9]*"):
+            cpu = int(cpu_dir.name[3:])
+            if allowed is not None and cpu not in allowed:
+                continue
+            topology = cpu_dir / "topology"
+            try:
+                siblings = (topology / "core_cpus_list").read_text().strip()
+            except OSError:
+                try:
+                    siblings = (topology / "thread_siblings_list").read_text().strip()
+                except OSError:
+                    continue
+            cores.add(siblings)
+        if cores:
+            return len(cores)
+    elif system == "Darwin":
+        try:
+            output = subprocess.run(["sysctl", "-n", "hw.physicalcpu"], capture_output=True, text=True,
+                                    check=True, timeout=5).stdout
+            return max(1, int(output.strip()))
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            logger.debug(f"Не удалось узнать число физических ядер: {e}")
+    return os.cpu_count() or 1
+
+
+def default_threads() -> int:
+    """whisper.cpp threads to use without a tuned profile: physical cores, within the quota."""
+    return max(1, min(physical_cores(), available_cpus()))
@@ -0,0 +1,104 @@
+"""
+Per-file language manifest for Video2Note.
+
+A mixed-language batch can name the language of each file in a CSV file
+(``file,language`` rows, an optional header, ``,``/``;``/tab separated) or
+a JSON file (an object mapping files to languages, or a list of objects
+with ``file`` and ``language``). Relative paths are resolved against the
+manifest's directory; an entry that is just a file name matches that name
+in any folder. ``auto`` asks for the language to be detected.
+"""
+import csv
+import json
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from .transcriber import AUTO_LANGUAGE
+
+_LANGUAGE_RE = re.compile(r"^[a-z]{2,3}$")
+_HEADER_NAMES = {"file", "path", "файл"}
+
+
+def normalize_language(value: str) -> str:
+    """Lower-cases a whisper.cpp language code or ``auto``; raises ValueError on anything else."""
+    language = value.strip().lower()
+    if language != AUTO_LANGUAGE and not _LANGUAGE_RE.match(language):
+        raise ValueError(f"Некорректный код языка: {value!r} (ожидается, например, ru, en или auto)")
+    return language
+
+
+def _csv_rows(text: str) -> Iterable[Tuple[str, str]]:
+    # Comment and blank lines have no separators and throw the sniffer off
+    sample = "\n".join(line for line in text.splitlines() if line.strip() and not line.lstrip().startswith('#'))
+    try:
+        dialect = csv.Sniffer().sniff(sample[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    first = True
+    for i, row in enumerate(csv.reader(text.splitlines(), dialect)):
+        cells = [cell.strip() for cell in row]
+        if not any(cells) or cells[0].startswith('#'):
+            continue
+        # The header, if any, is the first row after leading comments
+        header, first = first and cells[0].lower() in _HEADER_NAMES, False
+        if header:
+            continue
+        if len(cells) < 2:
+            raise ValueError(f"Строка {i + 1}: ожидается «файл,язык», получено {row!r}")
+        yield cells[0], cells[1]
+
+
+def _json_rows(text: str) -> Iterable[Tuple[str, str]]:
+    data = json.loads(text)
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        try:
+            items = [(entry["file"], entry["language"]) for entry in data]
+        except (KeyError, TypeError) as e:
+            raise ValueError("Элементы списка должны быть объектами с полями file и language.") from e
+    else:
+        raise ValueError("Ожидается объект {файл: язык} или список объектов.")
+    for file, language in items:
+        if not isinstance(file, str) or not isinstance(language, str):
+            raise ValueError(f"Некорректная запись: {file!r}: {language!r}")
+        yield file, language
+
+
+class LanguageManifest:
+    """Languages of individual files, read from a CSV or JSON manifest."""
+
+    def __init__(self, by_path: Dict[Path, str], by_name: Dict[str, str]):
+        self._by_path = by_path
+        self._by_name = by_name
+
+    @classmethod
+    def load(cls, path: Path) -> "LanguageManifest":
+        """Reads a manifest; raises ValueError if it cannot be parsed."""
+        try:
+            text = path.read_text(encoding='utf-8-sig')
+        except OSError as e:
+            raise ValueError(f"Не удалось прочитать {path}: {e}") from e
+        try:
+            rows = list(_json_rows(text) if path.suffix.lower() == '.json' else _csv_rows(text))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Некорректный JSON в {path.name}: {e}") from e
+
+        by_path: Dict[Path, str] = {}
+        by_name: Dict[str, str] = {}
+        for file, language in rows:
+            language = normalize_language(language)
+            entry = Path(file).expanduser()
+            if entry.parent == Path('.'):
+                by_name[entry.name] = language
+            else:
+                by_path[(path.parent / entry).resolve()] = language
+        return cls(by_path, by_name)
+
+    def __len__(self) -> int:
+        return len(self._by_path) + len(self._by_name)
+
+    def lookup(self, input_file: Path) -> Optional[str]:
+        """The language listed for a file, by full path first and then by file name."""
+        return self._by_path.get(input_file.resolve()) or self._by_name.get(input_file.name)
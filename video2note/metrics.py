@@ -0,0 +1,275 @@
+"""
+Run-metrics store for Video2Note.
+
+Every processed file appends one row to a SQLite database in WAL mode, so
+concurrent invocations never lose each other's samples and lookups by model
+stay cheap as the history grows. The legacy JSON history file is
+imported once on first use.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+
+from .config import DEFAULT_BEAM_SIZE, HISTORY_FILE, METRICS_DB
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    signature TEXT NOT NULL,
+    model TEXT,
+    threads INTEGER,
+    vad INTEGER,
+    chunks INTEGER NOT NULL DEFAULT 1,
+    duration REAL NOT NULL,
+    elapsed REAL NOT NULL,
+    ffmpeg_time REAL,
+    whisper_time REAL NOT NULL,
+    language TEXT,
+    beam_size INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_by_signature ON runs (signature, id);
+CREATE INDEX IF NOT EXISTS runs_by_model ON runs (model, chunks, id);
+CREATE TABLE IF NOT EXISTS startup (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    command TEXT,
+    import_time REAL NOT NULL,
+    discovery_time REAL
+);
+CREATE TABLE IF NOT EXISTS profiles (
+    model TEXT NOT NULL,
+    preset TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    threads INTEGER NOT NULL,
+    beam_size INTEGER NOT NULL,
+    best_of INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    agreement REAL NOT NULL,
+    cpus INTEGER NOT NULL,
+    PRIMARY KEY (model, preset)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns added to existing databases that were created without them
+_ADDED_COLUMNS = {"runs": {"language": "TEXT", "beam_size": "INTEGER"}}
+
+_initialized: Set[Path] = set()
+_init_lock = threading.Lock()
+
+
+@dataclass
+class RunMetrics:
+    """Measurements of one transcribed file."""
+    signature: str
+    model: str
+    threads: int
+    vad: bool
+    duration: float
+    elapsed: float
+    whisper_time: float
+    ffmpeg_time: Optional[float] = None
+    chunks: int = 1
+    # The language transcribed in (detected for ``auto``); None if unknown
+    language: Optional[str] = None
+    beam_size: Optional[int] = None
+
+
+@dataclass
+class TuningProfile:
+    """
+    The decoding settings `video2note tune` picked for a model and preset,
+    with the calibration time, the word agreement with the most accurate
+    setting and the CPUs available when it was measured.
+    """
+    model: str
+    preset: str
+    threads: int
+    beam_size: int
+    best_of: int
+    seconds: float
+    agreement: float
+    cpus: int
+
+
+class MetricsStore:
+    """Append-only SQLite store of per-run metrics, indexed by run signature."""
+
+    def __init__(self, path: Path = METRICS_DB):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with _init_lock:
+                if self.path not in _initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    self._add_columns(conn)
+                    self._migrate_json(conn)
+                    _initialized.add(self.path)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        return conn
+
+    @staticmethod
+    def _add_columns(conn: sqlite3.Connection) -> None:
+        """Brings tables created by older versions up to the current schema."""
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns.items():
+                if name not in existing:
+                    try:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                    except sqlite3.OperationalError:
+                        # Added by a concurrent invocation in the meantime
+                        pass
+
+    def _migrate_json(self, conn: sqlite3.Connection, history_file: Path = HISTORY_FILE) -> None:
+        """
+        Imports the legacy `.video2note_hist.json` samples once.
+
+        Malformed samples are skipped one by one. A file from which nothing
+        could be read is not marked as migrated, so it is retried (e.g.
+        after being fixed by hand) instead of its history being dropped.
+        """
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        rows = []
+        if history_file.exists():
+            try:
+                hist_data = json.loads(history_file.read_text())
+                entries = hist_data.items()
+            except (OSError, json.JSONDecodeError, AttributeError) as e:
+                logger.warning(f"Не удалось перенести историю из {history_file.name}: {e}")
+                return
+            skipped = 0
+            for sig, samples in entries:
+                model, _, rest = str(sig).partition("|cpu|")
+                threads, _, chunks = rest.partition("|x")
+                try:
+                    thread_count, chunk_count = int(threads or 0), int(chunks or 1)
+                    samples = list(samples)
+                except (TypeError, ValueError):
+                    skipped += 1
+                    continue
+                for sample in samples:
+                    try:
+                        dur, elapsed = sample
+                        rows.append((0.0, sig, model, thread_count, None, chunk_count,
+                                     float(dur), float(elapsed), None, float(elapsed)))
+                    except (TypeError, ValueError):
+                        skipped += 1
+            if skipped:
+                logger.warning(f"Пропущено повреждённых записей истории в {history_file.name}: {skipped}.")
+                if not rows:
+                    return
+
+        # Another invocation may be migrating right now: re-check under the write lock
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+                conn.rollback()
+                return
+            conn.executemany(
+                "INSERT INTO runs (created_at, signature, model, threads, vad, chunks, duration, elapsed, ffmpeg_time, whisper_time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(len(rows)),))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        if rows:
+            logger.info(f"История ({len(rows)} записей) перенесена из {history_file.name} в {self.path.name}.")
+
+    def record(self, run: RunMetrics) -> None:
+        """Appends one run; failures are logged, never raised."""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT INTO runs (created_at, signature, model, threads, vad, chunks, duration, elapsed, ffmpeg_time, whisper_time, language, beam_size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (time.time(), run.signature, run.model, run.threads, int(run.vad), run.chunks,
+                     run.duration, run.elapsed, run.ffmpeg_time, run.whisper_time, run.language, run.beam_size))
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить метрики запуска: {e}")
+
+    def record_startup(self, command: Optional[str], import_time: float,
+                       discovery_time: Optional[float] = None) -> None:
+        """Appends the startup cost of one invocation (see --profile-startup); failures are logged."""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("INSERT INTO startup (created_at, command, import_time, discovery_time) VALUES (?, ?, ?, ?)",
+                             (time.time(), command, import_time, discovery_time))
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить метрики запуска: {e}")
+
+    def save_profile(self, profile: TuningProfile) -> None:
+        """Stores a tuned profile, replacing the previous one for its model and preset."""
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO profiles (model, preset, created_at, threads, beam_size, best_of, seconds, agreement, cpus) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (profile.model, profile.preset, time.time(), profile.threads, profile.beam_size,
+                     profile.best_of, profile.seconds, profile.agreement, profile.cpus))
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось сохранить профиль настройки: {e}")
+
+    def profile(self, model: str, preset: str) -> Optional[TuningProfile]:
+        """The tuned profile of a model and preset, if `video2note tune` has stored one."""
+        try:
+            with closing(self._connect()) as conn:
+                row = conn.execute(
+                    "SELECT threads, beam_size, best_of, seconds, agreement, cpus FROM profiles WHERE model = ? AND preset = ?",
+                    (model, preset)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось прочитать профиль настройки: {e}")
+            return None
+        if row is None:
+            return None
+        threads, beam_size, best_of, seconds, agreement, cpus = row
+        return TuningProfile(model, preset, int(threads), int(beam_size), int(best_of),
+                             float(seconds), float(agreement), int(cpus))
+
+    def history(self, model: str, chunks: int = 1, vad: Optional[bool] = None,
+                limit: int = 60, beam_size: Optional[int] = None) -> List[Tuple[float, int, float]]:
+        """
+        Returns the latest (duration, threads, whisper_time) samples of a
+        model and chunk count across all thread counts, oldest first.
+
+        With ``vad`` given, only runs with that VAD setting (or imported
+        runs where it is unknown) are returned; likewise for ``beam_size``,
+        where runs recorded before it was stored used DEFAULT_BEAM_SIZE.
+        """
+        query = ("SELECT duration, threads, whisper_time FROM runs "
+                 "WHERE model = ? AND chunks = ? AND duration > 0 AND threads > 0")
+        params: list = [model, chunks]
+        if vad is not None:
+            query += " AND (vad = ? OR vad IS NULL)"
+            params.append(int(vad))
+        if beam_size is not None:
+            query += " AND COALESCE(beam_size, ?) = ?"
+            params += [DEFAULT_BEAM_SIZE, beam_size]
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        try:
+            with closing(self._connect()) as conn:
+                rows = conn.execute(query, params).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось прочитать метрики запусков: {e}")
+            return []
+        return [(float(d), int(t), float(w)) for d, t, w in reversed(rows)]
@@ -0,0 +1,155 @@
+"""
+Transcript output formats for Video2Note.
+
+whisper.cpp is asked for timestamped segments once; every output format is
+rendered from those segments, so writing subtitles next to the plain text
+costs no extra decoding.
+"""
+import json
+import logging
+from pathlib import Path
+from typing import IO, Callable, Dict, List, Optional, Sequence
+
+from .segments import Segment
+from .utils import write_text_atomic
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ('txt', 'srt', 'vtt', 'json')
+DEFAULT_FORMATS = ('txt',)
+
+
+def _timestamp(seconds: float, separator: str) -> str:
+    ms = int(round(max(0.0, seconds) * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}{separator}{ms % 1000:03d}"
+
+
+def render_txt(segments: List[Segment]) -> str:
+    """One line per segment, as whisper.cpp's --output-txt writes it."""
+    return "\n".join(seg.text for seg in segments if seg.text).strip()
+
+
+def render_srt(segments: List[Segment]) -> str:
+    """SubRip subtitles."""
+    blocks = [f"{i}\n{_timestamp(seg.start, ',')} --> {_timestamp(seg.end, ',')}\n{seg.text}"
+              for i, seg in enumerate((s for s in segments if s.text), 1)]
+    return "\n\n".join(blocks) + "\n" if blocks else ""
+
+
+def render_vtt(segments: List[Segment]) -> str:
+    """WebVTT subtitles."""
+    blocks = [f"{_timestamp(seg.start, '.')} --> {_timestamp(seg.end, '.')}\n{seg.text}"
+              for seg in segments if seg.text]
+    return "WEBVTT\n\n" + "\n\n".join(blocks) + ("\n" if blocks else "")
+
+
+def render_json(segments: List[Segment]) -> str:
+    """The segments with start and end in seconds, plus the full text."""
+    data = {
+        "text": render_txt(segments),
+        "segments": [{"start": round(seg.start, 3), "end": round(seg.end, 3), "text": seg.text}
+                     for seg in segments if seg.text],
+    }
+    return json.dumps(data, ensure_ascii=False, indent=2) + "\n"
+
+
+RENDERERS: Dict[str, Callable[[List[Segment]], str]] = {
+    'txt': render_txt,
+    'srt': render_srt,
+    'vtt': render_vtt,
+    'json': render_json,
+}
+
+
+def parse_formats(value: str) -> List[str]:
+    """Parses a comma-separated format list such as ``txt,srt``; raises ValueError on unknown names."""
+    formats = []
+    for name in (part.strip().lower() for part in value.split(',')):
+        if not name:
+            continue
+        if name not in RENDERERS:
+            raise ValueError(f"Неизвестный формат: {name} (доступны: {', '.join(OUTPUT_FORMATS)})")
+        if name not in formats:
+            formats.append(name)
+    if not formats:
+        raise ValueError("Не указан ни один формат.")
+    return formats
+
+
+def output_paths(output_path: Path, formats: Sequence[str]) -> Dict[str, Path]:
+    """
+    Where each format is written: ``txt`` goes to ``output_path`` itself,
+    the others next to it with their own extension.
+    """
+    return {fmt: output_path if fmt == 'txt' else output_path.with_suffix(f".{fmt}") for fmt in formats}
+
+
+def needs_timing(formats: Sequence[str]) -> bool:
+    """True if any of the formats carries segment timestamps."""
+    return any(fmt != 'txt' for fmt in formats)
+
+
+def draft_marker(output_path: Path) -> Path:
+    """Hidden file next to the outputs that marks them as a draft still waiting to be refined."""
+    return output_path.with_name(f".{output_path.name}.draft")
+
+
+def partial_path(output_path: Path) -> Path:
+    """Where the text is appended while whisper.cpp is still decoding (see PartialTranscript)."""
+    return output_path.with_name(f"{output_path.name}.partial")
+
+
+class PartialTranscript:
+    """
+    Appends each segment's text to ``<output>.partial`` as soon as it is
+    decoded, so a long recording can be read while it is transcribed.
+
+    The finished outputs are written by write_outputs(), which then removes
+    the partial file; after a failure it stays to show how far the run got.
+    """
+
+    def __init__(self, output_path: Path):
+        self.path = partial_path(output_path)
+        self._file: Optional[IO[str]] = None
+
+    def add(self, segment: Segment) -> None:
+        """Appends one segment's text."""
+        if not segment.text:
+            return
+        try:
+            if self._file is None:
+                self._file = self.path.open('w', encoding='utf-8')
+            self._file.write(segment.text + "\n")
+            self._file.flush()
+        except OSError as e:
+            logger.warning(f"Не удалось дописать {self.path.name}: {e}")
+
+    def close(self) -> None:
+        """Closes the file; it stays on disk until write_outputs() replaces it."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def write_outputs(output_path: Path, segments: List[Segment], formats: Sequence[str],
+                  draft: bool = False) -> List[Path]:
+    """
+    Renders the segments in every format and writes each file atomically;
+    returns the paths written.
+
+    A draft is marked as such before its files appear, and the final
+    version removes the mark only after all of its files are in place, so
+    an interrupted run never leaves a draft that looks final. The partial
+    text of the run is removed once the outputs are in place.
+    """
+    marker = draft_marker(output_path)
+    if draft:
+        marker.touch()
+    written = []
+    for fmt, path in output_paths(output_path, formats).items():
+        write_text_atomic(path, RENDERERS[fmt](segments))
+        written.append(path)
+    if not draft:
+        marker.unlink(missing_ok=True)
+    partial_path(output_path).unlink(missing_ok=True)
+    return written
@@ -0,0 +1,163 @@
+"""
+Media probing for Video2Note.
+
+Runs ffprobe on a thread pool and remembers the result per file version
+(path, size and mtime), so a batch is probed once up front and the pipeline
+reuses those results instead of probing every file again on the hot path.
+Besides the duration, the audio stream's codec, sample rate and channel
+count are reported, which lets files without audio be rejected before
+conversion.
+"""
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ffprobe is I/O-bound, so probing many files at once pays off even on few cores
+PROBE_WORKERS = 8
+PROBE_CACHE_SIZE = 4096
+
+_Version = Tuple[str, int, int]
+
+
+@dataclass(frozen=True)
+class MediaInfo:
+    """What ffprobe reports about a media file; stream fields describe its first audio stream."""
+    duration: float
+    has_audio: bool
+    container: Optional[str] = None
+    codec: Optional[str] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+    sample_fmt: Optional[str] = None
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_probe(data: dict) -> MediaInfo:
+    """Builds a MediaInfo from ffprobe's JSON output."""
+    fmt = data.get('format', {})
+    audio = next((s for s in data.get('streams', []) if s.get('codec_type') == 'audio'), None)
+    duration = _to_float(fmt.get('duration'))
+    if not duration and audio is not None:
+        duration = _to_float(audio.get('duration'))
+    if audio is None:
+        return MediaInfo(duration=duration, has_audio=False, container=fmt.get('format_name'))
+    return MediaInfo(
+        duration=duration,
+        has_audio=True,
+        container=fmt.get('format_name'),
+        codec=audio.get('codec_name'),
+        sample_rate=_to_int(audio.get('sample_rate')),
+        channels=_to_int(audio.get('channels')),
+        sample_fmt=audio.get('sample_fmt'),
+    )
+
+
+def _run_ffprobe(path: Path) -> Optional[MediaInfo]:
+    # Imported here, so commands that never probe do not pay for it at startup
+    import ffmpeg
+
+    try:
+        return parse_probe(ffmpeg.probe(str(path)))
+    except ffmpeg.Error as e:
+        stderr = e.stderr.decode('utf-8', errors='ignore').strip() if e.stderr else e
+        logger.warning(f"Не удалось прочитать параметры {path.name}: {stderr}")
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать параметры {path.name}: {e}")
+    return None
+
+
+class MediaProber:
+    """
+    Thread-safe ffprobe front end with a bounded in-memory cache.
+
+    Concurrent requests for the same file version share one ffprobe run.
+    A failed probe is cached as None too, until the file changes.
+    """
+
+    def __init__(self, max_workers: int = PROBE_WORKERS, max_entries: int = PROBE_CACHE_SIZE):
+        self.max_workers = max_workers
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[_Version, Optional[MediaInfo]]" = OrderedDict()
+        self._running: Dict[_Version, Future] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _version(path: Path) -> Optional[_Version]:
+        try:
+            st = path.stat()
+        except OSError as e:
+            logger.warning(f"Не удалось прочитать параметры {path.name}: {e}")
+            return None
+        return str(path.resolve()), st.st_size, st.st_mtime_ns
+
+    def probe(self, path: Path) -> Optional[MediaInfo]:
+        """Returns the media info of a file, or None if it cannot be probed."""
+        version = self._version(path)
+        if version is None:
+            return None
+        with self._lock:
+            if version in self._cache:
+                self._cache.move_to_end(version)
+                return self._cache[version]
+            future = self._running.get(version)
+            owner = future is None
+            if owner:
+                future = self._running[version] = Future()
+        if not owner:
+            return future.result()
+
+        info = None
+        try:
+            info = _run_ffprobe(path)
+        finally:
+            with self._lock:
+                self._cache[version] = info
+                if len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                del self._running[version]
+            future.set_result(info)
+        return info
+
+    def probe_many(self, paths: Sequence[Path]) -> List[Optional[MediaInfo]]:
+        """Probes several files in parallel; results are in the order of ``paths``."""
+        if len(paths) <= 1:
+            return [self.probe(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(paths)), thread_name_prefix="probe") as pool:
+            return list(pool.map(self.probe, paths))
+
+    def clear(self) -> None:
+        """Forgets all cached results."""
+        with self._lock:
+            self._cache.clear()
+
+
+_prober = MediaProber()
+
+
+def probe_media(path: Path) -> Optional[MediaInfo]:
+    """Probes a file with the shared MediaProber."""
+    return _prober.probe(path)
+
+
+def probe_many(paths: Sequence[Path]) -> List[Optional[MediaInfo]]:
+    """Probes several files in parallel with the shared MediaProber."""
+    return _prober.probe_many(paths)
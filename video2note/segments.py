@@ -0,0 +1,47 @@
+"""
+Timestamped transcript segments and parsers for whisper.cpp output.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+_SRT_TIME_RE = re.compile(r"(\d+):(\d+):(\d+)[,.](\d+)\s*-->\s*(\d+):(\d+):(\d+)[,.](\d+)")
+# Segment lines whisper-cli prints to stdout while decoding: "[00:00:01.000 --> 00:00:04.500]  text"
+_SEGMENT_LINE_RE = re.compile(r"^\[(\d+):(\d+):(\d+)\.(\d+)\s*-->\s*(\d+):(\d+):(\d+)\.(\d+)\]\s?(.*)$")
+
+
+@dataclass
+class Segment:
+    """A transcribed segment with its position on the source timeline, in seconds."""
+    start: float
+    end: float
+    text: str
+
+
+def _seconds(h: str, m: str, s: str, ms: str) -> float:
+    return int(h) * 3600 + int(m) * 60 + int(s) + int(ms) / 10 ** len(ms)
+
+
+def parse_segment_line(line: str) -> Optional[Segment]:
+    """Parses one segment line of whisper-cli's stdout, or returns None."""
+    match = _SEGMENT_LINE_RE.match(line.strip())
+    if not match:
+        return None
+    g = match.groups()
+    return Segment(_seconds(*g[:4]), _seconds(*g[4:8]), g[8].strip())
+
+
+def parse_srt(text: str) -> List[Segment]:
+    """Parses whisper.cpp SRT output into segments."""
+    segments: List[Segment] = []
+    for block in re.split(r"\r?\n\s*\r?\n", text.strip()):
+        lines = block.strip().splitlines()
+        for i, line in enumerate(lines):
+            match = _SRT_TIME_RE.search(line)
+            if match:
+                g = match.groups()
+                body = " ".join(l.strip() for l in lines[i + 1:]).strip()
+                if body:
+                    segments.append(Segment(_seconds(*g[:4]), _seconds(*g[4:]), body))
+                break
+    return segments
@@ -0,0 +1,361 @@
+"""
+Persistent whisper.cpp server backend for Video2Note.
+
+Starts `whisper-server` once per batch so the model stays loaded, and sends
+each audio file to it over localhost HTTP. Falls back to spawning
+`whisper-cli` per file whenever the server is unavailable.
+"""
+import http.client
+import json
+import logging
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .checkpoint import SegmentCheckpoint
+from .config import TranscriptionConfig, find_whisper_server
+from .exceptions import (FfmpegError, TranscriptionCancelled,
+                         WhisperServerError)
+from .segments import Segment
+from .supervisor import ProcessSupervisor, current_cancellation
+from .transcriber import (SegmentCallback, build_decoding_args,
+                          open_pcm_stream, run_whisper_stream,
+                          run_whisper_transcription)
+from .ui import console, progress_task
+from .utils import EtaEstimate
+
+logger = logging.getLogger(__name__)
+
+SERVER_HOST = "127.0.0.1"
+STARTUP_TIMEOUT = 300
+# How often a running request checks that the server is alive and the job not cancelled
+LIVENESS_INTERVAL = 1.0
+_UPLOAD_CHUNK = 1024 * 1024
+
+
+def _free_port() -> int:
+    """Asks the OS for a free localhost TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((SERVER_HOST, 0))
+        return sock.getsockname()[1]
+
+
+class WhisperServer:
+    """A whisper-server process with the model loaded, reachable over localhost HTTP."""
+
+    def __init__(self, server_bin: Path, config: TranscriptionConfig, port: Optional[int] = None):
+        self.server_bin = server_bin
+        self.config = config
+        self.port = port or _free_port()
+        self._proc: Optional[subprocess.Popen] = None
+        self._log = None
+
+    @property
+    def alive(self) -> bool:
+        """True while the server process is running."""
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self, timeout: float = STARTUP_TIMEOUT) -> None:
+        """Launches the server and waits until the model is loaded."""
+        cmd = [str(self.server_bin), "--host", SERVER_HOST, "--port", str(self.port)]
+        cmd += build_decoding_args(self.config)
+        logger.info(f"Запуск whisper-server на порту {self.port} с моделью {self.config.model_path.name}...")
+        # Keep server logs in a file: a PIPE that nobody reads would eventually block it
+        self._log = tempfile.TemporaryFile()
+        try:
+            self._proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=self._log, stderr=subprocess.STDOUT)
+        except OSError as e:
+            raise WhisperServerError(f"Не удалось запустить whisper-server: {e}") from e
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.alive:
+                raise WhisperServerError(f"whisper-server завершился при запуске:\n{self._read_log()}")
+            if self._is_ready():
+                logger.info("whisper-server готов к работе.")
+                return
+            time.sleep(0.25)
+        self.stop()
+        raise WhisperServerError("whisper-server не успел загрузить модель.")
+
+    def stop(self) -> None:
+        """Terminates the server process."""
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.terminate()
+                try:
+                    self._proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self._proc.kill()
+                    self._proc.wait()
+            logger.debug(self._read_log())
+            self._proc = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+    def _read_log(self) -> str:
+        """Returns what the server has written to its log so far."""
+        if self._log is None:
+            return ""
+        try:
+            self._log.seek(0)
+            return self._log.read().decode('utf-8', errors='ignore')
+        except (OSError, ValueError):
+            return ""
+
+    def _is_ready(self) -> bool:
+        """Polls /health; builds without that endpoint are ready once they accept connections."""
+        conn = http.client.HTTPConnection(SERVER_HOST, self.port, timeout=2)
+        try:
+            conn.request("GET", "/health")
+            status = conn.getresponse().status
+            return status == 200 or status == 404
+        except OSError:
+            return False
+        finally:
+            conn.close()
+
+    def transcribe(self, audio_path: Path, language: Optional[str] = None) -> List[Segment]:
+        """
+        Sends one audio file to /inference and returns the transcribed
+        segments; ``language`` overrides the one the server was started with.
+        """
+        def read_file() -> Iterator[bytes]:
+            with audio_path.open('rb') as f:
+                while chunk := f.read(_UPLOAD_CHUNK):
+                    yield chunk
+
+        return self._post_inference(audio_path.name, read_file(), audio_path.stat().st_size, language)
+
+    def transcribe_stream(self, input_file: Path, language: Optional[str] = None) -> List[Segment]:
+        """Uploads ffmpeg's PCM output with chunked transfer encoding as it is decoded."""
+        with ProcessSupervisor(self.config.stall_timeout) as supervisor:
+            ffmpeg = open_pcm_stream(input_file)
+            supervisor.watch(ffmpeg, "ffmpeg", FfmpegError, stdout=False)
+
+            def read_pipe() -> Iterator[bytes]:
+                while chunk := ffmpeg.stdout.read(_UPLOAD_CHUNK):
+                    yield chunk
+
+            try:
+                segments = self._post_inference(f"{input_file.stem}.wav", read_pipe(), None, language)
+            finally:
+                ffmpeg.stdout.close()
+            supervisor.wait()
+
+        logger.debug(supervisor.output(ffmpeg))
+        if ffmpeg.returncode != 0:
+            raise FfmpegError(f"Ошибка декодирования аудио (ffmpeg):\n{supervisor.output(ffmpeg)}")
+        return segments
+
+    def _post_inference(self, filename: str, content: Iterator[bytes], size: Optional[int],
+                        language: Optional[str] = None) -> List[Segment]:
+        """
+        POSTs audio as multipart form data to /inference and returns the
+        segments of its verbose_json response.
+
+        The body is sent with Content-Length when the size is known and
+        with chunked transfer encoding otherwise.
+        """
+        boundary = uuid.uuid4().hex
+        fields = {"response_format": "verbose_json"}
+        if language:
+            fields["language"] = language
+        form = "".join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        ) + (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n"
+        )
+        head = form.encode('utf-8')
+        tail = f"\r\n--{boundary}--\r\n".encode('utf-8')
+
+        def body() -> Iterator[bytes]:
+            yield head
+            yield from content
+            yield tail
+
+        headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+        if size is not None:
+            headers["Content-Length"] = str(len(head) + size + len(tail))
+
+        # No socket timeout: decoding a long file takes as long as it takes, while the
+        # watchdog ends the request as soon as the server process dies or the job is cancelled
+        conn = http.client.HTTPConnection(SERVER_HOST, self.port)
+        cancel = current_cancellation()
+        done = threading.Event()
+        aborted: List[str] = []
+
+        def watchdog() -> None:
+            while not done.wait(LIVENESS_INTERVAL):
+                if cancel is not None and cancel.is_set():
+                    reason = "cancelled"
+                elif not self.alive:
+                    reason = "died"
+                else:
+                    continue
+                if not aborted:
+                    aborted.append(reason)
+                if conn.sock is not None:
+                    try:
+                        conn.sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+        watcher = threading.Thread(target=watchdog, name="video2note-server-watchdog", daemon=True)
+        watcher.start()
+        try:
+            conn.request("POST", "/inference", body=body(), headers=headers, encode_chunked=size is None)
+            response = conn.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException) as e:
+            if aborted and aborted[0] == "cancelled":
+                raise TranscriptionCancelled("Обработка отменена.") from e
+            if not self.alive:
+                raise WhisperServerError(f"whisper-server завершился во время обработки:\n{self._read_log()}") from e
+            raise WhisperServerError(f"Ошибка запроса к whisper-server: {e}") from e
+        finally:
+            done.set()
+            watcher.join()
+            conn.close()
+
+        try:
+            data = json.loads(payload.decode('utf-8', errors='ignore'))
+        except json.JSONDecodeError as e:
+            raise WhisperServerError(f"Некорректный ответ whisper-server (HTTP {response.status}).") from e
+        if response.status != 200 or "error" in data:
+            raise WhisperServerError(f"whisper-server вернул ошибку (HTTP {response.status}): {data.get('error', data)}")
+        try:
+            segments = [Segment(float(seg.get("start", 0.0)), float(seg.get("end", 0.0)), str(seg.get("text", "")).strip())
+                        for seg in data.get("segments") or []]
+            segments = [seg for seg in segments if seg.text]
+            if not segments and str(data.get("text", "")).strip():
+                # Builds that ignore verbose_json only return the text
+                segments = [Segment(0.0, float(data.get("duration") or 0.0), str(data["text"]).strip())]
+        except (AttributeError, TypeError, ValueError) as e:
+            raise WhisperServerError(f"Некорректные сегменты в ответе whisper-server: {e}") from e
+        return segments
+
+
+class ServerBackend:
+    """
+    Transcription backend that keeps one whisper-server alive for a whole batch.
+
+    Use as a context manager around the batch. Any file the server cannot
+    handle is transcribed with whisper-cli instead, and a server that has
+    failed is not used again.
+    """
+
+    def __init__(self, config: TranscriptionConfig, server_bin: Optional[Path] = None):
+        self.config = config
+        self.server_bin = server_bin or find_whisper_server()
+        self._server: Optional[WhisperServer] = None
+
+    def __enter__(self) -> "ServerBackend":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Starts the server, or falls back to whisper-cli if that is not possible."""
+        if self.server_bin is None:
+            logger.warning("whisper-server не найден — использую whisper-cli для каждого файла.")
+            return
+        server = WhisperServer(self.server_bin, self.config)
+        try:
+            with console.status("⏳ Загружаю модель в whisper-server..."):
+                server.start()
+        except WhisperServerError as e:
+            logger.warning(f"{e}\nИспользую whisper-cli для каждого файла.")
+            server.stop()
+            return
+        self._server = server
+
+    def stop(self) -> None:
+        """Stops the server if it is running."""
+        if self._server is not None:
+            self._server.stop()
+            self._server = None
+
+    def transcribe(self, audio_path: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                   checkpoint: Optional[SegmentCheckpoint] = None,
+                   on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
+        """Same contract as run_whisper_transcription(), served by the warm model."""
+        reason = self._fallback_reason(config, checkpoint)
+        if reason:
+            logger.warning(f"{audio_path.name}: {reason} — использую whisper-cli.")
+            return run_whisper_transcription(audio_path, config, eta, checkpoint, on_segment)
+        logger.info(f"Отправляю {audio_path.name} в whisper-server...")
+        try:
+            return self._timed(eta, lambda: self._server.transcribe(audio_path, config.language), on_segment)
+        except WhisperServerError as e:
+            logger.warning(f"{e}\nПереключаюсь на whisper-cli.")
+            self.stop()
+            return run_whisper_transcription(audio_path, config, eta, checkpoint, on_segment)
+
+    def transcribe_stream(self, input_file: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                          checkpoint: Optional[SegmentCheckpoint] = None,
+                          on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
+        """Same contract as run_whisper_stream(), served by the warm model."""
+        reason = self._fallback_reason(config, checkpoint)
+        if reason:
+            logger.warning(f"{input_file.name}: {reason} — использую whisper-cli.")
+            return run_whisper_stream(input_file, config, eta, checkpoint, on_segment)
+        logger.info(f"Передаю {input_file.name} в whisper-server потоком PCM...")
+        try:
+            return self._timed(eta, lambda: self._server.transcribe_stream(input_file, config.language), on_segment)
+        except WhisperServerError as e:
+            logger.warning(f"{e}\nПереключаюсь на whisper-cli.")
+            self.stop()
+            return run_whisper_stream(input_file, config, eta, checkpoint, on_segment)
+
+    def warm(self, config: TranscriptionConfig) -> bool:
+        """
+        The server only serves the configuration its model was loaded with,
+        except for the language, which is sent with every request.
+        """
+        if self._server is None or not self._server.alive:
+            return False
+        return config is self.config or replace(config, language=self.config.language) == self.config
+
+    def _fallback_reason(self, config: TranscriptionConfig, checkpoint: Optional[SegmentCheckpoint]) -> Optional[str]:
+        """Why a file goes to whisper-cli instead of the server, or None if the server takes it."""
+        if self._server is None or not self._server.alive:
+            return "whisper-server не запущен"
+        if not self.warm(config):
+            return "модель whisper-server загружена с другими параметрами"
+        # The server cannot continue after the saved segments of an interrupted whisper-cli run
+        if checkpoint is not None and checkpoint.load():
+            return "продолжаю прерванную транскрипцию с контрольной точки"
+        return None
+
+    @staticmethod
+    def _timed(eta: Optional[EtaEstimate], request: Callable[[], List[Segment]],
+               on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
+        """
+        Runs a server request under the usual progress spinner. The server
+        answers with the whole transcript, so ``on_segment`` gets it at the end.
+        """
+        # The server reports no progress over HTTP, so the bar only pulses
+        with progress_task("🗣️  Транскрибирую (whisper-server)...", eta):
+            start_time = time.perf_counter()
+            segments = request()
+            elapsed = time.perf_counter() - start_time
+
+        if not segments:
+            logger.warning("Получена пустая транскрипция. Проверьте исходный файл.")
+        if on_segment:
+            for segment in segments:
+                on_segment(segment)
+        return segments, elapsed
@@ -0,0 +1,305 @@
+"""
+Progress-aware supervision of ffmpeg and whisper.cpp subprocesses.
+
+Instead of a fixed wall-clock timeout, a supervised process may run as long
+as it needs while it keeps producing output; it is killed only after a
+configurable window without any sign of life. Progress reported by the
+processes is parsed and forwarded as a completed fraction.
+
+Supervised processes are started in a process group of their own (see
+start_process()), so killing one also ends anything it spawned.
+"""
+import logging
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import (IO, Callable, Deque, Dict, Iterator, List, Optional,
+                    Sequence, Type)
+
+from .exceptions import TranscriptionCancelled, TranscriptionError
+
+logger = logging.getLogger(__name__)
+
+TAIL_LINES = 100
+
+_TIMESTAMP = r"(\d+):(\d+):(\d+(?:\.\d+)?)"
+_FFMPEG_DURATION_RE = re.compile(r"Duration:\s*" + _TIMESTAMP)
+_FFMPEG_OUT_TIME_RE = re.compile(r"out_time_(?:us|ms)=(\d+)")
+_WHISPER_PERCENT_RE = re.compile(r"progress\s*=\s*(\d+)%")
+_WHISPER_TOTAL_RE = re.compile(r"\(\d+ samples, (\d+(?:\.\d+)?) sec\)")
+_WHISPER_SEGMENT_RE = re.compile(r"\[" + _TIMESTAMP + r"\s*-->\s*" + _TIMESTAMP + r"\]")
+
+# Cancellation event of the job running on this thread (see cancellation())
+_local = threading.local()
+# Supervisors whose processes may still be running, for kill_all_processes()
+_active: "weakref.WeakSet[ProcessSupervisor]" = weakref.WeakSet()
+
+
+def _seconds(h: str, m: str, s: str) -> float:
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+class FfmpegProgressParser:
+    """Turns `ffmpeg -progress pipe:2` output into a completed fraction."""
+
+    def __init__(self, duration: Optional[float] = None):
+        self.duration = duration
+
+    def __call__(self, line: str) -> Optional[float]:
+        if self.duration is None:
+            match = _FFMPEG_DURATION_RE.search(line)
+            if match:
+                self.duration = _seconds(*match.groups()) or None
+            return None
+        if line.strip() == "progress=end":
+            return 1.0
+        match = _FFMPEG_OUT_TIME_RE.search(line)
+        if match:
+            return int(match.group(1)) / 1_000_000 / self.duration
+        return None
+
+
+class WhisperProgressParser:
+    """
+    Turns whisper-cli output into a completed fraction.
+
+    Uses the `--print-progress` percentages and, for finer steps, the end
+    timestamp of each printed segment relative to the audio being decoded
+    (``start``/``length`` describe an --offset-t/--duration window).
+    """
+
+    def __init__(self, start: float = 0.0, length: Optional[float] = None):
+        self.start = start
+        self.length = length
+
+    def __call__(self, line: str) -> Optional[float]:
+        match = _WHISPER_PERCENT_RE.search(line)
+        if match:
+            return int(match.group(1)) / 100
+        if self.length is None:
+            match = _WHISPER_TOTAL_RE.search(line)
+            if match:
+                self.length = float(match.group(1)) - self.start or None
+            return None
+        match = _WHISPER_SEGMENT_RE.search(line)
+        if match:
+            return (_seconds(*match.groups()[3:]) - self.start) / self.length
+        return None
+
+
+def start_process(cmd: Sequence[str], **kwargs) -> subprocess.Popen:
+    """
+    subprocess.Popen() in a new process group (a new session on POSIX), so
+    that ProcessSupervisor.kill_all() reaches the process's own children too.
+    """
+    if os.name == "nt":
+        kwargs["creationflags"] = kwargs.get("creationflags", 0) | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    return subprocess.Popen(cmd, **kwargs)
+
+
+def kill_process(proc: subprocess.Popen) -> None:
+    """Kills a process and, if it leads a process group (see start_process()), the rest of the group."""
+    if os.name != "nt":
+        try:
+            if os.getpgid(proc.pid) == proc.pid:
+                os.killpg(proc.pid, signal.SIGKILL)
+                return
+        except OSError:
+            # Already gone, or not ours to signal: fall back to the process itself
+            pass
+    proc.kill()
+
+
+def kill_all_processes() -> None:
+    """Kills the processes of every live supervisor, in any thread."""
+    for supervisor in list(_active):
+        supervisor.kill_all()
+
+
+def kill_on_interrupt() -> None:
+    """
+    Makes Ctrl+C kill all supervised processes before KeyboardInterrupt is
+    raised. They run in process groups of their own, which the terminal's
+    SIGINT does not reach. Must be called from the main thread.
+    """
+    def handler(signum, frame):
+        kill_all_processes()
+        signal.default_int_handler(signum, frame)
+
+    signal.signal(signal.SIGINT, handler)
+
+
+def current_cancellation() -> Optional[threading.Event]:
+    """The cancellation event of the job running on this thread, if any (see cancellation())."""
+    return getattr(_local, "cancel", None)
+
+
+@contextmanager
+def cancellation(event: threading.Event) -> Iterator[None]:
+    """
+    Makes the supervisors created by the current thread kill their processes
+    and raise TranscriptionCancelled once ``event`` is set from elsewhere.
+    Nested uses restore the outer event on exit.
+    """
+    previous = current_cancellation()
+    _local.cancel = event
+    try:
+        yield
+    finally:
+        _local.cancel = previous
+
+
+@dataclass
+class _Watched:
+    proc: subprocess.Popen
+    name: str
+    error: Type[TranscriptionError]
+    parser: Optional[Callable[[str], Optional[float]]]
+    weight: float
+    on_line: Optional[Callable[[str], None]]
+    on_exit: Optional[Callable[[int], None]] = None
+    exited: bool = False
+    fraction: float = 0.0
+    tail: Deque[str] = field(default_factory=lambda: deque(maxlen=TAIL_LINES))
+    readers: List[threading.Thread] = field(default_factory=list)
+
+
+class ProcessSupervisor:
+    """
+    Watches a group of cooperating subprocesses (e.g. ffmpeg piping into
+    whisper-cli) and kills them all if the group stops producing output for
+    ``stall_timeout`` seconds.
+
+    Use as a context manager: processes still running on exit are killed.
+    """
+
+    def __init__(self, stall_timeout: float, on_progress: Optional[Callable[[float], None]] = None):
+        self.stall_timeout = stall_timeout
+        self.on_progress = on_progress
+        self._watched: Dict[int, _Watched] = {}
+        self._last_activity = time.monotonic()
+        self._lock = threading.Lock()
+        self._cancel = current_cancellation()
+        _active.add(self)
+
+    def __enter__(self) -> "ProcessSupervisor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.kill_all()
+        _active.discard(self)
+
+    def watch(
+        self,
+        proc: subprocess.Popen,
+        name: str,
+        error: Type[TranscriptionError],
+        parser: Optional[Callable[[str], Optional[float]]] = None,
+        weight: float = 1.0,
+        on_line: Optional[Callable[[str], None]] = None,
+        stdout: bool = True,
+        on_exit: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """
+        Starts reading the PIPE outputs of a process.
+
+        Args:
+            proc: The process; its stdout/stderr are read if they are open
+                PIPEs (close a pipe handed to another process first).
+            name: Human-readable name used in error messages.
+            error: Exception type raised if the process stalls.
+            parser: Maps an output line to a completed fraction, or None.
+            weight: Share of this process in the group's overall progress.
+            on_line: Called with every output line, e.g. to collect results.
+            stdout: Whether to read stdout; pass False when the caller
+                consumes it itself (e.g. a PCM stream).
+            on_exit: Called from wait(), on the waiting thread, with the
+                return code once the process has exited and all of its
+                output was read, while other processes may still run.
+        """
+        watched = _Watched(proc, name, error, parser, weight, on_line, on_exit)
+        self._watched[proc.pid] = watched
+        for stream in ((proc.stdout if stdout else None), proc.stderr):
+            if stream is not None and not stream.closed:
+                reader = threading.Thread(target=self._read, args=(watched, stream), daemon=True)
+                reader.start()
+                watched.readers.append(reader)
+
+    def _read(self, watched: _Watched, stream: IO[bytes]) -> None:
+        for raw in iter(stream.readline, b""):
+            self._last_activity = time.monotonic()
+            line = raw.decode('utf-8', errors='ignore').rstrip()
+            watched.tail.append(line)
+            if watched.on_line:
+                watched.on_line(line)
+            if watched.parser:
+                fraction = watched.parser(line)
+                if fraction is not None:
+                    self._report(watched, fraction)
+        stream.close()
+
+    def _report(self, watched: _Watched, fraction: float) -> None:
+        with self._lock:
+            watched.fraction = max(watched.fraction, min(1.0, max(0.0, fraction)))
+            tracked = [w for w in self._watched.values() if w.parser]
+            total = sum(w.weight for w in tracked) or 1.0
+            overall = sum(w.fraction * w.weight for w in tracked) / total
+        if self.on_progress:
+            self.on_progress(overall)
+
+    def wait(self) -> None:
+        """
+        Blocks until every watched process has exited.
+
+        Raises the stalled process's error type if the group was silent for
+        longer than the stall window, or TranscriptionCancelled if the job
+        was cancelled; all processes are killed first.
+        """
+        self._last_activity = time.monotonic()
+        while any(w.proc.poll() is None for w in self._watched.values()):
+            self._report_exits()
+            if self._cancel is not None and self._cancel.is_set():
+                self.kill_all()
+                raise TranscriptionCancelled("Обработка отменена.")
+            silent_for = time.monotonic() - self._last_activity
+            if silent_for > self.stall_timeout:
+                stalled = next(w for w in self._watched.values() if w.proc.poll() is None)
+                self.kill_all()
+                raise stalled.error(
+                    f"{stalled.name} не подаёт признаков жизни {int(silent_for)} с — процесс остановлен.\n"
+                    f"{self.output(stalled.proc)}"
+                )
+            time.sleep(0.2)
+        self._report_exits()
+
+    def _report_exits(self) -> None:
+        """Joins the readers of processes that have exited and calls their on_exit once."""
+        for watched in list(self._watched.values()):
+            if watched.exited or watched.proc.poll() is None:
+                continue
+            watched.exited = True
+            for reader in watched.readers:
+                reader.join(timeout=5)
+            if watched.on_exit:
+                watched.on_exit(watched.proc.returncode)
+
+    def output(self, proc: subprocess.Popen) -> str:
+        """Returns the last lines a watched process printed."""
+        watched = self._watched.get(proc.pid)
+        return "\n".join(watched.tail) if watched else ""
+
+    def kill_all(self) -> None:
+        """Kills every watched process that is still running, with its process group."""
+        for watched in self._watched.values():
+            if watched.proc.poll() is None:
+                kill_process(watched.proc)
+                watched.proc.wait()
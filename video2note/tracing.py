@@ -0,0 +1,139 @@
+"""
+Per-stage timing spans for Video2Note.
+
+The pipeline records a span for every stage it runs (cache lookup, ffmpeg,
+probe, ETA history, whisper.cpp, output). Spans travel with each result and
+can be exported as JSON lines or in the Chrome trace event format, which
+chrome://tracing and Perfetto open directly.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Set
+
+TRACE_FORMATS = ('jsonl', 'chrome')
+
+
+@dataclass
+class Span:
+    """One timed stage: wall-clock start (epoch seconds), duration and attributes."""
+    name: str
+    start: float
+    duration: float
+    thread: str
+    thread_id: int
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+class Tracer:
+    """
+    Collects spans for one unit of work, e.g. one file. Thread-safe, so
+    background steps such as prefetched conversions can record into it.
+
+    ``attrs`` are added to every span (e.g. the file name).
+    """
+
+    def __init__(self, **attrs: Any):
+        self.attrs = attrs
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Times the enclosed block. Yields the span's attributes, which the
+        block may update (e.g. to record a cache hit).
+        """
+        values = {**self.attrs, **attrs}
+        start = time.time()
+        started = time.perf_counter()
+        try:
+            yield values
+        except BaseException as e:
+            values["error"] = type(e).__name__
+            raise
+        finally:
+            thread = threading.current_thread()
+            self.add(Span(name, start, time.perf_counter() - started, thread.name, thread.ident or 0, values))
+
+    def add(self, span: Span) -> None:
+        """Records a finished span."""
+        with self._lock:
+            self._spans.append(span)
+
+    @property
+    def spans(self) -> List[Span]:
+        """Recorded spans, in the order they finished."""
+        with self._lock:
+            return list(self._spans)
+
+    def total(self, name: str) -> Optional[float]:
+        """Summed duration of the spans with a name, or None if there are none."""
+        durations = [s.duration for s in self.spans if s.name == name]
+        return sum(durations) if durations else None
+
+
+class TraceWriter:
+    """
+    Appends spans to a trace file as they arrive, so a long batch can be
+    inspected while it runs and nothing is lost if it is interrupted.
+
+    ``jsonl`` writes one span per line. ``chrome`` writes the trace event
+    array format; its closing bracket is optional, so a partial file still
+    loads.
+    """
+
+    def __init__(self, path: Path, fmt: str = 'jsonl'):
+        if fmt not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format: {fmt}")
+        self.path = path
+        self.format = fmt
+        self._file: IO[str] = path.open('w', encoding='utf-8')
+        self._first = True
+        self._named_threads: Set[int] = set()
+        self._lock = threading.Lock()
+        if fmt == 'chrome':
+            self._file.write("[\n")
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, spans: Iterable[Span]) -> None:
+        """Appends spans and flushes them to disk."""
+        with self._lock:
+            for span in spans:
+                if self.format == 'jsonl':
+                    self._file.write(json.dumps(asdict(span), ensure_ascii=False, default=str) + "\n")
+                else:
+                    for event in self._chrome_events(span):
+                        self._file.write(("" if self._first else ",\n") + json.dumps(event, ensure_ascii=False, default=str))
+                        self._first = False
+            self._file.flush()
+
+    def _chrome_events(self, span: Span) -> List[dict]:
+        events = []
+        if span.thread_id not in self._named_threads:
+            self._named_threads.add(span.thread_id)
+            events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": span.thread_id,
+                           "args": {"name": span.thread}})
+        events.append({
+            "name": span.name, "cat": "video2note", "ph": "X", "pid": os.getpid(), "tid": span.thread_id,
+            "ts": round(span.start * 1_000_000), "dur": round(span.duration * 1_000_000), "args": span.attrs,
+        })
+        return events
+
+    def close(self) -> None:
+        """Finishes and closes the trace file."""
+        with self._lock:
+            if self._file.closed:
+                return
+            if self.format == 'chrome':
+                self._file.write("\n]\n")
+            self._file.close()
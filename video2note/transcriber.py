@@ -2,148 +2,744 @@
 Core transcription logic for Video2Note.
 """
 import logging
+import math
+import re
 import subprocess
 import tempfile
 import time
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Callable, Dict, List, Optional, Protocol, Sequence, Tuple
 
-from rich.progress import Progress, SpinnerColumn, TextColumn
-
-from .config import TranscriptionConfig
+from .audio_cache import AUDIO_CACHE_DIR_NAME, AudioCache
+from .checkpoint import SegmentCheckpoint
+from .config import (DEFAULT_STALL_TIMEOUT, TranscriptionConfig,
+                     discovery_cache)
 from .exceptions import FfmpegError, WhisperCppError
-from .ui import ElapsedETAColumn, console
-from .utils import get_safe_filename
+from .probe import MediaInfo
+from .segments import Segment, parse_segment_line, parse_srt
+from .supervisor import (FfmpegProgressParser, ProcessSupervisor,
+                         WhisperProgressParser, start_process)
+from .ui import progress_task
+from .utils import EtaEstimate
 
 logger = logging.getLogger(__name__)
 
 
-def convert_to_standard_audio(input_path: Path, output_path: Path) -> None:
+# gentle EQ only, keep all silence
+AUDIO_FILTERS = 'volume=1.5,highpass=f=80,lowpass=f=8000'
+
+TARGET_SAMPLE_RATE = 16000
+# Codecs whisper.cpp decodes by itself, with the container each is read from
+_NATIVE_CODECS = {'pcm_s16le': 'wav', 'flac': 'flac'}
+
+
+# Receives each finished segment while whisper.cpp is still decoding
+SegmentCallback = Callable[[Segment], None]
+
+
+class TranscriptionBackend(Protocol):
+    """
+    Anything that can turn audio into timestamped segments, like
+    run_whisper_transcription(); returns them with the decoding time.
+    """
+
+    def transcribe(self, audio_path: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                   checkpoint: Optional[SegmentCheckpoint] = None,
+                   on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
+        ...
+
+    def transcribe_stream(self, input_file: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                          checkpoint: Optional[SegmentCheckpoint] = None,
+                          on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
+        ...
+
+    def warm(self, config: TranscriptionConfig) -> bool:
+        """
+        True if a model that is already loaded decodes files with this
+        config. It answers with the whole transcript at once, so such files
+        are neither split into parallel chunks nor checkpointed.
+        """
+        ...
+
+
+def run_ffmpeg(cmd: List[str], stall_timeout: float, error_message: str,
+               report: Optional[Callable[[float], None]] = None,
+               parser: Optional[Callable[[str], Optional[float]]] = None,
+               on_line: Optional[Callable[[str], None]] = None) -> None:
+    """
+    Runs an ffmpeg command that writes to a file (or nowhere) to completion
+    under a ProcessSupervisor.
+
+    ``report``, ``parser`` and ``on_line`` are passed on to the supervisor.
+    Raises FfmpegError if ffmpeg cannot be started or stalls, and
+    ``error_message`` with the tail of its output if it fails.
+    """
+    with ProcessSupervisor(stall_timeout, report) as supervisor:
+        try:
+            proc = start_process(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise FfmpegError(f"Не удалось запустить ffmpeg: {e}") from e
+        supervisor.watch(proc, "ffmpeg", FfmpegError, parser, on_line=on_line)
+        supervisor.wait()
+        logger.debug(supervisor.output(proc))
+        if proc.returncode != 0:
+            raise FfmpegError(f"{error_message}:\n{supervisor.output(proc)}")
+
+
+def convert_to_standard_audio(input_path: Path, output_path: Path, stall_timeout: float = DEFAULT_STALL_TIMEOUT) -> None:
     """
     Converts any media file to a 16kHz mono FLAC file using ffmpeg.
+
+    ffmpeg may run as long as it keeps reporting progress; it is killed
+    after ``stall_timeout`` seconds without output.
     """
     logger.info(f"Конвертирую {input_path.name} в стандартный аудиоформат (FLAC 16kHz mono)...")
     cmd = [
-        'ffmpeg', '-i', str(input_path), '-vn', '-c:a', 'flac',
+        'ffmpeg', '-nostdin', '-i', str(input_path), '-vn', '-c:a', 'flac',
         '-ar', '16000', '-ac', '1',
-        # gentle EQ only, keep all silence
-        '-af', 'volume=1.5,highpass=f=80,lowpass=f=8000',
+        '-af', AUDIO_FILTERS,
+        '-progress', 'pipe:2', '-nostats',
         '-y', str(output_path)
     ]
+    run_ffmpeg(cmd, stall_timeout, "Ошибка конвертации аудио (ffmpeg)")
+    logger.info(f"Аудио готово: {output_path.name}")
+
+
+def open_pcm_stream(input_path: Path) -> subprocess.Popen:
+    """
+    Starts ffmpeg decoding any media file to 16kHz mono s16le PCM on its stdout.
+
+    The PCM goes out with a streamed WAV header (sizes left unknown), which
+    whisper.cpp needs to recognize the sample format of piped input.
+    Progress is written to stderr, which the caller must supervise.
+    """
+    logger.info(f"Декодирую {input_path.name} в поток PCM 16kHz mono без временного файла...")
+    cmd = [
+        'ffmpeg', '-nostdin', '-i', str(input_path), '-vn', '-c:a', 'pcm_s16le',
+        '-ar', '16000', '-ac', '1',
+        '-af', AUDIO_FILTERS,
+        '-progress', 'pipe:2', '-nostats',
+        '-f', 'wav', 'pipe:1'
+    ]
     try:
-        proc = subprocess.run(cmd, capture_output=True, text=False, check=True, timeout=600)
-        try:
-            logger.debug(proc.stderr.decode('utf-8', errors='ignore'))
-        except Exception:
-            pass
-        logger.info(f"Аудио готово: {output_path.name}")
-    except subprocess.TimeoutExpired as e:
-        raise FfmpegError("Время ожидания истекло. Файл может быть слишком большим или поврежден.") from e
-    except subprocess.CalledProcessError as e:
-        raise FfmpegError(f"Ошибка конвертации аудио (ffmpeg):\n{e.stderr}") from e
+        return start_process(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise FfmpegError(f"Не удалось запустить ffmpeg: {e}") from e
 
 
-def prepare_audio_source(input_file: Path, temp_dir: Path) -> Path:
+def audio_fast_path(info: Optional[MediaInfo]) -> Optional[str]:
     """
-    Ensures an audio file is ready for transcription by converting it
-    to a standardized temporary FLAC file.
+    Tells whether a file can skip re-encoding: ``'direct'`` if its audio
+    is already 16kHz mono PCM/FLAC in a WAV/FLAC file that whisper.cpp
+    reads as is, ``'copy'`` if such a stream only needs extracting from
+    another container, and None if it has to be converted.
     """
-    safe_stem = get_safe_filename(input_file.stem)
-    temp_audio_path = temp_dir / f"{safe_stem}_audio.flac"
+    if (info is None or not info.has_audio or info.sample_rate != TARGET_SAMPLE_RATE
+            or info.channels != 1 or info.codec not in _NATIVE_CODECS):
+        return None
+    containers = (info.container or '').split(',')
+    return 'direct' if _NATIVE_CODECS[info.codec] in containers else 'copy'
 
-    if temp_audio_path.exists():
-        try:
-            if temp_audio_path.stat().st_mtime >= input_file.stat().st_mtime and temp_audio_path.stat().st_size > 1024:
-                logger.info(f"Кэш аудио актуален: {temp_audio_path.name}")
-                return temp_audio_path
-        except OSError:
-            pass
 
-    convert_to_standard_audio(input_file, temp_audio_path)
+def extract_audio_stream(input_path: Path, output_path: Path, stall_timeout: float = DEFAULT_STALL_TIMEOUT) -> None:
+    """Copies the first audio stream of a media file into its own file, without decoding it."""
+    logger.info(f"Извлекаю аудиодорожку из {input_path.name} без перекодирования...")
+    cmd = [
+        'ffmpeg', '-nostdin', '-i', str(input_path), '-map', '0:a:0', '-vn', '-c:a', 'copy',
+        '-progress', 'pipe:2', '-nostats',
+        '-y', str(output_path)
+    ]
+    run_ffmpeg(cmd, stall_timeout, "Ошибка извлечения аудио (ffmpeg)")
+    logger.info(f"Аудио готово: {output_path.name}")
+
+
+def prepare_audio_source(input_file: Path, temp_dir: Path, stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+                         info: Optional[MediaInfo] = None, force_filters: bool = False,
+                         audio_cache: Optional[AudioCache] = None) -> Path:
+    """
+    Ensures an audio file is ready for transcription.
+
+    Inputs that are already 16kHz mono PCM/FLAC are handed over as they
+    are, or have just their audio stream copied out (see
+    audio_fast_path()); anything else, or everything with
+    ``force_filters``, is converted to a standardized FLAC file through
+    AUDIO_FILTERS. Both land in ``audio_cache`` (by default the
+    AUDIO_CACHE_DIR_NAME directory of ``temp_dir``), where an earlier
+    run's file for the same source version is reused. The result may be
+    ``input_file`` itself, which callers must not delete.
+    """
+    fast_path = None if force_filters else audio_fast_path(info)
+    if fast_path == 'direct':
+        logger.info(f"{input_file.name} уже в формате 16kHz mono — конвертация не нужна.")
+        return input_file
+
+    audio_cache = audio_cache or AudioCache(temp_dir / AUDIO_CACHE_DIR_NAME)
+    if fast_path == 'copy':
+        temp_audio_path = audio_cache.path_for(input_file, "copy", f".{_NATIVE_CODECS[info.codec]}")
+    else:
+        temp_audio_path = audio_cache.path_for(input_file, "audio", ".flac")
+    if audio_cache.lookup(temp_audio_path):
+        logger.info(f"Кэш аудио актуален: {temp_audio_path.name}")
+        return temp_audio_path
+
+    with audio_cache.writing(temp_audio_path) as tmp_path:
+        if fast_path == 'copy':
+            extract_audio_stream(input_file, tmp_path, stall_timeout)
+        else:
+            convert_to_standard_audio(input_file, tmp_path, stall_timeout)
     return temp_audio_path
 
 
-def run_whisper_transcription(audio_path: Path, config: TranscriptionConfig, eta: Optional[float]) -> Tuple[str, float]:
+def find_vad_model(models_dir: Path) -> Optional[Path]:
+    """Returns the first Silero VAD model found in the whisper.cpp models directory."""
+    # Called for every file and ETA; the scan is redone only when the directory changes
+    return discovery_cache.lookup(f"vad:{models_dir}", lambda: _scan_vad_model(models_dir), witness=models_dir)
+
+
+def _scan_vad_model(models_dir: Path) -> Optional[Path]:
+    vad_model_candidates = [
+        models_dir / "ggml-silero-v5.1.2.bin",
+        models_dir / "for-tests-silero-v5.1.2-ggml.bin",
+    ]
+    try:
+        for p in models_dir.glob("*silero*ggml*.bin"):
+            vad_model_candidates.append(p)
+        for p in models_dir.glob("*vad*.bin"):
+            vad_model_candidates.append(p)
+    except OSError:
+        pass
+
+    return next((p for p in vad_model_candidates if p.exists()), None)
+
+
+def build_decoding_args(config: TranscriptionConfig, threads: Optional[int] = None) -> List[str]:
+    """
+    Builds the whisper.cpp model, language and decoding arguments.
+
+    Shared by whisper-cli and whisper-server, which accept the same flags.
+    ``threads`` overrides config.threads, e.g. for one of several parallel processes.
+    """
+    args = [
+        "--model", str(config.model_path), "--language", config.language,
+        "--threads", str(threads or config.threads),
+    ]
+    return args + decoding_options(config)
+
+
+def decoding_options(config: TranscriptionConfig) -> List[str]:
+    """
+    The whisper.cpp arguments that shape the transcript besides the model
+    and language: VAD and the decoding controls. Unlike --threads, every
+    one of them can change the output.
+    """
+    args: List[str] = []
+
+    # Try to enable VAD only if a VAD model is available
+    vad_model_path = find_vad_model(config.models_dir)
+    if vad_model_path:
+        args += ["--vad", "--vad-model", str(vad_model_path)]
+    else:
+        logger.info("VAD модель не найдена в каталоге моделей whisper.cpp — продолжаю без --vad.")
+
+    # General decoding and segmentation controls
+    args += [
+        # more sensitive to quiet speech even without VAD
+        "--no-speech-thold", "0.6",
+        # allow longer segments for coherence
+        "--max-len", "100",
+        # re-enable limited context to stabilize decoding
+        "--max-context", "32",
+        # decoding effort, from the preset or tuned profile
+        "--beam-size", str(config.beam_size), "--best-of", str(config.best_of), "--temperature", "0.5",
+        # entropy threshold near default
+        "--entropy-thold", "2.4",
+        "--logprob-thold", "-1.0",
+    ]
+    return args
+
+
+def _resume_args(checkpoint: Optional[SegmentCheckpoint]) -> Tuple[List[str], List[Segment]]:
+    """Loads a checkpoint and returns the whisper.cpp args to continue after it."""
+    if checkpoint is None:
+        return [], []
+    done = checkpoint.load()
+    if not done:
+        return [], []
+    offset = checkpoint.resume_offset
+    logger.info(f"Найдена контрольная точка: {len(done)} сегментов, продолжаю с {offset:.1f} с.")
+    return ["--offset-t", str(int(offset * 1000))], done
+
+
+def _segment_reader(checkpoint: Optional[SegmentCheckpoint],
+                    on_segment: Optional[SegmentCallback]) -> Optional[Callable[[str], None]]:
+    """Returns an output-line handler passing each segment whisper-cli prints to the checkpoint and ``on_segment``."""
+    if checkpoint is None and on_segment is None:
+        return None
+
+    def handle(line: str) -> None:
+        segment = parse_segment_line(line)
+        if segment is None or not segment.text:
+            return
+        if checkpoint:
+            checkpoint.add(segment)
+        if on_segment:
+            on_segment(segment)
+
+    return handle
+
+
+def _read_segments(srt_file: Path, resumed: List[Segment]) -> List[Segment]:
+    """Reads the SRT file written by whisper.cpp --output-srt, after any resumed segments."""
+    try:
+        segments = parse_srt(srt_file.read_bytes().decode('utf-8', errors='ignore'))
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать файл транскрипции как UTF-8: {e}")
+        segments = []
+    segments = resumed + segments
+    if not segments:
+        logger.warning("Получена пустая транскрипция. Проверьте исходный файл.")
+    return segments
+
+
+def _start_whisper(cmd: List[str], stdin=subprocess.DEVNULL) -> subprocess.Popen:
+    try:
+        return start_process(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        raise WhisperCppError(f"Не удалось запустить whisper.cpp: {e}") from e
+
+
+def run_whisper_transcription(audio_path: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                              checkpoint: Optional[SegmentCheckpoint] = None,
+                              on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
     """
     Executes the whisper.cpp process to transcribe the given audio file.
+
+    There is no wall-clock limit: whisper.cpp is only stopped after
+    config.stall_timeout seconds without progress or segment output.
+    With a checkpoint, finished segments are saved as they are printed and
+    a previously interrupted run is continued instead of restarted.
+    ``on_segment`` is called from a reader thread with every segment as
+    it is printed, starting with the resumed ones.
     """
     logger.info(f"Запуск whisper.cpp с моделью {config.model_path.name}...")
+    return _run_whisper(str(audio_path), config, eta, checkpoint, on_segment)
+
 
-    with tempfile.NamedTemporaryFile(mode='w+', suffix='.txt', delete=False) as tmp:
+def run_whisper_stream(input_file: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                       checkpoint: Optional[SegmentCheckpoint] = None,
+                       on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
+    """
+    Transcribes a media file by piping ffmpeg's PCM output straight into
+    whisper.cpp's stdin, without writing an intermediate audio file.
+    Checkpoints and ``on_segment`` work as in run_whisper_transcription().
+    """
+    logger.info(f"Запуск whisper.cpp (потоковый ввод) с моделью {config.model_path.name}...")
+    return _run_whisper("-", config, eta, checkpoint, on_segment, lambda: open_pcm_stream(input_file))
+
+
+def _run_whisper(file_arg: str, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                 checkpoint: Optional[SegmentCheckpoint], on_segment: Optional[SegmentCallback],
+                 open_input: Optional[Callable[[], subprocess.Popen]] = None) -> Tuple[List[Segment], float]:
+    """
+    Runs whisper-cli on ``file_arg``, or on the stdout of the process
+    ``open_input`` starts when ``file_arg`` is ``-``; both are supervised
+    together. See run_whisper_transcription() for the rest.
+    """
+    with tempfile.NamedTemporaryFile(mode='w+', suffix='.srt', delete=False) as tmp:
         output_file = Path(tmp.name)
-    
+
     output_prefix = str(output_file.with_suffix(''))
 
     try:
-        # Build whisper.cpp command with conditional VAD support
-        cmd = [
-            str(config.whisper_bin), "--model", str(config.model_path),
-            "--file", str(audio_path), "--language", config.language,
-            "--threads", str(config.threads),
-        ]
-
-        # Try to enable VAD only if a VAD model is available
-        vad_model_candidates = [
-            config.models_dir / "ggml-silero-v5.1.2.bin",
-            config.models_dir / "for-tests-silero-v5.1.2-ggml.bin",
-        ]
-        if config.models_dir.exists():
-            try:
-                for p in config.models_dir.glob("*silero*ggml*.bin"):
-                    vad_model_candidates.append(p)
-                for p in config.models_dir.glob("*vad*.bin"):
-                    vad_model_candidates.append(p)
-            except OSError:
-                pass
-
-        vad_model_path = next((p for p in vad_model_candidates if p.exists()), None)
-        if vad_model_path:
-            cmd += ["--vad", "--vad-model", str(vad_model_path)]
-        else:
-            logger.info("VAD модель не найдена в каталоге моделей whisper.cpp — продолжаю без --vad.")
-
-        # General decoding and segmentation controls
-        cmd += [
-            # more sensitive to quiet speech even without VAD
-            "--no-speech-thold", "0.6",
-            # allow longer segments for coherence
-            "--max-len", "100",
-            # re-enable limited context to stabilize decoding
-            "--max-context", "32",
-            # balanced decoding parameters
-            "--beam-size", "5", "--best-of", "5", "--temperature", "0.5",
-            # entropy threshold near default
-            "--entropy-thold", "2.4",
-            # keep other thresholds and outputs
-            "--logprob-thold", "-1.0", "--output-txt",
-            "--output-file", output_prefix, "--no-prints",
-        ]
-
-        with Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), ElapsedETAColumn(eta), console=console) as progress:
-            progress.add_task("🗣️  Транскрибирую...", total=None)
+        resume_args, resumed = _resume_args(checkpoint)
+        if on_segment:
+            for segment in resumed:
+                on_segment(segment)
+        cmd = [str(config.whisper_bin), "--file", file_arg]
+        cmd += build_decoding_args(config) + resume_args
+        # Timestamped output, from which every format is rendered
+        cmd += ["--output-srt", "--output-file", output_prefix, "--print-progress"]
+
+        with progress_task("🗣️  Транскрибирую...", eta) as report, \
+                ProcessSupervisor(config.stall_timeout, report) as supervisor:
             start_time = time.perf_counter()
-            proc = subprocess.run(cmd, capture_output=True, text=False, check=True, timeout=3600)
-            try:
-                logger.debug(proc.stderr.decode('utf-8', errors='ignore'))
-            except Exception:
-                pass
+            producer = open_input() if open_input else None
+            if producer is not None:
+                # whisper.cpp reads all of stdin before decoding, so decoding is a small share of the work
+                supervisor.watch(producer, "ffmpeg", FfmpegError, FfmpegProgressParser(), weight=0.1, stdout=False)
+                try:
+                    whisper = _start_whisper(cmd, stdin=producer.stdout)
+                finally:
+                    # Only whisper holds the read end now, so ffmpeg sees EPIPE if whisper dies
+                    producer.stdout.close()
+            else:
+                whisper = _start_whisper(cmd)
+            supervisor.watch(whisper, "whisper.cpp", WhisperCppError, WhisperProgressParser(),
+                             weight=0.9 if producer is not None else 1.0,
+                             on_line=_segment_reader(checkpoint, on_segment))
+            supervisor.wait()
             elapsed = time.perf_counter() - start_time
 
-        try:
-            transcription_bytes = output_file.read_bytes()
-            transcription = transcription_bytes.decode('utf-8', errors='ignore').strip()
-        except Exception as e:
-            logger.warning(f"Не удалось прочитать файл транскрипции как UTF-8: {e}")
-            transcription = ""
-        if not transcription:
-            logger.warning("Получена пустая транскрипция. Проверьте исходный файл.")
+        if producer is not None:
+            logger.debug(supervisor.output(producer))
+            if producer.returncode != 0:
+                raise FfmpegError(f"Ошибка декодирования аудио (ffmpeg):\n{supervisor.output(producer)}")
+        logger.debug(supervisor.output(whisper))
+        if whisper.returncode != 0:
+            raise WhisperCppError(f"Ошибка выполнения whisper.cpp:\n{supervisor.output(whisper)}")
 
-        return transcription, elapsed
+        return _read_segments(output_file, resumed), elapsed
 
-    except subprocess.TimeoutExpired as e:
-        raise WhisperCppError("Время ожидания истекло. Файл может быть слишком длинным.") from e
-    except subprocess.CalledProcessError as e:
-        raise WhisperCppError(f"Ошибка выполнения whisper.cpp:\n{e.stderr}") from e
     finally:
+        if checkpoint:
+            checkpoint.close()
         if output_file.exists():
-            output_file.unlink(missing_ok=True) 
\ No newline at end of file
+            output_file.unlink(missing_ok=True)
+
+
+class CliBackend:
+    """The default backend: spawns whisper-cli for every file."""
+
+    def transcribe(self, audio_path: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                   checkpoint: Optional[SegmentCheckpoint] = None,
+                   on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
+        return run_whisper_transcription(audio_path, config, eta, checkpoint, on_segment)
+
+    def transcribe_stream(self, input_file: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                          checkpoint: Optional[SegmentCheckpoint] = None,
+                          on_segment: Optional[SegmentCallback] = None) -> Tuple[List[Segment], float]:
+        return run_whisper_stream(input_file, config, eta, checkpoint, on_segment)
+
+    def warm(self, config: TranscriptionConfig) -> bool:
+        return False
+
+
+# --- Language detection ---
+
+# Language value that asks for detection instead of naming a language
+AUTO_LANGUAGE = "auto"
+# whisper.cpp detects the language from the first 30 seconds of audio only
+DETECT_WINDOW_SECONDS = 30
+
+_PROCESSING_RE = re.compile(r"processing '(.+?)' \(")
+_DETECTED_RE = re.compile(r"auto-detected language: ([a-z]+)")
+
+
+def extract_window(input_path: Path, output_path: Path, seconds: float,
+                   stall_timeout: float = DEFAULT_STALL_TIMEOUT) -> None:
+    """Decodes the first ``seconds`` of a media file to a 16kHz mono WAV file."""
+    cmd = [
+        'ffmpeg', '-nostdin', '-i', str(input_path), '-t', str(seconds), '-vn', '-c:a', 'pcm_s16le',
+        '-ar', '16000', '-ac', '1',
+        '-af', AUDIO_FILTERS,
+        '-progress', 'pipe:2', '-nostats',
+        '-y', str(output_path)
+    ]
+    run_ffmpeg(cmd, stall_timeout, "Ошибка декодирования аудио (ffmpeg)")
+
+
+def detect_languages(input_files: Sequence[Path], config: TranscriptionConfig,
+                     window: float = DETECT_WINDOW_SECONDS) -> Dict[Path, str]:
+    """
+    Detects the spoken language of each file from its first ``window`` seconds.
+
+    ffmpeg cuts just that window out of every file, and one whisper-cli run
+    with --detect-language goes through all of them, so the model is loaded
+    once for the whole batch. Files whose language could not be detected
+    are left out of the result.
+    """
+    detected: Dict[Path, str] = {}
+    if not input_files:
+        return detected
+    workdir = Path(tempfile.mkdtemp(prefix="video2note-lang-"))
+    try:
+        with progress_task("🌐 Определяю язык...", None) as report:
+            clips: Dict[str, Path] = {}
+            for i, input_file in enumerate(input_files):
+                clip = workdir / f"clip{i:03d}.wav"
+                try:
+                    extract_window(input_file, clip, window, config.stall_timeout)
+                except FfmpegError as e:
+                    logger.warning(f"Не удалось определить язык {input_file.name}: {e}")
+                    continue
+                clips[str(clip)] = input_file
+                # Cutting the windows is about half of the work
+                report(0.5 * (i + 1) / len(input_files))
+            if not clips:
+                return detected
+
+            cmd = [str(config.whisper_bin), "--model", str(config.model_path), "--language", AUTO_LANGUAGE,
+                   "--detect-language", "--threads", str(config.threads)]
+            for clip in clips:
+                cmd += ["--file", clip]
+            current: Optional[Path] = None
+
+            def on_line(line: str) -> None:
+                nonlocal current
+                processing = _PROCESSING_RE.search(line)
+                if processing:
+                    current = clips.get(processing.group(1))
+                    return
+                found = _DETECTED_RE.search(line)
+                if found and current is not None:
+                    detected[current] = found.group(1)
+                    current = None
+                    report(0.5 + 0.5 * len(detected) / len(clips))
+
+            with ProcessSupervisor(config.stall_timeout) as supervisor:
+                proc = _start_whisper(cmd)
+                supervisor.watch(proc, "whisper.cpp", WhisperCppError, on_line=on_line)
+                supervisor.wait()
+            logger.debug(supervisor.output(proc))
+            if proc.returncode != 0:
+                raise WhisperCppError(f"Ошибка определения языка (whisper.cpp):\n{supervisor.output(proc)}")
+    finally:
+        for clip in workdir.glob("*.wav"):
+            clip.unlink(missing_ok=True)
+        try:
+            workdir.rmdir()
+        except OSError:
+            pass
+
+    for input_file in input_files:
+        if input_file in detected:
+            logger.info(f"Язык {input_file.name}: {detected[input_file]}")
+        else:
+            logger.warning(f"Язык {input_file.name} не определён — whisper.cpp определит его при транскрипции.")
+    return detected
+
+
+# --- Long-file mode: parallel chunks ---
+
+# Below this duration a single whisper process is used
+LONG_FILE_SECONDS = 20 * 60
+# Each process keeps its own copy of the model in memory
+MAX_PARALLEL_CHUNKS = 4
+MIN_THREADS_PER_CHUNK = 4
+
+_SILENCE_RE = re.compile(r"silence_(start|end): (-?\d+(?:\.\d+)?)")
+# A single word matching across a chunk boundary is as likely a coincidence as a repeat
+MIN_REPEATED_WORDS = 2
+
+
+def auto_parallel_chunks(duration: float, threads: int) -> int:
+    """
+    Heuristic number of parallel whisper processes for a file.
+
+    whisper.cpp stops scaling well before high core counts, so long files
+    are split roughly every 15 minutes, keeping at least a few threads per
+    process and bounding the number of model copies in memory.
+    """
+    if duration < LONG_FILE_SECONDS:
+        return 1
+    by_duration = math.ceil(duration / (15 * 60))
+    by_threads = max(1, threads // MIN_THREADS_PER_CHUNK)
+    return max(1, min(by_duration, by_threads, MAX_PARALLEL_CHUNKS))
+
+
+def detect_silences(audio_path: Path, noise_db: float = -35.0, min_silence: float = 0.5,
+                    stall_timeout: float = DEFAULT_STALL_TIMEOUT) -> List[Tuple[float, float]]:
+    """Finds silent intervals with ffmpeg's silencedetect filter."""
+    cmd = [
+        'ffmpeg', '-nostdin', '-i', str(audio_path),
+        '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}',
+        '-progress', 'pipe:2', '-nostats',
+        '-f', 'null', '-'
+    ]
+    events: List[Tuple[str, str]] = []
+    try:
+        run_ffmpeg(cmd, stall_timeout, "Ошибка поиска пауз (ffmpeg)",
+                   on_line=lambda line: events.extend(_SILENCE_RE.findall(line)))
+    except FfmpegError as e:
+        logger.warning(f"Не удалось найти паузы в аудио, режу по времени: {e}")
+        return []
+
+    silences: List[Tuple[float, float]] = []
+    start: Optional[float] = None
+    for kind, value in events:
+        if kind == "start":
+            start = max(0.0, float(value))
+        elif start is not None:
+            silences.append((start, float(value)))
+            start = None
+    return silences
+
+
+def plan_chunks(duration: float, silences: List[Tuple[float, float]], count: int) -> List[Tuple[float, float]]:
+    """
+    Splits [0, duration] into ``count`` chunks of similar length, moving each
+    cut to the middle of the nearest silence when one is close enough.
+    """
+    if count <= 1 or duration <= 0:
+        return [(0.0, duration)]
+
+    step = duration / count
+    window = step / 4
+    midpoints = [(s + e) / 2 for s, e in silences]
+    cuts: List[float] = []
+    for i in range(1, count):
+        target = step * i
+        nearby = [m for m in midpoints if abs(m - target) <= window and m > (cuts[-1] if cuts else 0.0)]
+        cuts.append(min(nearby, key=lambda m: abs(m - target)) if nearby else target)
+
+    bounds = [0.0] + cuts + [duration]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _strip_repeated_prefix(previous: str, text: str, max_words: int = 12) -> str:
+    """
+    Removes the start of ``text`` that repeats the end of ``previous``,
+    which happens when a boundary falls inside a phrase both processes heard.
+    Only repeats of at least MIN_REPEATED_WORDS words are cut.
+    """
+    tail = _words(previous)[-max_words:]
+    tokens = text.split()
+    for n in range(min(len(tail), len(tokens)), 0, -1):
+        head = [w for t in tokens[:n] for w in _words(t)]
+        if MIN_REPEATED_WORDS <= len(head) <= len(tail) and head == tail[-len(head):]:
+            return " ".join(tokens[n:])
+    return text
+
+
+def stitch_chunks(chunks: List[Tuple[Tuple[float, float], List[Segment]]]) -> List[Segment]:
+    """
+    Merges per-chunk segments in timeline order.
+
+    Segments that start outside their chunk or before the previous kept
+    segment ended are dropped, and text repeated across a boundary is cut.
+    """
+    merged: List[Segment] = []
+    for bounds, segments in chunks:
+        _stitch_chunk(merged, bounds, segments)
+    return merged
+
+
+def _stitch_chunk(merged: List[Segment], bounds: Tuple[float, float], segments: List[Segment]) -> List[Segment]:
+    """
+    Appends one chunk to the segments stitched so far and returns the ones
+    it added. They only depend on the chunks before, so they are final.
+    """
+    start, end = bounds
+    added = len(merged)
+    first_in_chunk = True
+    for seg in sorted(segments, key=lambda x: x.start):
+        if seg.start < start - 0.5 or seg.start >= end:
+            continue
+        if merged and seg.start < merged[-1].end - 0.1 and seg.end <= merged[-1].end:
+            continue
+        text = seg.text
+        if merged and first_in_chunk:
+            text = _strip_repeated_prefix(merged[-1].text, text)
+        first_in_chunk = False
+        if text:
+            merged.append(Segment(seg.start, seg.end, text))
+    return merged[added:]
+
+
+def run_chunked_transcription(audio_path: Path, config: TranscriptionConfig, eta: Optional[EtaEstimate],
+                              duration: float, chunk_count: int,
+                              on_segment: Optional[SegmentCallback] = None,
+                              checkpoint_for: Optional[Callable[[Tuple[float, float]], SegmentCheckpoint]] = None,
+                              ) -> Tuple[List[Segment], float]:
+    """
+    Transcribes a long audio file with several whisper.cpp processes at once.
+
+    The file is split at silences into ``chunk_count`` ranges; each process
+    decodes its range via --offset-t/--duration with a share of the threads,
+    and the timestamped results are stitched back in order. A chunk's
+    segments are final once it and every chunk before it have finished, so
+    ``on_segment`` gets them chunk by chunk, in order, as that happens.
+
+    ``checkpoint_for`` returns the checkpoint of a chunk's (start, end)
+    window. Each chunk then saves its segments as they are printed; on a
+    rerun, finished chunks are not decoded again and interrupted ones
+    continue after their last saved segment.
+    """
+    chunk_bounds = plan_chunks(duration, detect_silences(audio_path, stall_timeout=config.stall_timeout), chunk_count)
+    threads = max(1, config.threads // len(chunk_bounds))
+    logger.info(f"Длинный файл: {len(chunk_bounds)} частей параллельно, по {threads} потоков на процесс.")
+
+    checkpoints = [checkpoint_for(bounds) if checkpoint_for else None for bounds in chunk_bounds]
+    results = [checkpoint.load() if checkpoint else [] for checkpoint in checkpoints]
+    finished = [checkpoint is not None and checkpoint.finished for checkpoint in checkpoints]
+    merged: List[Segment] = []
+    stitched = 0
+    failures: List[WhisperCppError] = []
+    workdir = Path(tempfile.mkdtemp(prefix="video2note-chunks-"))
+    srt_paths: List[Path] = []
+
+    def stitch_ready() -> None:
+        nonlocal stitched
+        while stitched < len(chunk_bounds) and finished[stitched]:
+            for segment in _stitch_chunk(merged, chunk_bounds[stitched], results[stitched]):
+                if on_segment:
+                    on_segment(segment)
+            stitched += 1
+
+    def chunk_done(i: int, proc: subprocess.Popen, srt_path: Path) -> Callable[[int], None]:
+        def on_exit(returncode: int) -> None:
+            logger.debug(supervisor.output(proc))
+            if returncode != 0:
+                failures.append(WhisperCppError(f"Ошибка выполнения whisper.cpp:\n{supervisor.output(proc)}"))
+                return
+            try:
+                results[i] = results[i] + parse_srt(srt_path.read_text(encoding='utf-8', errors='ignore'))
+            except OSError as e:
+                failures.append(WhisperCppError(f"whisper.cpp не создал результат для части {srt_path.name}: {e}"))
+                return
+            if checkpoints[i] is not None:
+                # Keeps this chunk done if another one fails
+                checkpoints[i].finish()
+            finished[i] = True
+            stitch_ready()
+        return on_exit
+
+    try:
+        stitch_ready()
+        with progress_task(f"🗣️  Транскрибирую ({len(chunk_bounds)} частей)...", eta) as report, \
+                ProcessSupervisor(config.stall_timeout, report) as supervisor:
+            start_time = time.perf_counter()
+            for i, (start, end) in enumerate(chunk_bounds):
+                if finished[i]:
+                    logger.info(f"Часть {i + 1} уже распознана ранее.")
+                    continue
+                if results[i]:
+                    start = max(start, checkpoints[i].resume_offset)
+                    logger.info(f"Часть {i + 1}: найдено {len(results[i])} сегментов, продолжаю с {start:.1f} с.")
+                prefix = workdir / f"chunk{i:02d}"
+                cmd = [str(config.whisper_bin), "--file", str(audio_path)]
+                cmd += build_decoding_args(config, threads=threads)
+                cmd += [
+                    "--offset-t", str(int(start * 1000)),
+                    "--duration", str(max(1, int(math.ceil((end - start) * 1000)))),
+                    "--output-srt", "--output-file", str(prefix), "--print-progress",
+                ]
+                proc = _start_whisper(cmd)
+                srt_paths.append(prefix.with_suffix(".srt"))
+                supervisor.watch(proc, f"whisper.cpp (часть {i + 1})", WhisperCppError,
+                                 WhisperProgressParser(start, end - start), weight=end - start,
+                                 on_line=_segment_reader(checkpoints[i], None),
+                                 on_exit=chunk_done(i, proc, srt_paths[-1]))
+            supervisor.wait()
+            elapsed = time.perf_counter() - start_time
+
+        if failures:
+            raise failures[0]
+        if not merged:
+            logger.warning("Получена пустая транскрипция. Проверьте исходный файл.")
+        return merged, elapsed
+
+    finally:
+        for checkpoint in checkpoints:
+            if checkpoint is not None:
+                checkpoint.close()
+        for srt_path in srt_paths:
+            srt_path.unlink(missing_ok=True)
+        try:
+            workdir.rmdir()
+        except OSError:
+            pass
@@ -0,0 +1,158 @@
+"""
+Hardware-aware tuning for Video2Note.
+
+`video2note tune` decodes the beginning of a real recording at several
+thread counts and with the decoding settings of every preset, compares each
+transcript with the one from the most thorough setting, and stores, per
+model, the fastest settings each preset accepts. Later runs pick up the
+profile of their preset automatically; without one, a preset means fixed
+decoding settings on default_threads().
+"""
+import logging
+import re
+import tempfile
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .config import DEFAULT_BEAM_SIZE, DEFAULT_BEST_OF, TranscriptionConfig
+from .exceptions import TranscriptionError
+from .hardware import available_cpus, default_threads, physical_cores
+from .metrics import MetricsStore, TuningProfile
+from .output import render_txt
+from .transcriber import extract_window, run_whisper_transcription
+
+logger = logging.getLogger(__name__)
+
+PRESETS = ('fast', 'balanced', 'accurate')
+# The decoding the tool always used, so results do not change unless asked to
+DEFAULT_PRESET = 'accurate'
+# Untuned (beam size, best of) of each preset; a beam of 1 decodes greedily
+PRESET_DECODING = {
+    'fast': (1, 1),
+    'balanced': (3, 3),
+    'accurate': (DEFAULT_BEAM_SIZE, DEFAULT_BEST_OF),
+}
+# Least word agreement with the accurate transcript a tuned fast/balanced setting must reach
+PRESET_AGREEMENT = {'fast': 0.90, 'balanced': 0.97}
+DEFAULT_TUNE_SECONDS = 60
+
+
+@dataclass
+class Calibration:
+    """One calibration decode: its settings, time, and word agreement with the reference."""
+    threads: int
+    beam_size: int
+    best_of: int
+    seconds: float
+    agreement: float
+
+
+@dataclass(frozen=True)
+class Decoding:
+    """Threads and decoding settings for a run; ``profile`` is set when they were tuned."""
+    threads: int
+    beam_size: int
+    best_of: int
+    profile: Optional[TuningProfile] = None
+
+
+def thread_candidates() -> List[int]:
+    """Thread counts worth comparing: from a quarter of the physical cores up to every usable CPU."""
+    cpus = available_cpus()
+    cores = min(physical_cores(), cpus)
+    return sorted({max(1, cores // 4), max(1, cores // 2), cores, cpus})
+
+
+def word_agreement(reference: str, hypothesis: str) -> float:
+    """One minus the word error rate of ``hypothesis`` against ``reference``, floored at 0."""
+    ref = re.findall(r"\w+", reference.lower())
+    hyp = re.findall(r"\w+", hypothesis.lower())
+    if not ref:
+        return 0.0 if hyp else 1.0
+    # Levenshtein distance over words, one row at a time
+    previous = list(range(len(hyp) + 1))
+    for i, word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, other in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (word != other))
+        previous = current
+    return max(0.0, 1.0 - previous[-1] / len(ref))
+
+
+def run_tuning(
+    sample: Path,
+    config: TranscriptionConfig,
+    seconds: float = DEFAULT_TUNE_SECONDS,
+    thread_counts: Optional[Sequence[int]] = None,
+    on_result: Optional[Callable[[Calibration], None]] = None,
+) -> List[Calibration]:
+    """
+    Decodes the first ``seconds`` of a recording with every preset's
+    decoding settings at every thread count (thread_candidates() by default).
+
+    The accurate setting at the highest thread count runs first; its
+    transcript is the reference the others are scored against. Times are
+    whisper.cpp wall times including the model load, as a real run sees
+    them. Raises TranscriptionError if the reference contains no speech.
+    """
+    thread_counts = sorted(set(thread_counts or thread_candidates()), reverse=True)
+    settings = sorted(set(PRESET_DECODING.values()), reverse=True)
+    results: List[Calibration] = []
+    with tempfile.TemporaryDirectory(prefix="video2note-tune-") as tmp:
+        clip = Path(tmp) / "sample.wav"
+        extract_window(sample, clip, seconds, config.stall_timeout)
+        reference: Optional[str] = None
+        for beam_size, best_of in settings:
+            for threads in thread_counts:
+                logger.info(f"Калибровка: {threads} потоков, beam {beam_size}, best-of {best_of}...")
+                run_config = replace(config, threads=threads, beam_size=beam_size, best_of=best_of)
+                segments, elapsed = run_whisper_transcription(clip, run_config, None)
+                text = render_txt(segments)
+                if reference is None:
+                    if not text:
+                        raise TranscriptionError(f"В начале {sample.name} не распознана речь — выберите запись с речью.")
+                    reference = text
+                result = Calibration(threads, beam_size, best_of, elapsed, word_agreement(reference, text))
+                results.append(result)
+                if on_result:
+                    on_result(result)
+    return results
+
+
+def choose_profiles(results: Sequence[Calibration], model_name: str) -> Dict[str, TuningProfile]:
+    """
+    Picks each preset's profile from the calibration results: the fastest
+    run with the accurate decoding settings for ``accurate``, and the
+    fastest run reaching PRESET_AGREEMENT for the others.
+    """
+    def fastest(candidates: Sequence[Calibration]) -> Calibration:
+        return min(candidates, key=lambda r: r.seconds)
+
+    accurate = fastest([r for r in results if (r.beam_size, r.best_of) == PRESET_DECODING['accurate']])
+    cpus = available_cpus()
+    profiles = {}
+    for preset in PRESETS:
+        if preset == 'accurate':
+            best = accurate
+        else:
+            best = fastest([r for r in results if r.agreement >= PRESET_AGREEMENT[preset]] or [accurate])
+        profiles[preset] = TuningProfile(model_name, preset, best.threads, best.beam_size, best.best_of,
+                                         best.seconds, best.agreement, cpus)
+    return profiles
+
+
+def resolve_decoding(model_name: str, preset: str = DEFAULT_PRESET) -> Decoding:
+    """
+    The settings a preset stands for: the profile tuned for this model, if
+    it was measured with as many CPUs as are available now, and otherwise
+    the preset's fixed decoding settings on default_threads().
+    """
+    profile = MetricsStore().profile(model_name, preset)
+    if profile is not None:
+        if profile.cpus == available_cpus():
+            return Decoding(profile.threads, profile.beam_size, profile.best_of, profile)
+        logger.info(f"Профиль {preset} для {model_name} измерен на {profile.cpus} CPU, а доступно {available_cpus()} — "
+                    f"использую настройки по умолчанию (обновите его: ./run tune).")
+    beam_size, best_of = PRESET_DECODING[preset]
+    return Decoding(default_threads(), beam_size, best_of)
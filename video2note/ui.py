@@ -4,35 +4,127 @@ User interface elements for Video2Note, including Rich components and GUI dialog
 import os
 import platform
 import subprocess
+import threading
 import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, Iterator, List, Optional
 
 from rich.console import Console
 from rich.logging import RichHandler
-from rich.progress import ProgressColumn, Task
+from rich.progress import (BarColumn, Progress, ProgressColumn, SpinnerColumn,
+                           Task, TaskProgressColumn, TextColumn)
 from rich.text import Text
 
+from .utils import EtaEstimate, format_eta
+
 # Rich Console and Logger
 console = Console()
 rich_handler = RichHandler(markup=True, rich_tracebacks=True, show_path=False)
 
 
 class ElapsedETAColumn(ProgressColumn):
-    """Custom Rich progress column showing 'elapsed / total_eta'."""
-    def __init__(self, eta: Optional[float]):
+    """Custom Rich progress column showing 'elapsed / total_eta (low–high)'."""
+    def __init__(self, eta: Optional[EtaEstimate]):
         super().__init__()
         self.eta = eta
 
     def render(self, task: "Task") -> Text:
-        """Render the column."""
+        """Render the column; a task's own ``eta`` field overrides the column's."""
         elapsed_str = time.strftime('%M:%S', time.gmtime(task.elapsed or 0))
-        if self.eta:
-            eta_str = time.strftime('%M:%S', time.gmtime(self.eta))
-            return Text(f"{elapsed_str} / {eta_str}", style="progress.elapsed")
+        eta = task.fields.get("eta", self.eta)
+        if eta:
+            return Text(f"{elapsed_str} / {format_eta(eta)}", style="progress.elapsed")
         return Text(elapsed_str, style="progress.elapsed")
 
 
+# Set while concurrent jobs share one progress view (see shared_progress())
+_shared: Optional[Progress] = None
+_local = threading.local()
+
+
+def _new_progress(eta: Optional[EtaEstimate] = None) -> Progress:
+    return Progress(SpinnerColumn(), TextColumn("[progress.description]{task.description}"), BarColumn(),
+                    TaskProgressColumn(), ElapsedETAColumn(eta), console=console)
+
+
+@contextmanager
+def shared_progress() -> Iterator[Progress]:
+    """
+    Shows one combined progress view for concurrently running jobs.
+
+    While it is active, progress_task() adds a row to it instead of opening
+    its own display (Rich allows only one live display at a time).
+    """
+    global _shared
+    with _new_progress() as progress:
+        _shared = progress
+        try:
+            yield progress
+        finally:
+            _shared = None
+
+
+@contextmanager
+def progress_label(label: str) -> Iterator[None]:
+    """Prefixes the progress rows started by the current thread, e.g. with a file name."""
+    _local.label = label
+    try:
+        yield
+    finally:
+        _local.label = None
+
+
+@contextmanager
+def progress_callback(callback: Callable[[str, Optional[float]], None]) -> Iterator[None]:
+    """
+    Sends the progress rows started by the current thread to
+    ``callback(description, fraction)`` instead of the console; the fraction
+    is None until the step reports one.
+    """
+    _local.callback = callback
+    try:
+        yield
+    finally:
+        _local.callback = None
+
+
+@contextmanager
+def progress_task(description: str, eta: Optional[EtaEstimate]) -> Iterator[Callable[[float], None]]:
+    """
+    Shows a progress bar for one long-running step.
+
+    The bar pulses until the first report; the yielded callback takes the
+    completed fraction (0..1) and may be called from any thread.
+    """
+    label = getattr(_local, "label", None)
+    if label:
+        description = f"{label}: {description}"
+
+    callback = getattr(_local, "callback", None)
+    if callback is not None:
+        callback(description, None)
+        yield lambda fraction: callback(description, min(1.0, fraction))
+        return
+
+    shared = _shared
+    if shared is not None:
+        task = shared.add_task(description, total=None, eta=eta)
+        try:
+            yield lambda fraction: shared.update(task, total=100, completed=min(100.0, fraction * 100))
+        finally:
+            shared.remove_task(task)
+        return
+
+    with _new_progress(eta) as progress:
+        task = progress.add_task(description, total=None)
+
+        def report(fraction: float) -> None:
+            progress.update(task, total=100, completed=min(100.0, fraction * 100))
+
+        yield report
+
+
 def _open_file_dialog_macos() -> Optional[list[Path]]:
     """Opens a native file selection dialog on macOS."""
     try:
@@ -1,76 +1,174 @@
 """
 Utility functions for Video2Note.
 """
-import json
 import logging
-from collections import defaultdict
+import os
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Optional
 
-import ffmpeg
-import numpy as np
+from .config import TranscriptionConfig
+from .metrics import MetricsStore
 
-from .config import HISTORY_FILE, TranscriptionConfig
+# numpy and ffmpeg-python are imported where they are used, keeping CLI startup cheap
+if TYPE_CHECKING:
+    import numpy as np
 
 logger = logging.getLogger(__name__)
 
 
 # --- History and ETA Calculation ---
 
-def load_hist() -> Dict[str, List[List[float]]]:
-    """Loads transcription history from the JSON file."""
-    if not HISTORY_FILE.exists():
-        return defaultdict(list)
-    try:
-        hist_data = json.loads(HISTORY_FILE.read_text())
-        # Basic validation
-        clean_hist = defaultdict(list)
-        for key, values in hist_data.items():
-            if values and isinstance(values, list) and len(values) > 0 and isinstance(values[0], list):
-                clean_hist[key] = values
-        return clean_hist
-    except (json.JSONDecodeError, TypeError):
-        return defaultdict(list)
-
-def save_hist(hist: Dict[str, List[List[float]]]) -> None:
-    """Saves transcription history to the JSON file."""
-    try:
-        HISTORY_FILE.write_text(json.dumps(hist, indent=2))
-    except IOError as e:
-        logger.warning(f"Could not save history file: {e}")
+# Two-sided 90% interval of the normal approximation
+ETA_CONFIDENCE_Z = 1.645
+ETA_SAMPLE_LIMIT = 60
+# Weight of a run relative to the one after it, so recent performance counts more
+ETA_RECENCY_DECAY = 0.9
 
 
-def get_run_signature(config: TranscriptionConfig) -> str:
-    """Creates a unique signature for a transcription run configuration."""
-    return f"{config.model_name}|cpu|{config.threads}"
+@dataclass(frozen=True)
+class EtaEstimate:
+    """A predicted run time with an optional confidence interval, in seconds."""
+    seconds: float
+    low: Optional[float] = None
+    high: Optional[float] = None
 
 
-def calculate_eta(config: TranscriptionConfig, audio_duration: float) -> Optional[float]:
-    """Predicts the execution time based on historical data."""
-    hist = load_hist()
-    sig = get_run_signature(config)
-    samples = hist.get(sig, [])
+@dataclass
+class RuntimeModel:
+    """
+    Weighted least-squares fit of ``time = a + duration * (b + c * ln(threads))``.
+
+    The intercept captures fixed per-run overhead such as model loading, and
+    the ``c`` term lets runs at one thread count inform predictions for
+    another. Terms the samples cannot identify, or that would leave no
+    residual freedom, are left out of the fit; without the ``c`` term, the
+    per-second cost is assumed to scale inversely with threads relative to
+    the first sample's thread count.
+    """
+    coef: "np.ndarray"
+    columns: "np.ndarray"
+    cov: "np.ndarray"
+    sigma: Optional[float]
+    reference_threads: Optional[float] = None
+
+    @staticmethod
+    def design(durations: "np.ndarray", threads: "np.ndarray") -> "np.ndarray":
+        """Builds the [1, d, d*ln(t)] design matrix."""
+        import numpy as np
+
+        durations = np.asarray(durations, dtype=float)
+        log_threads = np.log(np.maximum(np.asarray(threads, dtype=float), 1.0))
+        return np.column_stack([np.ones_like(durations), durations, durations * log_threads])
+
+    @classmethod
+    def fit(cls, durations: "np.ndarray", threads: "np.ndarray", times: "np.ndarray",
+            weights: Optional["np.ndarray"] = None) -> Optional["RuntimeModel"]:
+        """Fits the model, or returns None if the samples cannot support one."""
+        import numpy as np
+
+        durations = np.asarray(durations, dtype=float)
+        threads = np.asarray(threads, dtype=float)
+        times = np.asarray(times, dtype=float)
+        if durations.size == 0 or not np.any(durations > 0):
+            return None
+        weights = np.ones_like(durations) if weights is None else np.asarray(weights, dtype=float)
+        weights = weights / weights.mean()
+
+        reference_threads = float(threads[0])
+        design = cls.design(durations, threads)
+        # Without the thread term, durations are scaled to the first sample's thread count
+        scaled = np.column_stack([design[:, 0], durations * reference_threads / np.maximum(threads, 1.0)])
+
+        def build(columns: "np.ndarray") -> "np.ndarray":
+            return design[:, columns] if columns[2] else scaled[:, columns[:2]]
+
+        columns = np.array([False, True, False])
+        # Each optional term needs a sample of its own beyond those already spent; otherwise
+        # lstsq quietly returns a minimum-norm solution that can extrapolate in any direction
+        for term, varies in ((0, np.unique(durations).size > 1), (2, np.unique(threads).size > 1)):
+            if not varies or durations.size <= columns.sum() + 1:
+                continue
+            columns[term] = True
+            if np.linalg.matrix_rank(build(columns)) < columns.sum():
+                columns[term] = False
+        x = build(columns)
+        root_w = np.sqrt(weights)
+        try:
+            coef, *_ = np.linalg.lstsq(x * root_w[:, None], times * root_w, rcond=None)
+            cov = np.linalg.pinv(x.T @ (x * weights[:, None]))
+        except np.linalg.LinAlgError:
+            return None
+
+        dof = durations.size - int(columns.sum())
+        sigma = None
+        if dof > 0:
+            residuals = times - x @ coef
+            sigma = float(np.sqrt(np.sum(weights * residuals ** 2) / dof))
+        if columns[2]:
+            reference_threads = None
+        return cls(coef=coef, columns=columns, cov=cov, sigma=sigma, reference_threads=reference_threads)
+
+    def predict(self, duration: float, threads: int) -> Optional[EtaEstimate]:
+        """Predicts the run time for a file, with an interval when the fit has residual freedom."""
+        import numpy as np
+
+        if self.reference_threads and threads > 0:
+            # Fitted on durations scaled to the reference thread count
+            duration = duration * self.reference_threads / threads
+        x = self.design(np.array([duration]), np.array([threads]))[0, self.columns]
+        seconds = float(x @ self.coef)
+        if not np.isfinite(seconds) or seconds <= 0:
+            return None
+        if self.sigma is None:
+            return EtaEstimate(seconds)
+        spread = ETA_CONFIDENCE_Z * self.sigma * float(np.sqrt(1.0 + x @ self.cov @ x))
+        return EtaEstimate(seconds, max(0.0, seconds - spread), seconds + spread)
+
+
+def get_run_signature(config: TranscriptionConfig, chunks: int = 1) -> str:
+    """Creates a unique signature for a transcription run configuration."""
+    sig = f"{config.model_name}|cpu|{config.threads}"
+    # Parallel chunked runs have a different speed profile
+    return f"{sig}|x{chunks}" if chunks > 1 else sig
 
-    if not samples or len(samples) < 1 or len(samples[0]) != 2:
-        return None
 
-    durs, runs = np.array(samples).T
-    if not np.any(durs) or not np.any(runs):
+def fit_history_model(model_name: str, chunks: int = 1, vad: Optional[bool] = None,
+                      beam_size: Optional[int] = None) -> Optional[RuntimeModel]:
+    """
+    Fits a RuntimeModel to past runs of a model, chunk count, VAD setting
+    and beam size, pooled across thread counts. Returns None without usable
+    history.
+    """
+    samples = MetricsStore().history(model_name, chunks, vad, limit=ETA_SAMPLE_LIMIT, beam_size=beam_size)
+    if not samples:
         return None
+    import numpy as np
 
-    eta = None
-    try:
-        # Weighted average of the overall slope and the most recent slope
-        slope = np.mean(runs) / np.mean(durs)
-        eta = slope * audio_duration
-        if len(samples) > 1:
-            last_slope = runs[-1] / durs[-1]
-            last_eta = last_slope * audio_duration
-            eta = 0.7 * eta + 0.3 * last_eta  # Weight recent performance more
-    except (np.linalg.LinAlgError, ZeroDivisionError):
+    durations, threads, times = np.array(samples, dtype=float).T
+    weights = ETA_RECENCY_DECAY ** np.arange(len(samples) - 1, -1, -1)
+    return RuntimeModel.fit(durations, threads, times, weights)
+
+
+def calculate_eta(config: TranscriptionConfig, audio_duration: float, chunks: int = 1,
+                  vad: Optional[bool] = None) -> Optional[EtaEstimate]:
+    """Predicts the execution time based on historical data (see fit_history_model())."""
+    if audio_duration <= 0:
         return None
+    model = fit_history_model(config.model_name, chunks, vad, config.beam_size)
+    return model.predict(audio_duration, config.threads) if model else None
+
+
+def format_eta(estimate: EtaEstimate) -> str:
+    """Formats an estimate as 'MM:SS' plus the interval, if known."""
+    def clock(seconds: float) -> str:
+        return time.strftime('%H:%M:%S' if seconds >= 3600 else '%M:%S', time.gmtime(seconds))
 
-    return eta if eta and eta > 0 else None
+    if estimate.low is None or estimate.high is None:
+        return clock(estimate.seconds)
+    return f"{clock(estimate.seconds)} ({clock(estimate.low)}–{clock(estimate.high)})"
 
 
 # --- File and Media Utilities ---
@@ -83,6 +181,8 @@ def get_safe_filename(name: str) -> str:
 
 def get_media_duration(media_path: Path) -> float:
     """Returns the duration of a media file in seconds."""
+    import ffmpeg
+
     try:
         probe = ffmpeg.probe(str(media_path))
         return float(probe.get('format', {}).get('duration', 0))
@@ -91,6 +191,16 @@ def get_media_duration(media_path: Path) -> float:
         return 0.0 
 
 
+def write_text_atomic(path: Path, text: str) -> None:
+    """Writes a text file via a temporary sibling and a rename, so readers never see a partial file."""
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        tmp_path.write_text(text, encoding='utf-8')
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+
 def is_nonempty_text_file(path: Path) -> bool:
     """Returns True if path exists, is a file, and has non-whitespace content.
 
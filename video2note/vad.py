@@ -0,0 +1,187 @@
+"""
+Voice activity detection for Video2Note, without a model file.
+
+Decodes audio to 16kHz mono PCM, classifies 30 ms frames as speech or
+silence from their energy and spectral flatness with NumPy, and writes a
+speech-only WAV that whisper.cpp decodes in a fraction of the time. A
+SpeechMap records where each kept stretch came from, so timestamps of the
+shortened audio can be mapped back to the source timeline.
+"""
+import logging
+import tempfile
+import wave
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .config import DEFAULT_STALL_TIMEOUT
+from .segments import Segment
+from .supervisor import FfmpegProgressParser
+from .transcriber import run_ffmpeg
+from .ui import progress_task
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03
+# Frames analysed per FFT batch (about a minute of audio), which bounds memory use
+_BLOCK_FRAMES = 2000
+# A frame is speech when it is this much louder than the noise floor...
+NOISE_MARGIN_DB = 10.0
+# ...and not noise-like, unless it is loud enough to count anyway
+FLATNESS_MAX = 0.45
+LOUD_MARGIN_DB = 20.0
+# Quiet recordings: never treat frames above this level as the noise floor
+SILENCE_FLOOR_DB = -60.0
+# Audio kept around each speech stretch, so word onsets and endings are not clipped
+SPEECH_PAD = 0.2
+# Pauses shorter than this stay in, keeping the rhythm whisper expects
+MIN_SILENCE = 0.6
+# Not worth writing a new file for less than this share of silence
+MIN_SAVINGS = 0.1
+
+
+@dataclass
+class SpeechMap:
+    """Stretches of the source (start, end in seconds) kept in the speech-only audio, in order."""
+    intervals: List[Tuple[float, float]]
+    source_duration: float
+    _offsets: List[float] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._offsets = []
+        position = 0.0
+        for start, end in self.intervals:
+            self._offsets.append(position)
+            position += end - start
+
+    @property
+    def speech_duration(self) -> float:
+        """Length of the speech-only audio, in seconds."""
+        return sum(end - start for start, end in self.intervals)
+
+    def to_source(self, t: float, end: bool = False) -> float:
+        """
+        Maps a time in the speech-only audio to the source timeline.
+
+        A time exactly on a joint belongs to the stretch that starts there,
+        or to the one that ends there with ``end``.
+        """
+        if not self.intervals:
+            return t
+        search = bisect_left if end else bisect_right
+        i = min(max(search(self._offsets, t) - 1, 0), len(self.intervals) - 1)
+        start, stop = self.intervals[i]
+        return min(stop, start + max(0.0, t - self._offsets[i]))
+
+    def map_segments(self, segments: List[Segment]) -> List[Segment]:
+        """Returns the segments with their times moved to the source timeline."""
+        return [Segment(self.to_source(s.start), self.to_source(s.end, end=True), s.text) for s in segments]
+
+
+def frame_features(samples: np.ndarray, frame: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-frame level in dBFS and spectral flatness (0 for a pure tone, near
+    1 for white noise) of int16 samples; trailing samples that do not fill
+    a frame are ignored.
+    """
+    count = len(samples) // frame
+    levels = np.empty(count, dtype=np.float32)
+    flatness = np.empty(count, dtype=np.float32)
+    window = np.hanning(frame).astype(np.float32)
+    for first in range(0, count, _BLOCK_FRAMES):
+        last = min(count, first + _BLOCK_FRAMES)
+        frames = samples[first * frame:last * frame].reshape(-1, frame).astype(np.float32) / 32768.0
+        levels[first:last] = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+        power = np.abs(np.fft.rfft(frames * window, axis=1)) ** 2 + 1e-12
+        flatness[first:last] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return levels, flatness
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """[start, end) index ranges where a boolean mask is True."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def detect_speech(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Tuple[float, float]]:
+    """
+    Finds speech in 16-bit mono PCM; returns (start, end) times in seconds,
+    padded by SPEECH_PAD and with pauses shorter than MIN_SILENCE bridged.
+    """
+    frame = int(sample_rate * FRAME_SECONDS)
+    levels, flatness = frame_features(samples, frame)
+    if not len(levels):
+        return []
+
+    noise_floor = min(float(np.percentile(levels, 10)), SILENCE_FLOOR_DB + NOISE_MARGIN_DB)
+    speech = (levels > noise_floor + NOISE_MARGIN_DB) & (
+        (flatness < FLATNESS_MAX) | (levels > noise_floor + LOUD_MARGIN_DB))
+
+    # Widen every speech frame by the padding on both sides
+    pad = int(round(SPEECH_PAD / FRAME_SECONDS))
+    if pad:
+        speech = np.convolve(speech.astype(np.int8), np.ones(2 * pad + 1, dtype=np.int8), mode='same') > 0
+
+    # Bridge short pauses
+    min_gap = int(round(MIN_SILENCE / FRAME_SECONDS))
+    for start, end in _runs(~speech):
+        if start > 0 and end < len(speech) and end - start < min_gap:
+            speech[start:end] = True
+
+    total = len(samples) / sample_rate
+    return [(round(start * FRAME_SECONDS, 3), min(total, round(end * FRAME_SECONDS, 3))) for start, end in _runs(speech)]
+
+
+def _decode_pcm(audio_path: Path, raw_path: Path, stall_timeout: float) -> None:
+    """Decodes any audio file to raw 16kHz mono s16le PCM."""
+    cmd = [
+        'ffmpeg', '-nostdin', '-i', str(audio_path), '-vn',
+        '-ac', '1', '-ar', str(SAMPLE_RATE), '-c:a', 'pcm_s16le',
+        '-progress', 'pipe:2', '-nostats',
+        '-f', 's16le', '-y', str(raw_path)
+    ]
+    with progress_task("🔇 Ищу паузы в аудио...", None) as report:
+        run_ffmpeg(cmd, stall_timeout, "Ошибка декодирования аудио (ffmpeg)", report, FfmpegProgressParser())
+
+
+def remove_silence(audio_path: Path, output_path: Path,
+                   stall_timeout: float = DEFAULT_STALL_TIMEOUT) -> Optional[SpeechMap]:
+    """
+    Writes the speech of an audio file to a 16kHz mono WAV with the silence cut out.
+
+    Returns the SpeechMap of the written file, or None (and writes
+    nothing) when less than MIN_SAVINGS of the audio is silence.
+    """
+    with tempfile.TemporaryDirectory(prefix="video2note-vad-", dir=output_path.parent) as tmp:
+        raw_path = Path(tmp) / "audio.raw"
+        _decode_pcm(audio_path, raw_path, stall_timeout)
+        if raw_path.stat().st_size < 2:
+            return None
+        samples = np.memmap(raw_path, dtype='<i2', mode='r')
+        try:
+            duration = len(samples) / SAMPLE_RATE
+            speech = detect_speech(samples)
+            speech_map = SpeechMap(speech, duration)
+            saved = duration - speech_map.speech_duration
+            if not speech:
+                logger.warning(f"В {audio_path.name} не найдено речи — передаю аудио целиком.")
+                return None
+            if saved < duration * MIN_SAVINGS:
+                logger.info(f"Пауз в {audio_path.name} мало ({saved:.0f} с из {duration:.0f} с) — аудио не сокращаю.")
+                return None
+
+            with wave.open(str(output_path), 'wb') as out:
+                out.setnchannels(1)
+                out.setsampwidth(2)
+                out.setframerate(SAMPLE_RATE)
+                for start, end in speech:
+                    out.writeframes(samples[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)].tobytes())
+        finally:
+            # Windows cannot delete a mapped file
+            del samples
+    logger.info(f"Убрано {saved:.0f} с тишины из {duration:.0f} с ({saved / duration:.0%}).")
+    return speech_map
@@ -0,0 +1,276 @@
+"""
+Watch-folder mode for Video2Note.
+
+Polls a directory for media files, waits until each one has stopped
+changing (so files still being copied are not picked up), and records it in
+an on-disk queue that survives restarts. Files are then transcribed one by
+one with run_pipeline() and a backend that stays warm between them.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .cache import TranscriptCache
+from .config import ALL_SUPPORTED_FORMATS, TranscriptionConfig
+from .core import BatchJob, BatchOutcome, run_pipeline
+from .exceptions import Video2NoteError
+from .tracing import Tracer
+from .transcriber import TranscriptionBackend
+from .output import DEFAULT_FORMATS
+from .utils import get_safe_filename
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 5.0
+# A file must keep the same size and mtime this long before it is queued
+DEFAULT_SETTLE_SECONDS = 10.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    queued_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, queued_at);
+"""
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+
+class WatchQueue:
+    """
+    Persistent queue of files found by the watcher, stored in SQLite.
+
+    A file is queued once per version (size and mtime): a finished or failed
+    file is picked up again only if it changes. Jobs that were running when
+    the process stopped are put back in the queue on the next start.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Closes the database."""
+        self._conn.close()
+
+    def __enter__(self) -> "WatchQueue":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def add(self, path: Path, size: int, mtime_ns: int) -> bool:
+        """Queues a file unless this version of it is already known; returns True if queued."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT size, mtime_ns, status FROM jobs WHERE path = ?", (str(path),)).fetchone()
+            if row is not None and (row[0], row[1]) == (size, mtime_ns):
+                return False
+            self._conn.execute(
+                "INSERT INTO jobs (path, size, mtime_ns, status, error, queued_at, updated_at) VALUES (?, ?, ?, ?, NULL, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "status = excluded.status, error = NULL, queued_at = excluded.queued_at, updated_at = excluded.updated_at",
+                (str(path), size, mtime_ns, PENDING, now, now))
+        return True
+
+    def requeue_interrupted(self) -> int:
+        """Puts jobs left running by a stopped process back in the queue."""
+        with self._lock, self._conn:
+            return self._conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                                      (PENDING, time.time(), RUNNING)).rowcount
+
+    def claim(self) -> Optional[Tuple[Path, int, int]]:
+        """Marks the oldest pending job as running and returns its path, size and mtime."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT path, size, mtime_ns FROM jobs WHERE status = ? ORDER BY queued_at LIMIT 1",
+                                     (PENDING,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE path = ?", (RUNNING, time.time(), row[0]))
+        return Path(row[0]), row[1], row[2]
+
+    def finish(self, path: Path, error: Optional[str] = None) -> None:
+        """Marks a running job as done, or as failed with an error message."""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE path = ?",
+                               (FAILED if error else DONE, error, time.time(), str(path)))
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+@dataclass
+class _Seen:
+    size: int
+    mtime_ns: int
+    since: float
+
+
+class FolderWatcher:
+    """
+    Finds supported media files in a directory by polling, and reports each
+    version of a file once it has not changed for ``settle`` seconds.
+    """
+
+    def __init__(self, directory: Path, settle: float = DEFAULT_SETTLE_SECONDS, recursive: bool = False):
+        self.directory = directory
+        self.settle = settle
+        self.recursive = recursive
+        self._seen: Dict[Path, _Seen] = {}
+        self._reported: Dict[Path, Tuple[int, int]] = {}
+
+    def _candidates(self) -> Iterator[Path]:
+        pattern = "**/*" if self.recursive else "*"
+        for path in self.directory.glob(pattern):
+            if path.suffix.lower() in ALL_SUPPORTED_FORMATS and not path.name.startswith('.'):
+                yield path
+
+    def poll(self) -> List[Tuple[Path, int, int]]:
+        """Returns (path, size, mtime_ns) of files that have settled since the last poll."""
+        now = time.monotonic()
+        ready = []
+        present = set()
+        for path in self._candidates():
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            if not path.is_file() or st.st_size == 0:
+                continue
+            present.add(path)
+            seen = self._seen.get(path)
+            if seen is None or (seen.size, seen.mtime_ns) != (st.st_size, st.st_mtime_ns):
+                # New or still being written: restart the settle timer
+                self._seen[path] = _Seen(st.st_size, st.st_mtime_ns, now)
+                continue
+            version = (seen.size, seen.mtime_ns)
+            if now - seen.since >= self.settle and self._reported.get(path) != version:
+                self._reported[path] = version
+                ready.append((path, seen.size, seen.mtime_ns))
+
+        for gone in set(self._seen) - present:
+            del self._seen[gone]
+            self._reported.pop(gone, None)
+        return ready
+
+
+def output_path_for(input_file: Path, directory: Path, output_dir: Path) -> Path:
+    """
+    Returns the transcript path of a watched file. Its subdirectory of the
+    watched directory is mirrored under ``output_dir``, so recordings with
+    the same name in different folders get separate transcripts.
+    """
+    try:
+        subdir = input_file.relative_to(directory).parent
+    except ValueError:
+        # Queued by an earlier run that watched another directory
+        subdir = Path()
+    return output_dir / subdir / f"{get_safe_filename(input_file.stem)}.txt"
+
+
+def watch_folder(
+    directory: Path,
+    config: TranscriptionConfig,
+    temp_dir: Path,
+    output_dir: Path,
+    queue: WatchQueue,
+    backend: Optional[TranscriptionBackend] = None,
+    cache: Optional[TranscriptCache] = None,
+    stream: bool = True,
+    parallel_chunks: int = 0,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    settle: float = DEFAULT_SETTLE_SECONDS,
+    recursive: bool = False,
+    formats: Sequence[str] = DEFAULT_FORMATS,
+    stop: Optional[threading.Event] = None,
+    on_start: Optional[Callable[[BatchJob], None]] = None,
+    on_outcome: Optional[Callable[[BatchOutcome], None]] = None,
+) -> None:
+    """
+    Transcribes media files as they appear in a directory, until ``stop`` is set.
+
+    Args:
+        directory: The watched directory.
+        config: The transcription configuration.
+        temp_dir: Directory for temporary files and checkpoints.
+        output_dir: Where transcripts are written, in the same subdirectories
+            as their sources.
+        queue: Persistent queue; jobs interrupted by a restart are queued
+            again, and long files continue from their segment checkpoints.
+        backend: Backend shared by all files (e.g. a warm whisper-server).
+        cache: Transcript cache shared by all files.
+        stream: Pipe audio from ffmpeg into the backend without a temp file.
+        parallel_chunks: Per-file process count for long recordings (0 = auto).
+        poll_interval: Seconds between directory scans while idle.
+        settle: Seconds a file must stay unchanged before it is queued.
+        recursive: Also watch subdirectories.
+        formats: Output formats to write for each file.
+        stop: Event that ends the loop; runs until interrupted if omitted.
+        on_start: Called with each job right before it is processed.
+        on_outcome: Called with the outcome of each job.
+    """
+    stop = stop or threading.Event()
+    watcher = FolderWatcher(directory, settle, recursive)
+    interrupted = queue.requeue_interrupted()
+    if interrupted:
+        logger.info(f"Возобновляю прерванные задачи: {interrupted}")
+
+    while not stop.is_set():
+        for path, size, mtime_ns in watcher.poll():
+            if queue.add(path, size, mtime_ns):
+                logger.info(f"В очереди: {path.name}")
+
+        claimed = queue.claim()
+        if claimed is None:
+            stop.wait(poll_interval)
+            continue
+
+        input_file, size, mtime_ns = claimed
+        job = BatchJob(input_file, output_path_for(input_file, directory, output_dir), formats)
+        try:
+            st = input_file.stat()
+        except OSError:
+            queue.finish(input_file, "файл удалён")
+            continue
+        if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+            # Changed after it was queued: the watcher will queue the new version once it settles
+            queue.finish(input_file, "файл изменился")
+            continue
+        if job.is_done():
+            queue.finish(input_file)
+            if on_outcome:
+                on_outcome(BatchOutcome(job, skipped=True))
+            continue
+
+        job.output_path.parent.mkdir(parents=True, exist_ok=True)
+        if on_start:
+            on_start(job)
+        tracer = Tracer(file=input_file.name)
+        try:
+            result = run_pipeline(input_file, config, temp_dir, job.output_path, delete_temp=True,
+                                  backend=backend, stream=stream, cache=cache,
+                                  parallel_chunks=parallel_chunks, resume=True, tracer=tracer,
+                                  formats=formats)
+        except Video2NoteError as e:
+            queue.finish(input_file, str(e))
+            outcome = BatchOutcome(job, error=e, spans=tracer.spans)
+        else:
+            queue.finish(input_file)
+            outcome = BatchOutcome(job, result=result, spans=result.spans)
+        if on_outcome:
+            on_outcome(outcome)